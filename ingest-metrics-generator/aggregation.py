@@ -0,0 +1,103 @@
+"""
+Time bucketed aggregation of metric messages, emulating the buckets flushed by Relay.
+
+Generated messages are grouped by (org, project, name, tags, time bucket) and every group is emitted
+as a single message: counters are summed, set values are merged (union) and distribution values are
+concatenated.
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, List, Mapping, MutableMapping, Tuple
+
+from metrics import encode_base64_distribution, encode_base64_set
+
+
+class BucketAggregator:
+    """
+    Aggregates metric messages in bounded memory.
+
+    At most max_buckets buckets are kept, when a new bucket doesn't fit the oldest bucket (the first one
+    created) is emitted, flush emits all the remaining buckets.
+    The set and distribution values of the added messages must be arrays (not base64 or bin encoded),
+    value_encoding is the encoding of the emitted buckets.
+    """
+
+    def __init__(
+        self, bucket_seconds: int, max_buckets: int, value_encoding: str = "array"
+    ):
+        assert bucket_seconds > 0
+        assert max_buckets > 0
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_buckets
+        self.value_encoding = value_encoding
+        self._buckets: "OrderedDict[Tuple[Hashable, ...], MutableMapping[str, Any]]" = (
+            OrderedDict()
+        )
+        self.num_values = 0
+        self.num_buckets = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(self, metric: Mapping[str, Any]) -> List[Mapping[str, Any]]:
+        """
+        Adds a message to its bucket, returns the buckets evicted to make room for it (if any)
+        """
+        self.num_values += 1
+        timestamp = metric["timestamp"] - metric["timestamp"] % self.bucket_seconds
+        key = (
+            metric["org_id"],
+            metric["project_id"],
+            metric["name"],
+            timestamp,
+            tuple(sorted(metric["tags"].items())),
+        )
+
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            _merge_value(bucket, metric["value"])
+            return []
+
+        evicted = []
+        while len(self._buckets) >= self.max_buckets:
+            _, oldest = self._buckets.popitem(last=False)
+            evicted.append(self._finalize(oldest))
+
+        bucket = {**metric, "timestamp": timestamp}
+        if bucket["type"] == "s":
+            bucket["value"] = set(metric["value"])
+        elif bucket["type"] == "d":
+            bucket["value"] = list(metric["value"])
+        self._buckets[key] = bucket
+        return evicted
+
+    def flush(self) -> List[Mapping[str, Any]]:
+        """
+        Emits (and removes) all the buckets
+        """
+        buckets = [self._finalize(bucket) for bucket in self._buckets.values()]
+        self._buckets.clear()
+        return buckets
+
+    def _finalize(self, bucket: MutableMapping[str, Any]) -> Mapping[str, Any]:
+        self.num_buckets += 1
+        ty = bucket["type"]
+        if ty == "s":
+            bucket["value"] = sorted(bucket["value"])
+        if self.value_encoding == "base64":
+            if ty == "s":
+                bucket["value"] = encode_base64_set(bucket["value"])
+            elif ty == "d":
+                bucket["value"] = encode_base64_distribution(bucket["value"])
+        return bucket
+
+
+def _merge_value(bucket: MutableMapping[str, Any], value: Any):
+    ty = bucket["type"]
+    if ty == "c":
+        bucket["value"] += value
+    elif ty == "s":
+        bucket["value"].update(value)
+    elif ty == "d":
+        bucket["value"].extend(value)
+    else:
+        raise ValueError(f"Can't aggregate metrics of type {ty}")
@@ -0,0 +1,274 @@
+"""
+Micro benchmarks for the metric message generation (no kafka involved).
+
+Usage: python benchmark.py [-n NUM_MESSAGES] [--repeatable] [--num-extra-tags N] [--collection-size N]
+"""
+import datetime
+import functools
+import json
+import time
+from typing import Any, Callable, List, Mapping, Tuple
+
+import click
+import numpy as np
+
+from main import _calculate_metrics_distribution, _calculate_tenant_distributions
+from metrics import generate_metric
+from metrics_batch import (
+    _get_tag_nums_with_unique_rate,
+    _get_tag_values,
+    encode_metric_batch,
+)
+from templates import orjson
+
+BATCH_SIZE = 1000
+
+
+def benchmark_settings(
+    num_messages: int, repeatable: bool, num_extra_tags: int
+) -> Mapping[str, Any]:
+    settings = {
+        "num_messages": num_messages,
+        "repeatable": repeatable,
+        "seed": 0,
+        "org": 1,
+        "projects": [5, 6, 7, 8, 9, 10],
+        "timestamp": int(time.time()),
+        "time_delta": datetime.timedelta(hours=2),
+        "releases": 20,
+        "releases_unique_rate": 0,
+        "environments": 10,
+        "environments_unique_rate": 0,
+        "num_extra_tags": num_extra_tags,
+        "extra_tags_values": 100,
+        "extra_tags_unique_rate": 0.1,
+        "col_min": 3,
+        "col_max": 7,
+        "metric_types": {
+            "session": 4,
+            "user": 2,
+            "session.error": 1,
+            "session.duration": 1,
+        },
+    }
+    _calculate_metrics_distribution(settings)
+    _calculate_tenant_distributions(settings)
+    return settings
+
+
+def collection_settings(
+    settings: Mapping[str, Any], metric_type: str, collection_size: int, **kwargs
+) -> Mapping[str, Any]:
+    """
+    Settings generating only metric_type messages with collection_size values each
+    """
+    settings = {
+        **settings,
+        "metric_types": {metric_type: 1},
+        "col_min": collection_size,
+        "col_max": collection_size,
+        **kwargs,
+    }
+    _calculate_metrics_distribution(settings)
+    return settings
+
+
+def scalar_json(settings: Mapping[str, Any]):
+    for idx in range(settings["num_messages"]):
+        json.dumps(generate_metric(idx, settings)).encode("ascii")
+
+
+def _batch_encoder(encoder: str) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        settings = {**settings, "encoder": encoder}
+        num_messages = settings["num_messages"]
+        for start_idx in range(0, num_messages, BATCH_SIZE):
+            count = min(BATCH_SIZE, num_messages - start_idx)
+            encode_metric_batch(start_idx, count, settings)
+
+    return run
+
+
+BENCHMARKS: List[Tuple[str, Callable[[Mapping[str, Any]], None]]] = [
+    ("scalar dict + json.dumps", scalar_json),
+    ("batch dict + json.dumps", _batch_encoder("json")),
+    ("batch template", _batch_encoder("template")),
+]
+
+if orjson is not None:
+    BENCHMARKS.append(("batch dict + orjson", _batch_encoder("orjson")))
+
+
+def _tag_nums(idx: np.ndarray, settings: Mapping[str, Any]) -> Tuple[list, list, list]:
+    num = settings["num_extra_tags"]
+    tag_idx = (idx[:, np.newaxis] * num + np.arange(num)).ravel()
+    return (
+        _get_tag_nums_with_unique_rate(
+            idx, settings, settings["environments"], settings["environments_unique_rate"], "environment"
+        ).tolist(),
+        _get_tag_nums_with_unique_rate(
+            idx, settings, settings["releases"], settings["releases_unique_rate"], "release"
+        ).tolist(),
+        _get_tag_nums_with_unique_rate(
+            tag_idx, settings, settings["extra_tags_values"], settings["extra_tags_unique_rate"], "extra_tag"
+        )
+        .reshape(len(idx), num)
+        .tolist(),
+    )
+
+
+def _f_string_tag_values(idx: np.ndarray, settings: Mapping[str, Any]) -> List[List[str]]:
+    environments, releases, extra = _tag_nums(idx, settings)
+    tag_values = [
+        [f"env-{env_num}", f"v{rel_num}.1.1"] for env_num, rel_num in zip(environments, releases)
+    ]
+    for message_values, extra_values in zip(tag_values, extra):
+        message_values.extend([f"extra-value-{value}" for value in extra_values])
+    return tag_values
+
+
+@functools.lru_cache(maxsize=100000)
+def _lru_cached_tag_value(template: str, tag_num: int) -> str:
+    return template.format(tag_num)
+
+
+def _lru_cached_tag_values(idx: np.ndarray, settings: Mapping[str, Any]) -> List[List[str]]:
+    environments, releases, extra = _tag_nums(idx, settings)
+
+    def render(template: str, tag_num: int, num_predefined: int) -> str:
+        if tag_num <= num_predefined:
+            return _lru_cached_tag_value(template, tag_num)
+        return template.format(tag_num)
+
+    tag_values = [
+        [
+            render("env-{}", env_num, settings["environments"]),
+            render("v{}.1.1", rel_num, settings["releases"]),
+        ]
+        for env_num, rel_num in zip(environments, releases)
+    ]
+    for message_values, extra_values in zip(tag_values, extra):
+        message_values.extend(
+            [render("extra-value-{}", value, settings["extra_tags_values"]) for value in extra_values]
+        )
+    return tag_values
+
+
+def _tag_values(
+    get_tag_values: Callable[[np.ndarray, Mapping[str, Any]], List[List[str]]]
+) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        num_messages = settings["num_messages"]
+        for start_idx in range(0, num_messages, BATCH_SIZE):
+            count = min(BATCH_SIZE, num_messages - start_idx)
+            get_tag_values(np.arange(start_idx, start_idx + count, dtype=np.int64), settings)
+
+    return run
+
+
+# rendering the tag values of a batch (tag numbers included): formatting every value, an LRU cache of the
+# predefined values and the predefined values rendered once per run (the generator)
+TAG_VALUE_BENCHMARKS: List[Tuple[str, Callable[[Mapping[str, Any]], None]]] = [
+    ("tag values, f-strings", _tag_values(_f_string_tag_values)),
+    ("tag values, lru cache", _tag_values(_lru_cached_tag_values)),
+    ("tag values, predefined tuples", _tag_values(_get_tag_values)),
+]
+
+
+# set and distribution value encodings: (name, metric type, extra settings, benchmark)
+COLLECTION_BENCHMARKS: List[
+    Tuple[str, str, Mapping[str, Any], Callable[[Mapping[str, Any]], None]]
+] = [
+    (
+        "scalar distribution, bin_encoding_len 8",
+        "session.duration",
+        {"bin_encoding_len": 8},
+        scalar_json,
+    ),
+    (
+        "batch distribution, bin_encoding_len 8",
+        "session.duration",
+        {"bin_encoding_len": 8},
+        _batch_encoder("template"),
+    ),
+    (
+        "scalar distribution, array",
+        "session.duration",
+        {},
+        scalar_json,
+    ),
+    (
+        "batch distribution, array",
+        "session.duration",
+        {},
+        _batch_encoder("template"),
+    ),
+    (
+        "scalar distribution, base64",
+        "session.duration",
+        {"value_encoding": "base64"},
+        scalar_json,
+    ),
+    (
+        "batch distribution, base64",
+        "session.duration",
+        {"value_encoding": "base64"},
+        _batch_encoder("template"),
+    ),
+    (
+        "batch set, array",
+        "user",
+        {},
+        _batch_encoder("template"),
+    ),
+    (
+        "batch set, base64",
+        "user",
+        {"value_encoding": "base64"},
+        _batch_encoder("template"),
+    ),
+]
+
+
+def _print_result(name: str, num_messages: int, elapsed: float):
+    print(f"{name:40} {num_messages / elapsed:12.0f} msgs/s")
+
+
+@click.command()
+@click.option("--num-messages", "-n", type=int, default=100000)
+@click.option("--repeatable", "-r", is_flag=True)
+@click.option("--num-extra-tags", type=int, default=5)
+@click.option(
+    "--collection-size",
+    type=int,
+    default=50,
+    help="Number of values of the sets and distributions in the value encoding benchmarks",
+)
+def main(num_messages: int, repeatable: bool, num_extra_tags: int, collection_size: int):
+    """
+    Runs the generation benchmarks and prints the msgs/s for each of them
+    """
+    settings = benchmark_settings(num_messages, repeatable, num_extra_tags)
+    for name, run in BENCHMARKS:
+        start = time.perf_counter()
+        run(settings)
+        _print_result(name, num_messages, time.perf_counter() - start)
+
+    print(f"Tag values ({num_extra_tags} extra tags):")
+    for name, run in TAG_VALUE_BENCHMARKS:
+        start = time.perf_counter()
+        run(settings)
+        _print_result(name, num_messages, time.perf_counter() - start)
+
+    print(f"Value encodings ({collection_size} values per message):")
+    for name, metric_type, extra_settings, run in COLLECTION_BENCHMARKS:
+        run_settings = collection_settings(
+            settings, metric_type, collection_size, **extra_settings
+        )
+        start = time.perf_counter()
+        run(run_settings)
+        _print_result(name, num_messages, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Pre-generated message corpus files.
+
+A corpus is written once by the corpus sink and then replayed (memory-mapped) directly into the sink,
+so the only per message work is slicing the record out of the mapped file.
+
+File layout (all integers little-endian):
+    header: MAGIC, u64 reference timestamp (the timestamp setting used to generate the messages)
+    records: u32 length, u32 timestamp position, u32 timestamp length, followed by `length` message bytes
+        the timestamp position/length locate the digits of the message timestamp (NO_TIMESTAMP if absent)
+    index: u64 file offset of every record
+    footer: u64 number of records, u64 index offset
+"""
+import array
+import mmap
+import re
+import struct
+import sys
+import time
+from typing import Iterator, Optional
+
+MAGIC = b"MCORPUS1"
+HEADER = struct.Struct("<8sQ")
+RECORD_HEADER = struct.Struct("<III")
+FOOTER = struct.Struct("<QQ")
+NO_TIMESTAMP = 0xFFFFFFFF
+
+_TIMESTAMP_PATTERN = re.compile(rb'"timestamp": ?(\d+)')
+
+
+class CorpusWriter:
+    def __init__(self, path: str, reference_timestamp: int):
+        self._file = open(path, "wb", buffering=1 << 20)
+        self._file.write(HEADER.pack(MAGIC, reference_timestamp))
+        self._offset = HEADER.size
+        self._offsets = array.array("Q")
+
+    def write(self, message: bytes):
+        match = _TIMESTAMP_PATTERN.search(message)
+        if match is None:
+            ts_pos, ts_len = NO_TIMESTAMP, 0
+        else:
+            ts_pos, ts_len = match.start(1), match.end(1) - match.start(1)
+
+        self._offsets.append(self._offset)
+        self._file.write(RECORD_HEADER.pack(len(message), ts_pos, ts_len))
+        self._file.write(message)
+        self._offset += RECORD_HEADER.size + len(message)
+
+    def close(self):
+        index_offset = self._offset
+        if sys.byteorder == "big":
+            self._offsets.byteswap()
+        self._file.write(self._offsets.tobytes())
+        self._file.write(FOOTER.pack(len(self._offsets), index_offset))
+        self._file.close()
+
+
+class CorpusReader:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size + FOOTER.size:
+            raise ValueError(f"{path} is not a corpus file")
+        magic, self.reference_timestamp = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a corpus file")
+
+        num_records, index_offset = FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - FOOTER.size
+        )
+        # a compact copy of the index (python ints are too big for millions of records)
+        self._index = array.array("Q")
+        index_end = index_offset + num_records * 8
+        self._index.frombytes(self._mmap[index_offset:index_end])
+        if sys.byteorder == "big":
+            self._index.byteswap()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record(self, i: int, timestamp_shift: Optional[int] = None) -> bytes:
+        """
+        Returns the message of record i, with timestamp_shift seconds added to its timestamp (if provided)
+        """
+        mm = self._mmap
+        offset = self._index[i]
+        length, ts_pos, ts_len = RECORD_HEADER.unpack_from(mm, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + length
+
+        if timestamp_shift is None or ts_pos == NO_TIMESTAMP:
+            return mm[start:end]
+
+        ts_start = start + ts_pos
+        ts_end = ts_start + ts_len
+        timestamp = int(mm[ts_start:ts_end]) + timestamp_shift
+        return b"".join(
+            (mm[start:ts_start], str(timestamp).encode(), mm[ts_end:end])
+        )
+
+    def replay(
+        self,
+        start_idx: int,
+        stop_idx: int,
+        cycle: bool = False,
+        rewrite_timestamps: bool = False,
+    ) -> Iterator[bytes]:
+        """
+        Yields the messages for idx in [start_idx, stop_idx), message idx is record idx % len(self)
+
+        With rewrite_timestamps the timestamps are moved forward so that the reference timestamp of the
+        corpus becomes the current time, the shift is recomputed every time the replay wraps around
+        the corpus (and at every new cycle).
+        """
+        num_records = len(self)
+        if num_records == 0:
+            return
+
+        while True:
+            timestamp_shift = None
+            for idx in range(start_idx, stop_idx):
+                i = idx % num_records
+                if rewrite_timestamps and (timestamp_shift is None or i == 0):
+                    timestamp_shift = int(time.time()) - self.reference_timestamp
+                yield self.record(i, timestamp_shift)
+
+            if not cycle or start_idx >= stop_idx:
+                return
+
+    def close(self):
+        self._index = array.array("Q")
+        self._mmap.close()
+
+
+def count_records(path: str) -> int:
+    reader = CorpusReader(path)
+    try:
+        return len(reader)
+    finally:
+        reader.close()
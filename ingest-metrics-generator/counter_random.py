@@ -0,0 +1,134 @@
+"""
+Counter based (idx addressable) random numbers.
+
+Every value is a pure function of (seed, stream, counter, element) computed with the splitmix64 mixer,
+there is no state that advances between calls. The random values of any message idx can be regenerated
+without generating the messages before it, which is what allows splitting a non repeatable run between
+workers (or pods) and resuming it (--start-idx) with identical output for the same --seed.
+
+The scalar methods (python ints) and the vectorized methods (numpy uint64 arrays) return the same values.
+"""
+import functools
+import zlib
+from typing import Any, Dict, Mapping, Union
+
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+# floats are built from the top 53 bits
+_FLOAT_SCALE = 1.0 / (1 << 53)
+
+
+def mix64(z: int) -> int:
+    """
+    The splitmix64 finalizer, a bijection of the 64 bit integers with good avalanche
+    """
+    z = ((z ^ (z >> 30)) * _MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def mix64_array(z: np.ndarray) -> np.ndarray:
+    """
+    Vectorized mix64 (z must be an uint64 array, the arithmetic wraps around like the masked scalar version)
+    """
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+class CounterRandom:
+    """
+    Independent random streams (identified by name) of values addressed by a counter (the message idx)
+    and an optional element number (for values that need several random numbers per message).
+
+    Example:
+    >>> rnd = CounterRandom(42)
+    >>> rnd.randint("project", 7, 0, 9) == rnd.randint("project", 7, 0, 9)
+    True
+    >>> int(rnd.randint_array("project", np.arange(5, 10), 0, 9)[2]) == rnd.randint("project", 7, 0, 9)
+    True
+    """
+
+    def __init__(self, seed: int):
+        self.seed = seed & MASK64
+        self._keys: Dict[str, int] = {}
+
+    def __repr__(self) -> str:
+        return f"CounterRandom(seed={self.seed})"
+
+    def _key(self, stream: str) -> int:
+        key = self._keys.get(stream)
+        if key is None:
+            key = mix64((self.seed + mix64(zlib.crc32(stream.encode()))) & MASK64)
+            self._keys[stream] = key
+        return key
+
+    def uint64(self, stream: str, counter: int, element: int = 0) -> int:
+        z = mix64((self._key(stream) + counter * GOLDEN_GAMMA) & MASK64)
+        return mix64((z + element * GOLDEN_GAMMA) & MASK64)
+
+    def random(self, stream: str, counter: int, element: int = 0) -> float:
+        """
+        A float in [0.0, 1.0)
+        """
+        return (self.uint64(stream, counter, element) >> 11) * _FLOAT_SCALE
+
+    def randint(self, stream: str, counter: int, a: int, b: int, element: int = 0) -> int:
+        """
+        An integer in [a, b] (both ends included, like random.randint)
+        """
+        return a + int(self.random(stream, counter, element) * (b - a + 1))
+
+    def uint64_array(
+        self,
+        stream: str,
+        counters: np.ndarray,
+        elements: Union[np.ndarray, int] = 0,
+    ) -> np.ndarray:
+        counters = np.asarray(counters).astype(np.uint64)
+        elements = np.asarray(elements).astype(np.uint64)
+        gamma = np.uint64(GOLDEN_GAMMA)
+        z = mix64_array(np.uint64(self._key(stream)) + counters * gamma)
+        return mix64_array(z + elements * gamma)
+
+    def random_array(
+        self,
+        stream: str,
+        counters: np.ndarray,
+        elements: Union[np.ndarray, int] = 0,
+    ) -> np.ndarray:
+        """
+        Vectorized random, a float64 array
+        """
+        bits = self.uint64_array(stream, counters, elements) >> np.uint64(11)
+        return bits.astype(np.float64) * _FLOAT_SCALE
+
+    def randint_array(
+        self,
+        stream: str,
+        counters: np.ndarray,
+        a: int,
+        b: int,
+        elements: Union[np.ndarray, int] = 0,
+    ) -> np.ndarray:
+        """
+        Vectorized randint, an int64 array
+        """
+        scaled = self.random_array(stream, counters, elements) * (b - a + 1)
+        return a + scaled.astype(np.int64)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_counter_random(seed: int) -> CounterRandom:
+    return CounterRandom(seed)
+
+
+def get_random(settings: Mapping[str, Any]) -> CounterRandom:
+    """
+    The random source of the generator, the values only depend on settings["seed"] and the message idx
+    """
+    return _get_counter_random(settings["seed"])
@@ -0,0 +1,162 @@
+"""
+Kafka delivery report accounting (delivered/failed counters and produce -> ack latency histogram).
+"""
+import threading
+from collections import Counter
+from typing import Any, List, Mapping, Optional
+
+# sub-buckets per power of two, the histogram values have a relative error below 1 / (SUB_BUCKETS / 2)
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+
+class LatencyHistogram:
+    """
+    A log-linear (HDR style) histogram of non negative integer values (microseconds).
+
+    Values below SUB_BUCKETS are recorded exactly, above that every power of two range is split in
+    HALF_SUB_BUCKETS linear buckets, so the memory used only grows with the log of the largest value.
+    """
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+    @staticmethod
+    def bucket_value(index: int) -> int:
+        """
+        The lowest value recorded in the bucket
+        """
+        if index < SUB_BUCKETS:
+            return index
+        shift, sub_bucket = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+        return (HALF_SUB_BUCKETS + sub_bucket) << (shift + 1)
+
+    def record(self, value: int):
+        value = max(0, value)
+        index = self.bucket_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> Optional[int]:
+        if self.count == 0:
+            return None
+        threshold = self.count * percentile / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count > 0 and seen >= threshold:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class DeliveryStats:
+    """
+    Aggregates the delivery reports of a producer, pass on_delivery as the produce callback
+
+    The errors can be read from another thread (the live stats server) with error_counts.
+    """
+
+    def __init__(self):
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.queue_full_retries = 0
+        self.errors: Counter = Counter()
+        self.latency = LatencyHistogram()
+        self._errors_lock = threading.Lock()
+
+    def __getstate__(self):
+        # the stats of the workers are sent back to the main process, locks can't be pickled
+        state = self.__dict__.copy()
+        del state["_errors_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._errors_lock = threading.Lock()
+
+    def on_delivery(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            # errors are rare, the lock doesn't slow down the delivery reports
+            with self._errors_lock:
+                self.errors[err.name()] += 1
+            return
+
+        self.delivered += 1
+        latency = msg.latency()
+        if latency is not None:
+            self.latency.record(int(latency * 1_000_000))
+
+    def merge(self, other: "DeliveryStats"):
+        self.produced += other.produced
+        self.delivered += other.delivered
+        self.failed += other.failed
+        self.queue_full_retries += other.queue_full_retries
+        with self._errors_lock:
+            self.errors.update(other.error_counts())
+        self.latency.merge(other.latency)
+
+    def error_counts(self) -> Mapping[str, int]:
+        """
+        A copy of the error counts (safe to call while the delivery reports are being processed)
+        """
+        with self._errors_lock:
+            return dict(self.errors)
+
+    def summary(self) -> Mapping[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value / 1000, 3)
+
+        latency = self.latency
+        return {
+            "produced": self.produced,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "pending": self.produced - self.delivered - self.failed,
+            "queue_full_retries": self.queue_full_retries,
+            "errors": self.error_counts(),
+            "latency_ms": {
+                "min": ms(latency.min),
+                "mean": ms(latency.mean),
+                "p50": ms(latency.percentile(50)),
+                "p90": ms(latency.percentile(90)),
+                "p99": ms(latency.percentile(99)),
+                "p99.9": ms(latency.percentile(99.9)),
+                "max": ms(latency.max),
+            },
+        }
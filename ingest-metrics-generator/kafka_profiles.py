@@ -0,0 +1,48 @@
+"""
+Named librdkafka producer tuning profiles.
+
+The same file is used by all the ingest-*-generator tools, keep the copies in sync.
+"""
+from typing import Any, Mapping, MutableMapping, Optional
+
+PROFILES: Mapping[str, Mapping[str, Any]] = {
+    # librdkafka defaults
+    "default": {},
+    # large, compressed batches and deep local queues so the generator is never the bottleneck
+    "throughput": {
+        "linger.ms": 50,
+        "batch.num.messages": 100000,
+        "batch.size": 4 * 1024 * 1024,
+        "compression.type": "lz4",
+        "queue.buffering.max.messages": 2000000,
+        "queue.buffering.max.kbytes": 4 * 1024 * 1024,
+        "acks": 1,
+    },
+    # send every message as soon as possible
+    "latency": {
+        "linger.ms": 0,
+        "batch.num.messages": 1000,
+        "compression.type": "none",
+        "socket.nagle.disable": True,
+        "acks": 1,
+    },
+    # idempotent producer, all in sync replicas must ack
+    "exactly-once-ish": {
+        "enable.idempotence": True,
+        "acks": "all",
+        "max.in.flight.requests.per.connection": 5,
+        "linger.ms": 20,
+        "compression.type": "zstd",
+    },
+}
+
+
+def get_kafka_config(
+    profile: Optional[str], kafka_settings: Mapping[str, Any]
+) -> MutableMapping[str, Any]:
+    """
+    Returns the effective producer config: the profile values overridden by the explicit kafka settings
+    """
+    config = dict(PROFILES[profile or "default"])
+    config.update(kafka_settings)
+    return config
@@ -0,0 +1,231 @@
+"""
+Live statistics of a running generator worker.
+
+Every worker periodically prints a JSON line (and optionally serves the same values in the Prometheus text
+format over HTTP) with the messages and bytes sent, the current rates, the producer queue depth, the
+delivery results and the number of distinct tag values emitted so far (estimated with HyperLogLog).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from counter_random import mix64_array
+from sinks import Sink
+
+# HyperLogLog registers = 2^precision, the standard error of the estimate is 1.04 / sqrt(2^precision)
+HLL_PRECISION = 12
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added, in constant memory (2^precision bytes).
+
+    Values are hashed with the python hash (so estimates are only comparable within a process tree)
+    and mixed with splitmix64, the register updates are vectorized.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        assert 4 <= precision <= 16
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_many(self, values: Sequence[Any]):
+        if len(values) == 0:
+            return
+        hashes = np.array([hash(value) for value in values], dtype=np.int64)
+        hashes = mix64_array(hashes.view(np.uint64))
+
+        rest_bits = np.uint64(64 - self.precision)
+        index = (hashes >> rest_bits).astype(np.int64)
+        # the rank is the position of the lowest set bit of the remaining bits (geometric, like the
+        # leading zeros of the original algorithm), the lowest set bit is a power of two so log2 is exact
+        rest = hashes & ((np.uint64(1) << rest_bits) - np.uint64(1))
+        lowest = rest & (~rest + np.uint64(1))
+        lowest[rest == 0] = np.uint64(1) << rest_bits
+        rank = np.log2(lowest.astype(np.float64)).astype(np.uint8) + np.uint8(1)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, value: Any):
+        self.add_many([value])
+
+    def merge(self, other: "HyperLogLog"):
+        assert self.precision == other.precision
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros > 0:
+            # small range correction (linear counting)
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class LiveStats:
+    """
+    Counts the messages sent by a worker and reports them every interval seconds (as a JSON line)
+    and, if a port is provided, on http://0.0.0.0:port/metrics in the Prometheus text format.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        worker: int,
+        interval: Optional[float],
+        port: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.sink = sink
+        self.worker = worker
+        self.interval = interval
+        self.messages = 0
+        self.bytes = 0
+        self.distinct_tag_values: Dict[str, HyperLogLog] = {}
+        # the metrics server thread reads distinct_tag_values while the sending thread adds to it
+        self._tags_lock = threading.Lock()
+        self._clock = clock
+        self._start = clock()
+        self._last_report = (self._start, 0, 0)
+        self._next_report = self._start + interval if interval else float("inf")
+        self._server = None
+        if port is not None:
+            self._server = _start_metrics_server(port, self)
+
+    def on_send(self, size: int):
+        self.messages += 1
+        self.bytes += size
+        now = self._clock()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            self.report(now)
+
+    def observe_tags(self, tag_keys: Sequence[str], tag_values: List[Sequence[str]]):
+        """
+        Adds the tag values of a batch of messages (one list of values, in tag_keys order, per message)
+        """
+        for pos, key in enumerate(tag_keys):
+            # most tags repeat a lot, only hash every value once per batch
+            values = list({values[pos] for values in tag_values})
+            with self._tags_lock:
+                hll = self.distinct_tag_values.get(key)
+                if hll is None:
+                    hll = self.distinct_tag_values[key] = HyperLogLog()
+                hll.add_many(values)
+
+    def snapshot(self, now: Optional[float] = None) -> Mapping[str, Any]:
+        if now is None:
+            now = self._clock()
+        last_time, last_messages, last_bytes = self._last_report
+        elapsed = max(now - last_time, 1e-9)
+
+        delivery = self.sink.delivery_stats()
+        with self._tags_lock:
+            distinct_tag_values = {
+                key: hll.estimate() for key, hll in self.distinct_tag_values.items()
+            }
+        return {
+            "worker": self.worker,
+            "elapsed": round(now - self._start, 3),
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "msgs_per_sec": round((self.messages - last_messages) / elapsed, 1),
+            "bytes_per_sec": round((self.bytes - last_bytes) / elapsed, 1),
+            "queue_depth": self.sink.queue_depth(),
+            "delivered": None if delivery is None else delivery.delivered,
+            "failed": None if delivery is None else delivery.failed,
+            "delivery_errors": None if delivery is None else delivery.error_counts(),
+            "distinct_tag_values": distinct_tag_values,
+        }
+
+    def report(self, now: Optional[float] = None):
+        if now is None:
+            now = self._clock()
+        # a single write so the lines of concurrent workers don't get mixed
+        print(f"Live stats: {json.dumps(self.snapshot(now))}\n", end="", flush=True)
+        self._last_report = (now, self.messages, self.bytes)
+
+    def close(self):
+        if self.interval:
+            self.report()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def prometheus(self) -> str:
+        """
+        The stats in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        worker = f'worker="{self.worker}"'
+        lines = [
+            "# TYPE generator_messages_total counter",
+            f"generator_messages_total{{{worker}}} {snapshot['messages']}",
+            "# TYPE generator_bytes_total counter",
+            f"generator_bytes_total{{{worker}}} {snapshot['bytes']}",
+        ]
+        if snapshot["queue_depth"] is not None:
+            lines += [
+                "# TYPE generator_queue_depth gauge",
+                f"generator_queue_depth{{{worker}}} {snapshot['queue_depth']}",
+            ]
+        if snapshot["delivered"] is not None:
+            lines += [
+                "# TYPE generator_delivered_total counter",
+                f"generator_delivered_total{{{worker}}} {snapshot['delivered']}",
+                "# TYPE generator_delivery_errors_total counter",
+            ]
+            lines += [
+                f'generator_delivery_errors_total{{{worker},error="{error}"}} {count}'
+                for error, count in snapshot["delivery_errors"].items()
+            ]
+        lines.append("# TYPE generator_distinct_tag_values gauge")
+        lines += [
+            f'generator_distinct_tag_values{{{worker},tag="{key}"}} {estimate}'
+            for key, estimate in snapshot["distinct_tag_values"].items()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _start_metrics_server(port: int, stats: LiveStats) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = stats.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # don't mix the access log with the generator output
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def get_live_stats(
+    settings: Mapping[str, Any], sink: Sink, worker: int
+) -> Optional[LiveStats]:
+    """
+    Returns the live stats of the given worker (None if neither the interval nor the port are set),
+    every worker serves its stats on stats_port + worker
+    """
+    interval = settings["stats_interval_seconds"]
+    port = settings["stats_port"]
+    if interval is None and port is None:
+        return None
+    if port is not None:
+        port += worker
+    return LiveStats(sink, worker, interval, port)
@@ -1,15 +1,45 @@
+import contextlib
 import datetime
 import json
-from typing import Mapping, Any, Optional
+import random
+import sys
+from typing import List, Mapping, Any, Optional, Tuple
 import time
 
 import click
-from confluent_kafka import Producer
 from yaml import load, dump, Dumper, Loader
 
-from metrics import generate_metric
+from metrics import VALUE_ENCODINGS, get_bin_encoding_len
+from metrics_batch import (
+    encode_metric_columns,
+    generate_metric_columns,
+    get_partition_keys,
+    get_tag_keys,
+    metric_messages,
+    PARTITION_KEYS,
+)
+from aggregation import BucketAggregator
+from timestamps import TIMESTAMP_SCHEDULES
 from util import parse_timedelta
 from readme_generator import generate_readme
+from sampling import AliasSampler, WeightedSampler
+from templates import orjson
+from workers import (
+    get_shard_ranges,
+    run_sharded,
+    print_throughput_report,
+    merge_delivery_stats,
+)
+from pacing import Pacer, RAMP_PROFILES
+from sinks import Sink, SINK_TYPES, get_sink, zstandard
+from corpus import CorpusReader, count_records
+from kafka_profiles import PROFILES, get_kafka_config
+from partitioning import check_partitioning
+from delivery import DeliveryStats
+from live_stats import LiveStats, get_live_stats
+
+# how the orgs and projects are picked (see _calculate_tenant_distributions)
+TENANT_DISTRIBUTIONS = ["uniform", "zipf", "weights"]
 
 
 @click.command()
@@ -37,6 +67,21 @@ from readme_generator import generate_readme
     is_flag=True,
     help="Should it generate a repeatable load or use a random generator (default: random)",
 )
+@click.option(
+    "--seed",
+    type=int,
+    help="Seed of the random generator (non repeatable runs), runs with the same seed generate the same messages (default: a random seed, printed with the settings)",
+)
+@click.option(
+    "--start-idx",
+    type=int,
+    help="Index of the first message sent, the run sends the messages [start-idx, stop-idx) of a run of num-messages messages. Resume an interrupted run by passing its seed, its --num-messages and the number of messages already sent as --start-idx (default: 0)",
+)
+@click.option(
+    "--stop-idx",
+    type=int,
+    help="Index after the last message sent, splits a run between several generators with the same seed and --num-messages (default: num-messages)",
+)
 @click.option(
     "--timestamp",
     type=int,
@@ -47,8 +92,48 @@ from readme_generator import generate_readme
     "-s",
     help="Time spread from timestamp backward, (e.g. 1w2d3h4m5s 1 week 2 days 3 hours 4 minutes 5 seconds)",
 )
+@click.option(
+    "--timestamp-schedule",
+    type=click.Choice(TIMESTAMP_SCHEDULES),
+    help="How the message timestamps are placed in the spread window: evenly spaced, random, the live wall clock time or following a daily (diurnal) curve (default: even for repeatable runs, random otherwise)",
+)
 @click.option("--org", "-o", type=int, help="organisation id")
 @click.option("--project", "-p", type=int, help="project id")
+@click.option(
+    "--num-orgs",
+    type=click.IntRange(min=1),
+    help="Number of organisations, ids from --org to --org + num-orgs - 1 (default: 1)",
+)
+@click.option(
+    "--org-distribution",
+    type=click.Choice(TENANT_DISTRIBUTIONS),
+    help="How organisations are picked: uniform, zipf (the lowest ids are the most frequent, exponent org_zipf_s) or weights (org_weights in the settings file)",
+)
+@click.option(
+    "--num-projects",
+    type=click.IntRange(min=1),
+    help="Number of projects, ids from the first project to first project + num-projects - 1 (default: the projects list)",
+)
+@click.option(
+    "--project-distribution",
+    type=click.Choice(TENANT_DISTRIBUTIONS),
+    help="How projects are picked: uniform, zipf (the lowest ids are the most frequent, exponent project_zipf_s) or weights (project_weights in the settings file)",
+)
+@click.option(
+    "--partition-key",
+    type=click.Choice(PARTITION_KEYS),
+    help="Kafka message key of the generated messages: the org id, the project id or none (default: org)",
+)
+@click.option(
+    "--hot-partition-fraction",
+    type=float,
+    help="Fraction of the messages sent to a single partition (--hot-partition) instead of the partition of their key (default: 0)",
+)
+@click.option(
+    "--hot-partition",
+    type=int,
+    help="The partition receiving the --hot-partition-fraction messages (default: 0)",
+)
 @click.option(
     "--releases",
     type=int,
@@ -92,6 +177,85 @@ from readme_generator import generate_readme
     type=int,
     help="max number of items in collections (sets & distributions)",
 )
+@click.option(
+    "--workers",
+    "-w",
+    type=int,
+    help="Number of producer processes, the messages are split evenly between them (default: 1)",
+)
+@click.option(
+    "--kafka-profile",
+    type=click.Choice(list(PROFILES)),
+    help="Producer tuning profile (batching, linger, compression and queue sizes), explicit [kafka] settings override it (default: default)",
+)
+@click.option(
+    "--encoder",
+    type=click.Choice(["template", "orjson", "json"]),
+    help="How messages are serialized: pre-rendered JSON templates, orjson (compact JSON) or json.dumps (default: template)",
+)
+@click.option(
+    "--value-encoding",
+    type=click.Choice(VALUE_ENCODINGS),
+    help="How set and distribution values are encoded: JSON arrays or packed base64 like Relay's bucket encoding (default: array)",
+)
+@click.option(
+    "--rate",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Target emission rate in messages per second (split between workers), by default messages are sent as fast as possible",
+)
+@click.option(
+    "--duration",
+    help="Send messages for the given duration (e.g. 1h30m), cycling through --num-messages messages",
+)
+@click.option(
+    "--ramp-up",
+    help="Ramp the rate up to --rate over the given duration (e.g. 5m)",
+)
+@click.option(
+    "--ramp-profile",
+    type=click.Choice(list(RAMP_PROFILES)),
+    help="How the rate increases during --ramp-up (default: linear)",
+)
+@click.option(
+    "--sink",
+    type=click.Choice(SINK_TYPES),
+    help="Where to send the messages: kafka, file (JSON lines, see --output), corpus (see --replay), stdout or null (discard) (default: kafka)",
+)
+@click.option(
+    "--output",
+    help="Output file for the file and corpus sinks, zstd compressed if it ends with .zst (file sink only). With several workers every worker writes its own file",
+)
+@click.option(
+    "--replay",
+    help="Replay the messages of a corpus file (written with --sink corpus) instead of generating them, --num-messages defaults to the corpus size",
+)
+@click.option(
+    "--rewrite-timestamps",
+    is_flag=True,
+    help="When replaying, shift the message timestamps so the corpus looks generated now",
+)
+@click.option(
+    "--bucket-interval",
+    help="Aggregate the generated messages in time buckets of this size (e.g. 10s) like Relay does, and send one message per bucket",
+)
+@click.option(
+    "--max-buckets",
+    type=click.IntRange(min=1),
+    help="Maximum number of buckets kept in memory when aggregating, the oldest bucket is sent when it is exceeded (default: 10000)",
+)
+@click.option(
+    "--stats-interval",
+    help="Print a JSON line with live stats (msgs/s, bytes/s, queue depth, delivery errors, distinct tag values) at this interval (e.g. 10s)",
+)
+@click.option(
+    "--stats-port",
+    type=click.IntRange(min=1, max=65535),
+    help="Serve the live stats in the Prometheus text format on http://0.0.0.0:PORT/metrics (worker N uses PORT + N)",
+)
+@click.option(
+    "--delivery-report",
+    help="Write the kafka delivery summary (delivered/failed counts and produce to ack latency percentiles) as JSON to this file",
+)
 @click.option("--dry-run", is_flag=True, help="if set only prints the settings")
 @click.option(
     "--update-docs", is_flag=True, help="creates a README.md  documentation file"
@@ -106,36 +270,266 @@ def main(**kwargs):
 
     settings = get_settings(**kwargs)
 
+    if settings["sink"] == "stdout":
+        # stdout only contains the messages, everything else goes to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            run(settings)
+    else:
+        run(settings)
+
+
+def run(settings):
     print("Settings:")
     print(settings)
 
-    if kwargs["dry_run"]:
-        return
+    print("Kafka producer config:")
+    print(settings["kafka_config"])
 
-    producer = get_kafka_producer(settings)
+    if settings["dry_run"]:
+        return
 
     print("Sending data...", flush=True)
-    send_metrics(producer, settings)
+    start = time.perf_counter()
+    results = run_sharded(settings, send_metrics_shard)
+    print_throughput_report(results, time.perf_counter() - start)
+
+    delivery = merge_delivery_stats(results)
+    if delivery is not None:
+        print_delivery_report(delivery, settings["delivery_report"])
 
     print("Done!")
 
 
-def send_metrics(producer, settings):
-    topic_name = settings["topic_name"]
-    for metric in generate_metrics(settings):
-        producer.produce(
-            topic_name, json.dumps(metric), headers=[("namespace", "sessions")]
+def print_delivery_report(delivery: DeliveryStats, report_file: Optional[str]):
+    summary = delivery.summary()
+    print(
+        f"delivered {summary['delivered']}/{summary['produced']} messages, "
+        f"{summary['failed']} failed, {summary['queue_full_retries']} queue full retries"
+    )
+    print(f"Delivery report: {json.dumps(summary)}", flush=True)
+
+    if report_file is not None:
+        with open(report_file, "wt") as f:
+            json.dump(summary, f, indent=2)
+
+
+def send_metrics_shard(
+    settings, worker: int, start_idx: int, stop_idx: int
+) -> Tuple[int, Optional[DeliveryStats]]:
+    """
+    Sends the messages with idx in [start_idx, stop_idx) using a dedicated sink
+
+    Returns the number of messages sent and the delivery stats of the sink (None if the sink
+    doesn't get delivery reports).
+    """
+    sink = get_sink(settings, worker)
+    count = send_metrics(sink, settings, start_idx, stop_idx, worker)
+    return count, sink.delivery_stats()
+
+
+def send_metrics(
+    sink: Sink,
+    settings,
+    start_idx: int = 0,
+    stop_idx: Optional[int] = None,
+    worker: int = 0,
+) -> int:
+    pacer = get_pacer(settings, worker)
+    stats = get_live_stats(settings, sink, worker)
+    aggregator = get_aggregator(settings)
+    # time bound runs cycle through the idx range until the duration elapses
+    cycle = settings["duration_seconds"] is not None
+
+    count = 0
+    messages = get_messages(settings, start_idx, stop_idx, cycle, stats, aggregator)
+    for key, metric in messages:
+        if pacer is not None and not pacer.acquire():
+            break
+        sink.send(metric, key)
+        count += 1
+        if stats is not None:
+            stats.on_send(len(metric))
+
+    sink.close()
+    if stats is not None:
+        stats.close()
+    if aggregator is not None:
+        # once per worker, whatever the number of passes over the idx range
+        print(
+            f"worker {worker}: aggregated {aggregator.num_values} messages into {aggregator.num_buckets} buckets",
+            flush=True,
         )
-        producer.poll(0)
+    return count
+
+
+def get_aggregator(settings) -> Optional[BucketAggregator]:
+    """
+    Returns the bucket aggregator of a worker (None if the messages are not aggregated)
+    """
+    if settings["replay"] is not None or settings["bucket_seconds"] is None:
+        return None
+    return BucketAggregator(
+        settings["bucket_seconds"],
+        settings["max_buckets"],
+        settings["value_encoding"],
+    )
+
+
+def get_messages(
+    settings,
+    start_idx: int,
+    stop_idx: Optional[int],
+    cycle: bool,
+    stats: Optional[LiveStats] = None,
+    aggregator: Optional[BucketAggregator] = None,
+):
+    """
+    Yields (key, message) for the encoded messages, either generated (and aggregated by aggregator, if
+    provided) or replayed from a corpus file (replayed messages have no key)
+
+    The tag values of the generated messages are passed to stats (if provided) before they are yielded.
+    """
+    if settings["replay"] is None:
+        if aggregator is not None:
+            yield from aggregate_metrics(
+                settings, start_idx, stop_idx, cycle, stats, aggregator
+            )
+        else:
+            yield from encode_metrics(settings, start_idx, stop_idx, cycle, stats)
+        return
+
+    if stop_idx is None:
+        stop_idx = settings["num_messages"]
+
+    reader = CorpusReader(settings["replay"])
+    try:
+        for message in reader.replay(
+            start_idx, stop_idx, cycle, settings["rewrite_timestamps"]
+        ):
+            yield None, message
+    finally:
+        reader.close()
+
+
+def encode_metrics(
+    settings,
+    start_idx: int = 0,
+    stop_idx: Optional[int] = None,
+    cycle: bool = False,
+    stats: Optional[LiveStats] = None,
+):
+    if stop_idx is None:
+        stop_idx = settings["num_messages"]
+
+    batch_size = settings["batch_size"]
+    tag_keys = get_tag_keys(settings)
+
+    for pass_start, pass_stop in get_passes(settings, start_idx, stop_idx, cycle):
+        for batch_start in range(pass_start, pass_stop, batch_size):
+            count = min(batch_size, pass_stop - batch_start)
+            columns = generate_metric_columns(batch_start, count, settings)
+            if stats is not None:
+                stats.observe_tags(tag_keys, columns.tag_values)
+            yield from zip(
+                get_partition_keys(columns, settings),
+                encode_metric_columns(columns, settings),
+            )
+
 
-    producer.flush()
+def get_passes(settings, start_idx: int, stop_idx: int, cycle: bool):
+    """
+    Yields the idx range of every pass over [start_idx, stop_idx): a single pass, or passes until the caller
+    stops if cycle.
 
+    The values of the non repeatable messages are derived from their idx, so every new pass is offset by
+    num_messages (the idx ranges of all the workers and passes stay disjoint) to generate different messages.
+    Repeatable runs send the same messages on every pass.
+    """
+    offset = 0 if settings["repeatable"] else settings["num_messages"]
+    pass_num = 0
+    while True:
+        yield start_idx + pass_num * offset, stop_idx + pass_num * offset
+        if not cycle or start_idx >= stop_idx:
+            return
+        pass_num += 1
 
-def generate_metrics(settings):
-    num_messages = settings["num_messages"]
 
-    for idx in range(num_messages):
-        yield generate_metric(idx, settings)
+def aggregate_metrics(
+    settings,
+    start_idx: int = 0,
+    stop_idx: Optional[int] = None,
+    cycle: bool = False,
+    stats: Optional[LiveStats] = None,
+    aggregator: Optional[BucketAggregator] = None,
+):
+    """
+    Generates the messages with idx in [start_idx, stop_idx) and yields (key, message) for the encoded
+    time buckets they aggregate to, all the buckets are flushed at the end of every pass over the idx range.
+    The aggregator (a new one if not provided) counts the messages and buckets of all the passes.
+
+    Buckets are serialized with orjson for the orjson encoder and with json.dumps otherwise.
+    """
+    if stop_idx is None:
+        stop_idx = settings["num_messages"]
+
+    # the aggregator merges the raw values and encodes the buckets with the configured value encoding
+    generation_settings = {**settings, "value_encoding": "array"}
+    if settings["encoder"] == "orjson":
+        dumps = orjson.dumps
+    else:
+
+        def dumps(bucket):
+            return json.dumps(bucket).encode("ascii")
+
+    partition_key = settings["partition_key"]
+
+    def keyed(bucket):
+        if partition_key == "none":
+            return None, dumps(bucket)
+        return str(bucket[f"{partition_key}_id"]).encode("ascii"), dumps(bucket)
+
+    batch_size = settings["batch_size"]
+    tag_keys = get_tag_keys(settings)
+
+    if aggregator is None:
+        aggregator = get_aggregator(settings)
+
+    for pass_start, pass_stop in get_passes(settings, start_idx, stop_idx, cycle):
+        for batch_start in range(pass_start, pass_stop, batch_size):
+            count = min(batch_size, pass_stop - batch_start)
+            columns = generate_metric_columns(batch_start, count, generation_settings)
+            if stats is not None:
+                stats.observe_tags(tag_keys, columns.tag_values)
+            for metric in metric_messages(columns, generation_settings):
+                for bucket in aggregator.add(metric):
+                    yield keyed(bucket)
+        for bucket in aggregator.flush():
+            yield keyed(bucket)
+
+
+def get_pacer(settings, worker: int) -> Optional[Pacer]:
+    """
+    Returns the pacer of the given worker
+    (or None if neither the rate nor the duration are limited)
+    """
+    rate = settings["rate"]
+    duration = settings["duration_seconds"]
+    if rate is None and duration is None:
+        return None
+
+    workers = len(get_shard_ranges(settings))
+    if rate is not None:
+        # every worker started sends its share of the total rate
+        rate = rate / workers
+
+    return Pacer(
+        rate=rate,
+        duration=duration,
+        ramp_up=settings["ramp_up_seconds"],
+        ramp_profile=settings["ramp_profile"],
+        report_interval=settings["report_interval"],
+        name=f"worker {worker}: " if workers > 1 else "",
+    )
 
 
 def get_settings(
@@ -144,9 +538,20 @@ def get_settings(
     topic_name: Optional[str],
     broker: Optional[str],
     repeatable: bool,
+    seed: Optional[int],
+    start_idx: Optional[int],
+    stop_idx: Optional[int],
     org: Optional[int],
     project: Optional[int],
+    num_orgs: Optional[int],
+    org_distribution: Optional[str],
+    num_projects: Optional[int],
+    project_distribution: Optional[str],
+    partition_key: Optional[str],
+    hot_partition_fraction: Optional[float],
+    hot_partition: Optional[int],
     timestamp: Optional[int],
+    timestamp_schedule: Optional[str],
     spread: Optional[str],
     releases: Optional[str],
     releases_unique_rate: Optional[str],
@@ -157,15 +562,42 @@ def get_settings(
     extra_tags_unique_rate: Optional[int],
     col_min: Optional[int],
     col_max: Optional[int],
+    workers: Optional[int],
+    kafka_profile: Optional[str],
+    encoder: Optional[str],
+    value_encoding: Optional[str],
+    rate: Optional[float],
+    duration: Optional[str],
+    ramp_up: Optional[str],
+    ramp_profile: Optional[str],
+    sink: Optional[str],
+    output: Optional[str],
+    replay: Optional[str],
+    rewrite_timestamps: bool,
+    delivery_report: Optional[str],
+    bucket_interval: Optional[str],
+    max_buckets: Optional[int],
+    stats_interval: Optional[str],
+    stats_port: Optional[int],
     dry_run: bool,
     **kwargs,
 ):
     # default settings
     settings = {
-        "num_messages": 100,
+        # defaults to 100 (or to the size of the corpus when replaying)
+        "num_messages": None,
         "topic_name": "ingest-metrics",
         "repeatable": False,
+        # defaults to a random seed
+        "seed": None,
+        "start_idx": 0,
+        # defaults to num_messages
+        "stop_idx": None,
         "spread": "2m",
+        # defaults to even for repeatable runs and to random otherwise
+        "timestamp_schedule": None,
+        "diurnal_amplitude": 0.8,
+        "diurnal_peak_hour": 14,
         "releases": 1,
         "releases_unique_rate": 0,
         "environments": 1,
@@ -175,8 +607,41 @@ def get_settings(
         "extra_tags_unique_rate": 0,
         "col_min": 1,
         "col_max": 1,
+        "workers": 1,
+        "batch_size": 1000,
+        "encoder": "template",
+        "value_encoding": "array",
+        "rate": None,
+        "duration": None,
+        "ramp_up": None,
+        "ramp_profile": "linear",
+        "report_interval": 10,
+        "sink": "kafka",
+        "output": None,
+        "replay": None,
+        "rewrite_timestamps": False,
+        "delivery_report": None,
+        # aggregation is disabled unless a bucket interval is set
+        "bucket_interval": None,
+        "max_buckets": 10000,
+        # live stats are disabled unless an interval or a port is set
+        "stats_interval": None,
+        "stats_port": None,
         "kafka": {},
+        "kafka_profile": "default",
         "metric_types": {},
+        # a single org and the projects list unless set (see _calculate_tenant_distributions)
+        "num_orgs": None,
+        "org_distribution": None,
+        "org_zipf_s": 1.0,
+        "org_weights": None,
+        "num_projects": None,
+        "project_distribution": None,
+        "project_zipf_s": 1.0,
+        "project_weights": None,
+        "partition_key": "org",
+        "hot_partition_fraction": 0.0,
+        "hot_partition": 0,
     }
 
     if settings_file is not None:
@@ -192,6 +657,16 @@ def get_settings(
     if repeatable:
         settings["repeatable"] = True
 
+    if seed is not None:
+        settings["seed"] = seed
+
+    if settings["seed"] is None:
+        if settings["repeatable"]:
+            settings["seed"] = 0
+        else:
+            # chosen once so that all the workers share it (and so that the run can be reproduced or resumed)
+            settings["seed"] = random.getrandbits(63)
+
     if broker is not None:
         settings["kafka"]["bootstrap.servers"] = broker
 
@@ -201,21 +676,70 @@ def get_settings(
     if project is not None:
         settings["projects"] = [project]
 
-    if settings["kafka"].get("bootstrap.servers") is None:
+    if sink is not None:
+        settings["sink"] = sink
+
+    if output is not None:
+        settings["output"] = output
+
+    if replay is not None:
+        settings["replay"] = replay
+
+    if rewrite_timestamps:
+        settings["rewrite_timestamps"] = True
+
+    if delivery_report is not None:
+        settings["delivery_report"] = delivery_report
+
+    if kafka_profile is not None:
+        settings["kafka_profile"] = kafka_profile
+
+    if settings["kafka_profile"] not in PROFILES:
+        raise click.UsageError(
+            f"Invalid 'kafka_profile': should be one of {', '.join(PROFILES)}"
+        )
+
+    settings["kafka_config"] = get_kafka_config(
+        settings["kafka_profile"], settings["kafka"]
+    )
+
+    if settings["sink"] == "kafka" and settings["kafka"].get("bootstrap.servers") is None:
         raise click.UsageError(
             f"Kafka broker was not specified, to specify either use --broker argument or set [kafka][bootstrap.servers] in the settings file"
         )
 
-    if settings.get("org") is None:
+    # replayed messages are already generated, they don't need the generation settings
+    if settings.get("org") is None and settings["replay"] is None:
         raise click.UsageError(
             f"Organization was not specified, to specify either use --org argument or set [org] in the settings file"
         )
 
-    if settings.get("projects") is None:
+    if settings.get("projects") is None and settings["replay"] is None:
         raise click.UsageError(
             f"projects not specified, to specify either use --project argument or set [project] array in the settings file"
         )
 
+    for name, value in (
+        ("num_orgs", num_orgs),
+        ("org_distribution", org_distribution),
+        ("num_projects", num_projects),
+        ("project_distribution", project_distribution),
+        ("partition_key", partition_key),
+        ("hot_partition_fraction", hot_partition_fraction),
+        ("hot_partition", hot_partition),
+    ):
+        if value is not None:
+            settings[name] = value
+
+    if settings["partition_key"] not in PARTITION_KEYS:
+        raise click.UsageError(
+            f"Invalid 'partition_key': should be one of {', '.join(PARTITION_KEYS)}"
+        )
+
+    error = check_partitioning(settings)
+    if error is not None:
+        raise click.UsageError(error)
+
     if timestamp is not None:
         settings["timestamp"] = timestamp
     else:
@@ -234,6 +758,22 @@ def get_settings(
             except ValueError:
                 pass  # ignore non integer command line args
 
+    if settings["replay"] is not None:
+        try:
+            settings["replay_records"] = count_records(settings["replay"])
+        except (OSError, ValueError) as e:
+            raise click.UsageError(f"Could not read corpus file: {e}")
+        if settings["replay_records"] == 0:
+            raise click.UsageError(f"Empty corpus file {settings['replay']}")
+
+    if settings["num_messages"] is None:
+        if settings["replay"] is not None:
+            settings["num_messages"] = settings["replay_records"]
+        else:
+            settings["num_messages"] = 100
+
+    _calculate_idx_range(settings, start_idx, stop_idx)
+
     if releases_unique_rate is not None:
         settings["releases_unique_rate"] = float(releases_unique_rate)
         if not (0 <= settings["releases_unique_rate"] <= 1):
@@ -270,6 +810,44 @@ def get_settings(
     if spread is not None:
         settings["spread"] = spread
 
+    if workers is not None:
+        settings["workers"] = workers
+
+    if settings["workers"] < 1:
+        raise click.UsageError("Invalid 'workers': should be at least 1")
+
+    _validate_sink(settings)
+
+    if settings["batch_size"] < 1:
+        raise click.UsageError("Invalid 'batch_size': should be at least 1")
+
+    if encoder is not None:
+        settings["encoder"] = encoder
+
+    if settings["encoder"] not in ("template", "orjson", "json"):
+        raise click.UsageError(
+            f"Invalid 'encoder': {settings['encoder']} should be one of template, orjson or json"
+        )
+
+    if settings["encoder"] == "orjson" and orjson is None:
+        raise click.UsageError("The orjson encoder requires the orjson package")
+
+    if value_encoding is not None:
+        settings["value_encoding"] = value_encoding
+
+    if settings["value_encoding"] not in VALUE_ENCODINGS:
+        raise click.UsageError(
+            f"Invalid 'value_encoding': {settings['value_encoding']} should be one of {', '.join(VALUE_ENCODINGS)}"
+        )
+
+    _calculate_pacing(settings, rate, duration, ramp_up, ramp_profile)
+
+    _calculate_aggregation(settings, bucket_interval, max_buckets)
+
+    _calculate_timestamp_schedule(settings, timestamp_schedule)
+
+    _calculate_live_stats(settings, stats_interval, stats_port)
+
     time_delta = parse_timedelta(settings["spread"])
     if time_delta is None:
         time_delta = datetime.timedelta(minutes=1)
@@ -279,61 +857,265 @@ def get_settings(
     settings["dry_run"] = dry_run
 
     _calculate_metrics_distribution(settings)
+    _calculate_tenant_distributions(settings)
     return settings
 
 
-def _calculate_metrics_distribution(settings):
+def _validate_sink(settings):
+    if settings["sink"] not in SINK_TYPES:
+        raise click.UsageError(
+            f"Invalid 'sink': should be one of {', '.join(SINK_TYPES)}"
+        )
+
+    if settings["sink"] in ("file", "corpus"):
+        output = settings["output"]
+        if output is None:
+            raise click.UsageError(
+                f"The {settings['sink']} sink requires an --output file"
+            )
+        if settings["sink"] == "file" and output.endswith(".zst") and zstandard is None:
+            raise click.UsageError(
+                "Writing .zst files requires the zstandard package"
+            )
+
+    if settings["sink"] == "stdout" and settings["workers"] > 1:
+        raise click.UsageError("The stdout sink can only be used with a single worker")
+
+
+def _calculate_pacing(
+    settings,
+    rate: Optional[float],
+    duration: Optional[str],
+    ramp_up: Optional[str],
+    ramp_profile: Optional[str],
+):
+    """
+    Validates the pacing settings and converts the durations to seconds
     """
-    Creates a helper array that has precalculated cumulative distributions for various metric types.
+    for name, value in (
+        ("rate", rate),
+        ("duration", duration),
+        ("ramp_up", ramp_up),
+        ("ramp_profile", ramp_profile),
+    ):
+        if value is not None:
+            settings[name] = value
 
-    Example:
-    If original metric types relative distributions are: { "metric-1": 3, "metric-2": 1, "metric-3": 5 }
-    The calculated metric distribution will be: dist= [ ("metric-1", 3), ("metric-2", 4), ("metric-3": 9)]
-    That is metric-1 = original metric-1, metric-2 = metric-1 + original metric-2, metric-3 = metric-2 + original metric-3
-    Use the array like this:
-    idx = random.randint(1, dist[len(dist)-1][1])
-    for d in dist:
-        if idx <= d[1]:
-            return d[0]
-    return None
+    if settings["rate"] is not None and settings["rate"] <= 0:
+        raise click.UsageError("Invalid 'rate': should be greater than 0")
+
+    if settings["ramp_profile"] not in RAMP_PROFILES:
+        raise click.UsageError(
+            f"Invalid 'ramp_profile': should be one of {', '.join(RAMP_PROFILES)}"
+        )
+
+    for name in ("duration", "ramp_up"):
+        seconds = None
+        if settings[name] is not None:
+            delta = parse_timedelta(str(settings[name]))
+            if delta is None or delta.total_seconds() <= 0:
+                raise click.UsageError(
+                    f"Invalid '{name}': {settings[name]} (expected something like 1h30m)"
+                )
+            seconds = delta.total_seconds()
+        settings[f"{name}_seconds"] = seconds
+
+    if settings["ramp_up_seconds"] is None:
+        settings["ramp_up_seconds"] = 0.0
+
+
+def _calculate_aggregation(
+    settings, bucket_interval: Optional[str], max_buckets: Optional[int]
+):
     """
-    dist = []
-    count = 0
-    for k, v in settings["metric_types"].items():
-        count += v
-        dist.append((k, count))
+    Validates the aggregation settings and converts the bucket interval to seconds
+    """
+    if bucket_interval is not None:
+        settings["bucket_interval"] = bucket_interval
+
+    if max_buckets is not None:
+        settings["max_buckets"] = max_buckets
+
+    settings["bucket_seconds"] = None
+    if settings["bucket_interval"] is None:
+        return
 
-    settings["metric_distribution"] = dist
+    delta = parse_timedelta(str(settings["bucket_interval"]))
+    if delta is None or delta.total_seconds() < 1:
+        raise click.UsageError(
+            f"Invalid 'bucket_interval': {settings['bucket_interval']} (expected something like 10s)"
+        )
+    settings["bucket_seconds"] = int(delta.total_seconds())
+
+    if settings["max_buckets"] < 1:
+        raise click.UsageError("Invalid 'max_buckets': should be at least 1")
+
+    if settings["replay"] is not None:
+        raise click.UsageError("Replayed messages can't be aggregated")
 
+    if get_bin_encoding_len(settings):
+        raise click.UsageError("bin_encoding_len distributions can't be aggregated")
 
-def get_fake_kafka_producer(settings):
+
+def _calculate_idx_range(settings, start_idx: Optional[int], stop_idx: Optional[int]):
     """
-    A fake producer that just dumps to console (for testing)
+    Validates the idx range [start_idx, stop_idx) sent by this run
+
+    num_messages stays the size of the whole (logical) run, the values and timestamps of the messages
+    depend on it, so a run split in several ranges sends the same messages as a single run.
     """
+    if start_idx is not None:
+        settings["start_idx"] = start_idx
 
-    class FakeProducer:
-        def __init__(self, settings):
-            pass
+    if stop_idx is not None:
+        settings["stop_idx"] = stop_idx
 
-        def produce(self, topic_name, message):
-            print(message)
+    if settings["stop_idx"] is None:
+        settings["stop_idx"] = settings["num_messages"]
 
-        def flush(self):
-            print("Flushing !!! ")
+    if not (0 <= settings["start_idx"] <= settings["stop_idx"] <= settings["num_messages"]):
+        raise click.UsageError(
+            "Invalid 'start_idx'/'stop_idx': should be 0 <= start_idx <= stop_idx <= num_messages"
+        )
 
-    return FakeProducer(settings)
 
+def _calculate_timestamp_schedule(settings, timestamp_schedule: Optional[str]):
+    """
+    Validates the timestamp schedule settings (see timestamps.py)
+    """
+    if timestamp_schedule is not None:
+        settings["timestamp_schedule"] = timestamp_schedule
+
+    schedule = settings["timestamp_schedule"]
+    if schedule is not None and schedule not in TIMESTAMP_SCHEDULES:
+        raise click.UsageError(
+            f"Invalid 'timestamp_schedule': should be one of {', '.join(TIMESTAMP_SCHEDULES)}"
+        )
+
+    if not (0 <= settings["diurnal_amplitude"] <= 1):
+        raise click.UsageError(
+            "Invalid 'diurnal_amplitude': should be between 0.0 and 1.0"
+        )
 
-def get_kafka_producer(settings):
+    if not (0 <= settings["diurnal_peak_hour"] < 24):
+        raise click.UsageError("Invalid 'diurnal_peak_hour': should be in [0, 24)")
+
+    if schedule == "live" and settings["rate"] is not None:
+        # batches are generated before they are sent, keep them to about one second of messages
+        # so that the timestamps follow the clock
+        worker_rate = int(settings["rate"] / len(get_shard_ranges(settings)))
+        settings["batch_size"] = max(1, min(settings["batch_size"], worker_rate))
+
+
+def _calculate_live_stats(
+    settings, stats_interval: Optional[str], stats_port: Optional[int]
+):
     """
-    Returns a kafka producer configured with the
-    settings found in the settings["kafka"] sub-object
+    Validates the live stats settings and converts the interval to seconds
+    """
+    if stats_interval is not None:
+        settings["stats_interval"] = stats_interval
+
+    if stats_port is not None:
+        settings["stats_port"] = stats_port
 
-    At a minimum the settings should contain:
-        bootstrap.server: host-name:port-number
+    settings["stats_interval_seconds"] = None
+    if settings["stats_interval"] is not None:
+        delta = parse_timedelta(str(settings["stats_interval"]))
+        if delta is None or delta.total_seconds() <= 0:
+            raise click.UsageError(
+                f"Invalid 'stats_interval': {settings['stats_interval']} (expected something like 10s)"
+            )
+        settings["stats_interval_seconds"] = delta.total_seconds()
+
+    port = settings["stats_port"]
+    if port is not None and not (0 < port and port + settings["workers"] <= 65536):
+        raise click.UsageError("Invalid 'stats_port': should be a valid port number")
+
+
+def _calculate_tenant_distributions(settings):
+    """
+    Creates the alias samplers picking the org and project ids of the messages (O(1) per message).
+
+    The org ids are org, org + 1, ... org + num_orgs - 1, the project ids are the projects list or, if
+    num_projects is set, projects[0], projects[0] + 1, ... projects[0] + num_projects - 1.
+    The distributions are:
+        uniform: all the ids are equally likely
+        zipf: the id of rank k (starting at 1) has a weight of 1 / k^s (s is org_zipf_s / project_zipf_s)
+        weights: the ids and their weights come from the org_weights / project_weights mapping
+
+    Without a distribution (and without num_orgs / num_projects) all the messages use org and the projects
+    are picked as before (round robin in repeatable mode, uniform otherwise), the sampler is None.
+    """
+    if settings.get("replay") is not None:
+        settings["org_sampler"] = None
+        settings["project_sampler"] = None
+        return
+
+    settings["org_sampler"] = _get_id_sampler(settings, "org", [settings["org"]])
+    settings["project_sampler"] = _get_id_sampler(
+        settings, "project", settings["projects"]
+    )
+
+
+def _get_id_sampler(settings, name: str, ids: List[int]) -> Optional[AliasSampler]:
+    distribution = settings.get(f"{name}_distribution")
+    count = settings.get(f"num_{name}s")
+    weights = settings.get(f"{name}_weights")
+
+    if distribution is None:
+        if weights:
+            distribution = "weights"
+        elif count is not None:
+            distribution = "uniform"
+        else:
+            return None
+
+    if distribution not in TENANT_DISTRIBUTIONS:
+        raise click.UsageError(
+            f"Invalid '{name}_distribution': should be one of {', '.join(TENANT_DISTRIBUTIONS)}"
+        )
+
+    if distribution == "weights":
+        if not weights:
+            raise click.UsageError(
+                f"The weights {name}_distribution needs a '{name}_weights' mapping of ids to weights"
+            )
+        try:
+            return AliasSampler.from_mapping(
+                {int(id): float(weight) for id, weight in weights.items()}
+            )
+        except (AttributeError, TypeError, ValueError) as e:
+            raise click.UsageError(f"Invalid '{name}_weights': {e}")
+
+    if count is not None:
+        if count < 1:
+            raise click.UsageError(f"Invalid 'num_{name}s': should be at least 1")
+        ids = list(range(ids[0], ids[0] + count))
+
+    if distribution == "uniform":
+        return AliasSampler.uniform(ids)
+
+    s = float(settings.get(f"{name}_zipf_s", 1.0))
+    if s < 0:
+        raise click.UsageError(f"Invalid '{name}_zipf_s': should be at least 0")
+    return AliasSampler.zipf(ids, s)
+
+
+def _calculate_metrics_distribution(settings):
+    """
+    Creates a sampler with precalculated cumulative distributions for the various metric types.
+
+    Example:
+    If original metric types relative distributions are: { "metric-1": 3, "metric-2": 1, "metric-3": 5 }
+    The cumulative distribution will be: [ ("metric-1", 3), ("metric-2", 4), ("metric-3": 9)]
+    That is metric-1 = original metric-1, metric-2 = metric-1 + original metric-2, metric-3 = metric-2 + original metric-3
+    The sampler finds the metric for a value in [1, 9] with a binary search over the cumulative distribution
+    (see WeightedSampler).
     """
-    kafka_settings = settings["kafka"]
-    return Producer(kafka_settings)
+    settings["metric_distribution"] = WeightedSampler.from_mapping(
+        settings["metric_types"]
+    )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,22 @@
-from typing import Callable, Mapping, Any, List, Optional
-import random
+from typing import Callable, Mapping, Any, List, Optional, Tuple, Union
+import base64
+import functools
 import string
+import struct
+import sys
+
+from counter_random import get_random
+from sampling import AliasSampler
+import timestamps
+
+# the predefined range of a tag is rendered once per run if it has at most this many values (larger ranges,
+# and the unique values, are rendered for every message)
+MAX_PREDEFINED_TAG_VALUES = 100000
+
+# how set and distribution values are encoded:
+#   array: JSON arrays of numbers
+#   base64: Relay's bucket value encoding, packed little-endian uint32 (sets) or float64 (distributions), base64 encoded
+VALUE_ENCODINGS = ["array", "base64"]
 
 
 def generate_metric(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
@@ -11,23 +27,14 @@ def generate_metric(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
 
 
 def _get_metric_type(idx: int, settings: Mapping[str, Any]) -> Optional[str]:
-    dist = settings["metric_distribution"]
+    sampler = settings["metric_distribution"]
 
-    if len(dist) == 0:
+    if len(sampler) == 0:
         return None
 
-    max_val = dist[-1][1]
-
     if is_repeatable(settings):
-        i = idx % max_val
-    else:
-        i = random.randint(1, max_val)
-
-    for name, val in dist:
-        if i <= val:
-            return name
-
-    return None
+        return sampler.pick(idx % sampler.total)
+    return sampler.pick(get_random(settings).randint("metric_type", idx, 1, sampler.total))
 
 
 def _get_metric_generator(
@@ -49,31 +56,60 @@ def get_bin_encoding_len(settings) -> Optional[int]:
     return settings.get("bin_encoding_len")
 
 
+def get_value_encoding(settings) -> str:
+    return settings.get("value_encoding", "array")
+
+
+def encode_base64_value(data: bytes) -> Mapping[str, str]:
+    """
+    A set or distribution value in the base64 format of Relay's bucket encoding (data is the packed values)
+    """
+    return {"format": "base64", "data": base64.b64encode(data).decode("ascii")}
+
+
+def encode_base64_set(values: List[int]) -> Mapping[str, str]:
+    # set values are 32 bit integers
+    return encode_base64_value(
+        struct.pack(f"<{len(values)}I", *[value & 0xFFFFFFFF for value in values])
+    )
+
+
+def encode_base64_distribution(values: List[float]) -> Mapping[str, str]:
+    return encode_base64_value(struct.pack(f"<{len(values)}d", *values))
+
+
+def pick_id(
+    sampler: AliasSampler, stream: str, idx: int, settings: Mapping[str, Any]
+) -> int:
+    rnd = get_random(settings)
+    return sampler.pick(rnd.random(stream, idx, 0), rnd.random(stream, idx, 1))
+
+
 def _get_org_id(idx: int, settings: Mapping[str, Any]) -> int:
-    # only one org no choice
-    return settings["org"]
+    sampler = settings["org_sampler"]
+    if sampler is None:
+        # only one org no choice
+        return settings["org"]
+    return pick_id(sampler, "org", idx, settings)
 
 
 def _get_project_id(idx: int, settings: Mapping[str, Any]) -> int:
+    sampler = settings["project_sampler"]
+    if sampler is not None:
+        return pick_id(sampler, "project", idx, settings)
+
     projects = settings["projects"]
 
     if is_repeatable(settings):
         proj_idx = idx % len(projects)
     else:
-        proj_idx = random.randint(0, len(projects) - 1)
+        proj_idx = get_random(settings).randint("project", idx, 0, len(projects) - 1)
     return projects[proj_idx]
 
 
 def _get_timestamp(idx: int, settings: Mapping[str, Any]) -> int:
-    base_seconds = int(settings["time_delta"].total_seconds())
-    num_messages = settings["num_messages"]
-    if is_repeatable(settings):
-        step = max(1, int(base_seconds / num_messages))
-        offset = step * idx
-    else:
-        offset = random.randint(0, base_seconds)
-    timestamp = settings["timestamp"] - offset
-    return timestamp
+    # see timestamps.py for the available schedules
+    return timestamps.timestamp(idx, settings)
 
 
 def _get_num_elements_in_collection(idx: int, settings: Mapping[str, Any]) -> int:
@@ -85,38 +121,55 @@ def _get_num_elements_in_collection(idx: int, settings: Mapping[str, Any]) -> in
         step = max(1, int(col_range / num_messages))
         offset = step * idx % col_range
     else:
-        offset = random.randint(0, col_range - 1)
+        offset = get_random(settings).randint("collection_size", idx, 0, col_range - 1)
 
     return settings["col_min"] + offset
 
 
-def _get_set(idx: int, settings: Mapping[str, Any]) -> List[int]:
+def _get_set(idx: int, settings: Mapping[str, Any]) -> Union[List[int], Mapping[str, str]]:
     num_elms = _get_num_elements_in_collection(idx, settings)
 
     if is_repeatable(settings):
-        return [idx + i for i in range(num_elms)]
+        values = [idx + i for i in range(num_elms)]
     else:
-        return [random.randint(1, 9999) for i in range(num_elms)]
+        rnd = get_random(settings)
+        values = [rnd.randint("set", idx, 1, 9999, i) for i in range(num_elms)]
+
+    if get_value_encoding(settings) == "base64":
+        return encode_base64_set(values)
+    return values
 
 
 def _get_distribution(idx: int, settings: Mapping[str, Any]) -> List[float]:
     num_elms = _get_num_elements_in_collection(idx, settings)
 
+    rnd = get_random(settings)
+
     if bin_encoding_len := get_bin_encoding_len(settings):
+        letters = string.ascii_letters
         return "".join(
             [
-                random.choice(string.ascii_letters)
-                for _ in range(num_elms * bin_encoding_len)
+                letters[rnd.randint("distribution_bin", idx, 0, len(letters) - 1, i)]
+                for i in range(num_elms * bin_encoding_len)
             ]
         )
 
     if is_repeatable(settings):
-        return [(idx + i) * 5 + 0.1 for i in range(num_elms)]
-    return [random.random() * 999 for i in range(num_elms)]
+        values = [(idx + i) * 5 + 0.1 for i in range(num_elms)]
+    else:
+        values = [rnd.random("distribution", idx, i) * 999 for i in range(num_elms)]
+
+    if get_value_encoding(settings) == "base64":
+        return encode_base64_distribution(values)
+    return values
 
 
 def _get_tag_num_with_unique_rate(
-    idx: int, settings: Mapping[str, Any], num_predefined: int, unique_rate: float
+    idx: int,
+    settings: Mapping[str, Any],
+    num_predefined: int,
+    unique_rate: float,
+    stream: str = "tag",
 ) -> int:
     """
     Return a tag number (id) based on the provided inputs.
@@ -130,6 +183,7 @@ def _get_tag_num_with_unique_rate(
     For example: if "unique_rate" is 0.25 and "num_predefined" is 300, (approximately) every fourth returned
     id will be a new, unique id never seen before. All other returned ids will be in the range [1, 300].
 
+    "stream" names the random stream used in non repeatable mode (so that different tags are independent).
     """
     assert 0.0 <= unique_rate <= 1.0
     assert num_predefined > 0
@@ -145,7 +199,7 @@ def _get_tag_num_with_unique_rate(
             if idx % scale_param + 1 <= scale_param * unique_rate:
                 tag_num = idx + shift
         else:
-            if random.random() < unique_rate:
+            if get_random(settings).random(stream, idx) < unique_rate:
                 tag_num = idx + shift
 
     # Process the case when the unique rate is 0 (i.e., no unique tags needed), or as a
@@ -154,27 +208,65 @@ def _get_tag_num_with_unique_rate(
         if is_repeatable(settings):
             tag_num = idx % num_predefined + 1
         else:
-            tag_num = random.randint(1, num_predefined)
+            tag_num = get_random(settings).randint(stream, idx, 1, num_predefined, 1)
 
     return tag_num
 
 
+@functools.lru_cache(maxsize=None)
+def get_predefined_tag_values(template: str, num_predefined: int) -> Tuple[str, ...]:
+    """
+    The rendered values of the predefined range [1, num_predefined] of a tag (template is a str.format
+    template like "env-{}"), indexed by tag number. Empty for ranges larger than MAX_PREDEFINED_TAG_VALUES.
+
+    >>> get_predefined_tag_values("env-{}", 2)[1:]
+    ('env-1', 'env-2')
+    """
+    if num_predefined > MAX_PREDEFINED_TAG_VALUES:
+        return ()
+    return tuple(template.format(tag_num) for tag_num in range(num_predefined + 1))
+
+
+def render_tag_value(template: str, tag_num: int, predefined_values: Tuple[str, ...]) -> str:
+    """
+    Renders a tag value, predefined_values is get_predefined_tag_values(template, num_predefined).
+
+    Values in the predefined range are looked up, unique values (see _get_tag_num_with_unique_rate) are never
+    repeated so they are formatted.
+    """
+    if tag_num < len(predefined_values):
+        return predefined_values[tag_num]
+    return template.format(tag_num)
+
+
+@functools.lru_cache(maxsize=None)
+def get_extra_tag_keys(num_extra_tags: int) -> Tuple[str, ...]:
+    """
+    The (interned) extra tag keys, rendered once per run
+    """
+    return tuple(sys.intern(f"extra-tag-{i}") for i in range(num_extra_tags))
+
+
 def _get_release(idx: int, settings: Mapping[str, Any]) -> str:
     releases = settings["releases"]
     rate = settings["releases_unique_rate"]
 
-    rel_num = _get_tag_num_with_unique_rate(idx, settings, releases, rate)
+    rel_num = _get_tag_num_with_unique_rate(idx, settings, releases, rate, "release")
 
-    return f"v{rel_num}.1.1"
+    template = "v{}.1.1"
+    return render_tag_value(template, rel_num, get_predefined_tag_values(template, releases))
 
 
 def _get_environment(idx: int, settings: Mapping[str, Any]) -> str:
     environments = settings["environments"]
     rate = settings["environments_unique_rate"]
 
-    env_num = _get_tag_num_with_unique_rate(idx, settings, environments, rate)
+    env_num = _get_tag_num_with_unique_rate(
+        idx, settings, environments, rate, "environment"
+    )
 
-    return f"env-{env_num}"
+    template = "env-{}"
+    return render_tag_value(template, env_num, get_predefined_tag_values(template, environments))
 
 
 def _get_tags(idx: int, settings: Mapping[str, Any]) -> Mapping[str, str]:
@@ -186,12 +278,13 @@ def _get_tags(idx: int, settings: Mapping[str, Any]) -> Mapping[str, str]:
     num = settings["num_extra_tags"]
     predefined_values = settings["extra_tags_values"]
     rate = settings["extra_tags_unique_rate"]
+    values = get_predefined_tag_values("extra-value-{}", predefined_values)
 
-    for i in range(num):
+    for i, key in enumerate(get_extra_tag_keys(num)):
         value = _get_tag_num_with_unique_rate(
-            idx * num + i, settings, predefined_values, rate
+            idx * num + i, settings, predefined_values, rate, "extra_tag"
         )
-        tags[f"extra-tag-{i}"] = f"extra-value-{value}"
+        tags[key] = render_tag_value("extra-value-{}", value, values)
 
     return tags
 
@@ -0,0 +1,521 @@
+"""
+Batch (vectorized) generation of metric messages.
+
+Computes all the per message values (metric type, project, timestamp, tag numbers, collection sizes...)
+for a whole block of indexes with NumPy and only materializes the messages (dicts or encoded JSON) at the end.
+In repeatable mode the generated messages are identical to the ones generated by metrics.generate_metric.
+"""
+import base64
+import functools
+import json
+import string
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional
+
+import numpy as np
+
+from metrics import (
+    is_repeatable,
+    get_bin_encoding_len,
+    get_random,
+    get_value_encoding,
+    get_extra_tag_keys,
+    get_predefined_tag_values,
+)
+from sampling import AliasSampler
+import timestamps
+from templates import MetricTemplate, orjson
+
+# name, unit, type and session.status for every metric type (the same as the generators in metrics.py)
+METRIC_SPECS = {
+    "session": ("c:sessions/session@none", "", "c", "init"),
+    "user": ("s:sessions/user@none", "", "s", "init"),
+    "session.error": ("s:sessions/error@none", "", "s", "errored_preaggr"),
+    "session.duration": ("d:sessions/duration@second", "s", "d", "exited"),
+}
+DEFAULT_METRIC_SPEC = ("c:sessions/default@none", "", "c", None)
+
+# the kafka message key of the messages (see get_partition_keys)
+PARTITION_KEYS = ["org", "project", "none"]
+
+_ASCII_LETTERS = np.frombuffer(string.ascii_letters.encode("ascii"), dtype=np.uint8)
+
+
+@dataclass
+class MetricColumns:
+    """
+    The variable fields of a batch of messages (one entry per message)
+    """
+
+    metric_types: List[str]
+    org_ids: List[int]
+    project_ids: List[int]
+    values: List[Any]
+    timestamps: List[int]
+    # tag values in the order of get_tag_keys(settings)
+    tag_values: List[List[str]]
+
+
+def generate_metric_batch(
+    start_idx: int,
+    count: int,
+    settings: Mapping[str, Any],
+) -> List[Mapping[str, Any]]:
+    """
+    Generates the messages with idx in [start_idx, start_idx + count)
+    """
+    return metric_messages(generate_metric_columns(start_idx, count, settings), settings)
+
+
+def metric_messages(
+    columns: MetricColumns, settings: Mapping[str, Any]
+) -> List[Mapping[str, Any]]:
+    """
+    Builds the message dicts of a batch
+    """
+    tag_keys = get_tag_keys(settings)
+
+    messages = []
+    for metric_type, org_id, project_id, value, timestamp, tag_values in zip(
+        columns.metric_types,
+        columns.org_ids,
+        columns.project_ids,
+        columns.values,
+        columns.timestamps,
+        columns.tag_values,
+    ):
+        name, unit, ty, status = METRIC_SPECS.get(metric_type, DEFAULT_METRIC_SPEC)
+        tags = dict(zip(tag_keys, tag_values))
+        if status is not None:
+            tags["session.status"] = status
+
+        messages.append(
+            {
+                "org_id": org_id,
+                "project_id": project_id,
+                "name": name,
+                "unit": unit,
+                "type": ty,
+                "value": value,
+                "timestamp": timestamp,
+                "tags": tags,
+                "retention_days": 90,
+            }
+        )
+
+    return messages
+
+
+def encode_metric_batch(
+    start_idx: int,
+    count: int,
+    settings: Mapping[str, Any],
+) -> List[bytes]:
+    """
+    Generates the JSON encoded messages with idx in [start_idx, start_idx + count)
+    """
+    return encode_metric_columns(
+        generate_metric_columns(start_idx, count, settings), settings
+    )
+
+
+def encode_metric_columns(
+    columns: MetricColumns, settings: Mapping[str, Any]
+) -> List[bytes]:
+    """
+    JSON encodes the messages of a batch, the encoding depends on settings["encoder"]:
+        template: splices the variable fields into pre-rendered JSON templates (one per metric type),
+            the output is identical to json.dumps
+        orjson: builds the message dicts and serializes them with orjson (compact JSON)
+        json: builds the message dicts and serializes them with json.dumps
+    """
+    encoder = settings.get("encoder", "template")
+
+    if encoder == "json":
+        return [
+            json.dumps(message).encode("ascii")
+            for message in metric_messages(columns, settings)
+        ]
+
+    if encoder == "orjson":
+        return [orjson.dumps(message) for message in metric_messages(columns, settings)]
+
+    num_extra_tags = settings["num_extra_tags"]
+
+    return [
+        _get_template(metric_type, num_extra_tags).render(
+            org_id, project_id, value, timestamp, tag_values
+        )
+        for metric_type, org_id, project_id, value, timestamp, tag_values in zip(
+            columns.metric_types,
+            columns.org_ids,
+            columns.project_ids,
+            columns.values,
+            columns.timestamps,
+            columns.tag_values,
+        )
+    ]
+
+
+def generate_metric_columns(
+    start_idx: int,
+    count: int,
+    settings: Mapping[str, Any],
+) -> MetricColumns:
+    """
+    Computes the variable fields of the messages with idx in [start_idx, start_idx + count)
+
+    The values are the same as the ones computed by the generators in metrics.py,
+    in repeatable mode and in random mode (both use the counter based random source).
+    """
+    idx = np.arange(start_idx, start_idx + count, dtype=np.int64)
+
+    metric_types = _get_metric_types(idx, settings)
+    org_ids = _get_org_ids(idx, settings).tolist()
+    project_ids = _get_project_ids(idx, settings).tolist()
+    timestamps = _get_timestamps(idx, settings).tolist()
+    tag_values = _get_tag_values(idx, settings)
+    num_elements = _get_num_elements_in_collection(idx, settings)
+    values = _get_values(idx, metric_types, num_elements, settings)
+
+    indexes = idx.tolist()
+    for pos, metric_type in enumerate(metric_types):
+        ty = METRIC_SPECS.get(metric_type, DEFAULT_METRIC_SPEC)[2]
+        if ty == "d":
+            # the session.duration generator always uses project 1
+            project_ids[pos] = 1
+        if metric_type == "session":
+            values[pos] = float(indexes[pos])
+        elif ty == "c":
+            values[pos] = indexes[pos]
+
+    return MetricColumns(
+        metric_types, org_ids, project_ids, values, timestamps, tag_values
+    )
+
+
+def get_partition_keys(
+    columns: MetricColumns, settings: Mapping[str, Any]
+) -> List[Optional[bytes]]:
+    """
+    The kafka message keys of a batch (settings["partition_key"]: org, project or none)
+    """
+    partition_key = settings["partition_key"]
+    if partition_key == "org":
+        ids = columns.org_ids
+    elif partition_key == "project":
+        ids = columns.project_ids
+    else:
+        return [None] * len(columns.org_ids)
+
+    keys = {id: str(id).encode("ascii") for id in set(ids)}
+    return [keys[id] for id in ids]
+
+
+def get_tag_keys(settings: Mapping[str, Any]) -> List[str]:
+    """
+    The tag keys of every message (without session.status) in the order used by metrics._get_tags
+    """
+    return ["environment", "release", *get_extra_tag_keys(settings["num_extra_tags"])]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_template(metric_type: str, num_extra_tags: int) -> MetricTemplate:
+    name, unit, ty, status = METRIC_SPECS.get(metric_type, DEFAULT_METRIC_SPEC)
+    tag_keys = get_tag_keys({"num_extra_tags": num_extra_tags})
+    return MetricTemplate(name, unit, ty, tag_keys, status)
+
+
+def _get_metric_types(
+    idx: np.ndarray, settings: Mapping[str, Any]
+) -> List[str]:
+    sampler = settings["metric_distribution"]
+
+    if len(sampler) == 0:
+        return [""] * len(idx)
+
+    if is_repeatable(settings):
+        positions = sampler.pick_positions(idx % sampler.total)
+    else:
+        positions = sampler.pick_positions(
+            get_random(settings).randint_array("metric_type", idx, 1, sampler.total)
+        )
+
+    items = sampler.items
+    return [items[pos] for pos in positions.tolist()]
+
+
+def _pick_ids(
+    sampler: AliasSampler, stream: str, idx: np.ndarray, settings: Mapping[str, Any]
+) -> np.ndarray:
+    """
+    Vectorized version of metrics.pick_id
+    """
+    rnd = get_random(settings)
+    return sampler.pick_items(
+        rnd.random_array(stream, idx, 0), rnd.random_array(stream, idx, 1)
+    )
+
+
+def _get_org_ids(idx: np.ndarray, settings: Mapping[str, Any]) -> np.ndarray:
+    sampler = settings["org_sampler"]
+    if sampler is None:
+        return np.full(len(idx), settings["org"], dtype=np.int64)
+    return _pick_ids(sampler, "org", idx, settings)
+
+
+def _get_project_ids(
+    idx: np.ndarray, settings: Mapping[str, Any]
+) -> np.ndarray:
+    sampler = settings["project_sampler"]
+    if sampler is not None:
+        return _pick_ids(sampler, "project", idx, settings)
+
+    projects = np.array(settings["projects"], dtype=np.int64)
+
+    if is_repeatable(settings):
+        proj_idx = idx % len(projects)
+    else:
+        proj_idx = get_random(settings).randint_array(
+            "project", idx, 0, len(projects) - 1
+        )
+    return projects[proj_idx]
+
+
+def _get_timestamps(
+    idx: np.ndarray, settings: Mapping[str, Any]
+) -> np.ndarray:
+    return timestamps.timestamps(idx, settings)
+
+
+def _get_num_elements_in_collection(
+    idx: np.ndarray, settings: Mapping[str, Any]
+) -> np.ndarray:
+    col_range = abs(settings["col_max"] - settings["col_min"]) + 1
+
+    num_messages = settings["num_messages"]
+
+    if is_repeatable(settings):
+        step = max(1, int(col_range / num_messages))
+        offset = step * idx % col_range
+    else:
+        offset = get_random(settings).randint_array(
+            "collection_size", idx, 0, col_range - 1
+        )
+
+    return settings["col_min"] + offset
+
+
+def _get_values(
+    idx: np.ndarray,
+    metric_types: List[str],
+    num_elements: np.ndarray,
+    settings: Mapping[str, Any],
+) -> List[Any]:
+    """
+    Returns the collection values of the set and distribution messages (None for the other messages)
+    """
+    values: List[Any] = [None] * len(idx)
+
+    types = np.array(
+        [METRIC_SPECS.get(t, DEFAULT_METRIC_SPEC)[2] for t in metric_types]
+    )
+    for ty, get_values in (("s", _get_sets), ("d", _get_distributions)):
+        positions = np.flatnonzero(types == ty)
+        if len(positions) == 0:
+            continue
+        collections = get_values(
+            idx[positions], num_elements[positions], settings
+        )
+        for pos, collection in zip(positions.tolist(), collections):
+            values[pos] = collection
+
+    return values
+
+
+def _split(values: list, num_elements: np.ndarray) -> List[list]:
+    """
+    Splits a flat list of values in consecutive collections with num_elements items each
+    """
+    ends = np.cumsum(num_elements).tolist()
+    starts = [0] + ends[:-1]
+    return [values[start:end] for start, end in zip(starts, ends)]
+
+
+def _get_collections(
+    values: np.ndarray, num_elements: np.ndarray, settings: Mapping[str, Any], dtype: str
+) -> List[Any]:
+    """
+    Splits the flat values in one collection per message.
+
+    With the base64 value encoding all the values are packed at once (as dtype) and every message gets
+    the base64 encoding of its slice of the packed buffer (see metrics.encode_base64_value).
+    """
+    if get_value_encoding(settings) != "base64":
+        return _split(values.tolist(), num_elements)
+
+    data = values.astype(dtype).tobytes()
+    ends = (np.cumsum(num_elements) * np.dtype(dtype).itemsize).tolist()
+    starts = [0] + ends[:-1]
+    b64encode = base64.b64encode
+    return [
+        {"format": "base64", "data": b64encode(data[start:end]).decode("ascii")}
+        for start, end in zip(starts, ends)
+    ]
+
+
+def _element_offsets(num_elements: np.ndarray) -> np.ndarray:
+    """
+    Returns the flat array [0, 1, ..., num_elements[0] - 1, 0, 1, ..., num_elements[1] - 1, ...]
+    """
+    total = int(num_elements.sum())
+    starts = np.cumsum(num_elements) - num_elements
+    return np.arange(total, dtype=np.int64) - np.repeat(starts, num_elements)
+
+
+def _repeated_indexes(idx: np.ndarray, num_elements: np.ndarray) -> np.ndarray:
+    """
+    Returns the flat array [idx[0] + 0, idx[0] + 1, ..., idx[1] + 0, ...] with num_elements[i] items for idx[i]
+    """
+    return np.repeat(idx, num_elements) + _element_offsets(num_elements)
+
+
+def _get_sets(
+    idx: np.ndarray,
+    num_elements: np.ndarray,
+    settings: Mapping[str, Any],
+) -> List[List[int]]:
+    if is_repeatable(settings):
+        values = _repeated_indexes(idx, num_elements)
+    else:
+        values = get_random(settings).randint_array(
+            "set",
+            np.repeat(idx, num_elements),
+            1,
+            9999,
+            _element_offsets(num_elements),
+        )
+    # set values are 32 bit integers (larger repeatable values wrap around like in the scalar path)
+    return _get_collections(values, num_elements, settings, "<u4")
+
+
+def _get_distributions(
+    idx: np.ndarray,
+    num_elements: np.ndarray,
+    settings: Mapping[str, Any],
+) -> List[Any]:
+    if bin_encoding_len := get_bin_encoding_len(settings):
+        lengths = num_elements * bin_encoding_len
+        letters = _ASCII_LETTERS[
+            get_random(settings).randint_array(
+                "distribution_bin",
+                np.repeat(idx, lengths),
+                0,
+                len(_ASCII_LETTERS) - 1,
+                _element_offsets(lengths),
+            )
+        ]
+        encoded = letters.tobytes().decode("ascii")
+        ends = np.cumsum(lengths).tolist()
+        starts = [0] + ends[:-1]
+        return [encoded[start:end] for start, end in zip(starts, ends)]
+
+    if is_repeatable(settings):
+        values = _repeated_indexes(idx, num_elements) * 5 + 0.1
+    else:
+        values = get_random(settings).random_array(
+            "distribution",
+            np.repeat(idx, num_elements),
+            _element_offsets(num_elements),
+        )
+        values *= 999
+    return _get_collections(values, num_elements, settings, "<f8")
+
+
+def _get_tag_nums_with_unique_rate(
+    idx: np.ndarray,
+    settings: Mapping[str, Any],
+    num_predefined: int,
+    unique_rate: float,
+    stream: str = "tag",
+) -> np.ndarray:
+    """
+    Vectorized version of metrics._get_tag_num_with_unique_rate
+    """
+    assert 0.0 <= unique_rate <= 1.0
+    assert num_predefined > 0
+
+    # Shift to distinguish between unique and predefined values
+    shift = 1000 + num_predefined
+
+    if is_repeatable(settings):
+        scale_param = 1000
+        unique = idx % scale_param + 1 <= scale_param * unique_rate
+        predefined = idx % num_predefined + 1
+    else:
+        rnd = get_random(settings)
+        unique = rnd.random_array(stream, idx) < unique_rate
+        predefined = rnd.randint_array(stream, idx, 1, num_predefined, 1)
+
+    if unique_rate <= 0:
+        return predefined
+
+    return np.where(unique, idx + shift, predefined)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_predefined_tag_value_array(template: str, num_predefined: int) -> np.ndarray:
+    """
+    metrics.get_predefined_tag_values as an object array (holding the same str objects)
+    """
+    return np.array(get_predefined_tag_values(template, num_predefined), dtype=object)
+
+
+def _render_tag_values(template: str, tag_nums: np.ndarray, num_predefined: int) -> np.ndarray:
+    """
+    Vectorized version of metrics.render_tag_value: the predefined values are gathered from the values
+    rendered once per run, only the unique values are formatted
+    """
+    predefined_values = _get_predefined_tag_value_array(template, num_predefined)
+    if len(predefined_values) == 0:
+        values = [template.format(tag_num) for tag_num in tag_nums.ravel().tolist()]
+        return np.array(values, dtype=object).reshape(tag_nums.shape)
+
+    unique = tag_nums >= len(predefined_values)
+    values = predefined_values[np.where(unique, 0, tag_nums)]
+    if unique.any():
+        values[unique] = [template.format(tag_num) for tag_num in tag_nums[unique].tolist()]
+    return values
+
+
+def _get_tag_values(
+    idx: np.ndarray, settings: Mapping[str, Any]
+) -> List[List[str]]:
+    environments = _get_tag_nums_with_unique_rate(
+        idx,
+        settings,
+        settings["environments"],
+        settings["environments_unique_rate"],
+        "environment",
+    )
+    releases = _get_tag_nums_with_unique_rate(
+        idx, settings, settings["releases"], settings["releases_unique_rate"], "release"
+    )
+    columns = [
+        _render_tag_values("env-{}", environments, settings["environments"])[:, np.newaxis],
+        _render_tag_values("v{}.1.1", releases, settings["releases"])[:, np.newaxis],
+    ]
+
+    num = settings["num_extra_tags"]
+    if num > 0:
+        predefined_values = settings["extra_tags_values"]
+        rate = settings["extra_tags_unique_rate"]
+        # tag i of message idx uses the tag index idx * num + i (same as the scalar path)
+        tag_idx = (idx[:, np.newaxis] * num + np.arange(num)).ravel()
+        values = _get_tag_nums_with_unique_rate(
+            tag_idx, settings, predefined_values, rate, "extra_tag"
+        ).reshape(len(idx), num)
+        columns.append(_render_tag_values("extra-value-{}", values, predefined_values))
+
+    # one list of tag values per message
+    return np.concatenate(columns, axis=1).tolist()
@@ -0,0 +1,127 @@
+"""
+Time paced message emission (rate limiting, time bound runs and ramp-up profiles).
+"""
+import math
+import time
+from typing import Callable, Optional
+
+# the lowest rate used while ramping up (avoids waiting forever for the first message)
+MIN_RATE = 1.0
+# number of steps of the "step" ramp-up profile
+RAMP_STEPS = 4
+# messages sent between clock checks when the rate is not limited (only the duration is checked)
+UNLIMITED_BATCH = 1000
+
+# maps the ramp-up progress (0..1) to the fraction of the target rate
+RAMP_PROFILES = {
+    "linear": lambda progress: progress,
+    "exponential": lambda progress: 2 ** (10 * (progress - 1)),
+    "step": lambda progress: math.floor(progress * RAMP_STEPS + 1) / RAMP_STEPS,
+}
+
+
+class Pacer:
+    """
+    Paces the message emission with a token bucket.
+
+    Call acquire() before sending every message, it blocks until the message can be sent and returns
+    False once the duration has elapsed.
+
+    Tokens are only refilled (and the clock only read) when the bucket is empty, and the pacer sleeps
+    at least min_sleep seconds at a time, so at high rates it sends bursts of rate * min_sleep messages
+    instead of sleeping before each message. The bucket holds at most burst seconds worth of tokens,
+    so the pacer doesn't try to catch up after a stall (e.g. a full producer queue).
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        duration: Optional[float] = None,
+        ramp_up: float = 0.0,
+        ramp_profile: str = "linear",
+        report_interval: Optional[float] = None,
+        name: str = "",
+        min_sleep: float = 0.005,
+        burst: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.ramp = RAMP_PROFILES[ramp_profile]
+        self.report_interval = report_interval
+        self.name = name
+        self.min_sleep = min_sleep
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self.sent = 0
+        self._tokens = 0.0
+        self._start = clock()
+        self._last_refill = self._start
+        self._last_report = self._start
+        self._sent_at_last_report = 0
+
+    def target_rate(self, elapsed: float) -> Optional[float]:
+        """
+        The target rate (msgs/s) after elapsed seconds (None if the rate is not limited)
+        """
+        if self.rate is None:
+            return None
+        if elapsed < self.ramp_up:
+            return max(MIN_RATE, self.rate * self.ramp(elapsed / self.ramp_up))
+        return self.rate
+
+    def acquire(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.sent += 1
+            return True
+        return self._refill()
+
+    def _refill(self) -> bool:
+        while True:
+            now = self.clock()
+            elapsed = now - self._start
+            if self.duration is not None and elapsed >= self.duration:
+                return False
+
+            self._maybe_report(now)
+
+            rate = self.target_rate(elapsed)
+            if rate is None:
+                self._tokens = UNLIMITED_BATCH
+            else:
+                self._tokens = min(
+                    self._tokens + (now - self._last_refill) * rate,
+                    max(1.0, rate * self.burst),
+                )
+            self._last_refill = now
+
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.sent += 1
+                return True
+
+            self.sleep(max((1.0 - self._tokens) / rate, self.min_sleep))
+
+    def _maybe_report(self, now: float):
+        if self.report_interval is None:
+            return
+        interval = now - self._last_report
+        if interval < self.report_interval:
+            return
+
+        elapsed = now - self._start
+        achieved = (self.sent - self._sent_at_last_report) / interval
+        target = self.target_rate(elapsed)
+        target_str = "unlimited" if target is None else f"{target:.0f} msgs/s"
+        print(
+            f"{self.name}{elapsed:.0f}s: {self.sent} messages, "
+            f"achieved {achieved:.0f} msgs/s (target {target_str})",
+            flush=True,
+        )
+        self._last_report = now
+        self._sent_at_last_report = self.sent
@@ -0,0 +1,148 @@
+import bisect
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class WeightedSampler:
+    """
+    Selects items with probabilities proportional to their (integer) relative weights.
+
+    The cumulative weights are precomputed once so that selecting an item is a binary search, O(log n).
+
+    Example:
+    For the weights { "metric-1": 3, "metric-2": 1, "metric-3": 5 } the cumulative weights are [3, 4, 9],
+    pick(1..3) returns "metric-1", pick(4) returns "metric-2" and pick(5..9) returns "metric-3".
+    pick(0) returns the first item (used by repeatable generation with idx % total).
+    """
+
+    def __init__(self, weights: Iterable[Tuple[Any, int]]):
+        self.items: List[Any] = []
+        self.cumulative: List[int] = []
+        total = 0
+        for item, weight in weights:
+            total += weight
+            self.items.append(item)
+            self.cumulative.append(total)
+        self._cumulative_array = np.array(self.cumulative, dtype=np.int64)
+
+    @classmethod
+    def from_mapping(cls, weights: Mapping[Any, int]) -> "WeightedSampler":
+        return cls(weights.items())
+
+    @property
+    def total(self) -> int:
+        return self.cumulative[-1] if self.cumulative else 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        weights = {
+            item: cumulative - previous
+            for item, cumulative, previous in zip(
+                self.items, self.cumulative, [0] + self.cumulative[:-1]
+            )
+        }
+        return f"WeightedSampler({weights})"
+
+    def pick(self, i: int) -> Optional[Any]:
+        """
+        Returns the first item whose cumulative weight is >= i (or None if i is above the total weight)
+        """
+        pos = bisect.bisect_left(self.cumulative, i)
+        if pos == len(self.items):
+            return None
+        return self.items[pos]
+
+    def pick_positions(self, i: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of pick, returns the positions (in self.items) of the picked items
+        """
+        return np.searchsorted(self._cumulative_array, i, side="left")
+
+
+class AliasSampler:
+    """
+    Selects items with probabilities proportional to their (float) weights in O(1) with an alias table
+    (Vose's alias method), the table is built once in O(n).
+
+    Every selection uses two uniform floats in [0, 1): u picks a column of the table and v decides
+    between the column item and its alias. Since the selection is a pure function of (u, v) it can be
+    driven by the counter based random source (see counter_random.CounterRandom).
+    """
+
+    def __init__(self, items: Sequence[Any], weights: Sequence[float]):
+        if len(items) == 0 or len(items) != len(weights):
+            raise ValueError("AliasSampler needs one weight per item (and at least one item)")
+        if any(weight < 0 for weight in weights) or sum(weights) <= 0:
+            raise ValueError("AliasSampler weights should be non negative with a positive sum")
+
+        n = len(items)
+        total = float(sum(weights))
+        scaled = [weight * n / total for weight in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # whatever is left has (up to rounding errors) probability 1
+
+        self.items: List[Any] = list(items)
+        self.weights: List[float] = list(weights)
+        self._prob = prob
+        self._alias = alias
+        self._prob_array = np.array(prob, dtype=np.float64)
+        self._alias_array = np.array(alias, dtype=np.int64)
+        self._items_array = np.array(self.items)
+
+    @classmethod
+    def uniform(cls, items: Sequence[Any]) -> "AliasSampler":
+        return cls(items, [1.0] * len(items))
+
+    @classmethod
+    def zipf(cls, items: Sequence[Any], s: float) -> "AliasSampler":
+        """
+        The item of rank k (starting at 1) has a weight of 1 / k^s, the first items are the most frequent
+        """
+        return cls(items, [1.0 / (rank ** s) for rank in range(1, len(items) + 1)])
+
+    @classmethod
+    def from_mapping(cls, weights: Mapping[Any, float]) -> "AliasSampler":
+        return cls(list(weights.keys()), list(weights.values()))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        if len(self.items) <= 10:
+            return f"AliasSampler({dict(zip(self.items, self.weights))})"
+        return f"AliasSampler({len(self.items)} items: {self.items[0]!r} ... {self.items[-1]!r})"
+
+    def pick(self, u: float, v: float) -> Any:
+        """
+        Returns the item selected by the uniform floats u and v (both in [0, 1))
+        """
+        column = int(u * len(self._prob))
+        if v < self._prob[column]:
+            return self.items[column]
+        return self.items[self._alias[column]]
+
+    def pick_positions(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of pick, returns the positions (in self.items) of the picked items
+        """
+        columns = (u * len(self._prob)).astype(np.int64)
+        return np.where(v < self._prob_array[columns], columns, self._alias_array[columns])
+
+    def pick_items(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of pick, returns an array of the picked items
+        """
+        return self._items_array[self.pick_positions(u, v)]
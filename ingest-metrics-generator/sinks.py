@@ -0,0 +1,227 @@
+"""
+Destinations for the generated messages (kafka, files, corpus files, stdout).
+
+Every producer process creates its own sink with get_sink(settings, worker).
+"""
+import os
+import sys
+from abc import ABC, abstractmethod
+from typing import Any, List, Mapping, Optional
+
+from confluent_kafka import Producer
+
+from corpus import CorpusWriter
+from delivery import DeliveryStats
+from partitioning import get_hot_partition_router
+
+try:
+    import zstandard
+except ImportError:
+    # optional, only needed to write zstd compressed files
+    zstandard = None
+
+SINK_TYPES = ["kafka", "file", "corpus", "stdout", "null"]
+
+# file sinks write in blocks of (at least) this many bytes
+FILE_BUFFER_SIZE = 1 << 20
+
+# how long to wait for deliveries when the producer queue is full
+QUEUE_FULL_POLL_TIMEOUT = 0.1
+
+
+class Sink(ABC):
+    @abstractmethod
+    def send(self, message: bytes, key: Optional[bytes] = None):
+        """
+        Sends a message, key is the kafka message key (only used by the kafka sink)
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        Flushes the pending messages and releases the sink
+        """
+        pass
+
+    def delivery_stats(self) -> Optional[DeliveryStats]:
+        """
+        The delivery accounting of the sink (None if the sink doesn't get delivery reports)
+        """
+        return None
+
+    def queue_depth(self) -> Optional[int]:
+        """
+        The number of messages waiting to be delivered (None if the sink doesn't queue messages)
+        """
+        return None
+
+
+class KafkaSink(Sink):
+    """
+    Produces the messages to kafka, counting the delivery reports.
+
+    Messages are partitioned by their key, except for the hot_partition_fraction sent to hot_partition.
+
+    When the local producer queue is full the sink serves delivery reports (which frees the queue)
+    and retries instead of failing.
+    """
+
+    def __init__(self, settings: Mapping[str, Any]):
+        self.producer = get_kafka_producer(settings)
+        self.topic_name = settings["topic_name"]
+        self.headers = [("namespace", "sessions")]
+        self.stats = DeliveryStats()
+        self.router = get_hot_partition_router(settings)
+
+    def send(self, message: bytes, key: Optional[bytes] = None):
+        partition = self.router.partition()
+        while True:
+            try:
+                self.producer.produce(
+                    self.topic_name,
+                    message,
+                    key=key,
+                    partition=partition,
+                    headers=self.headers,
+                    on_delivery=self.stats.on_delivery,
+                )
+                break
+            except BufferError:
+                self.stats.queue_full_retries += 1
+                self.producer.poll(QUEUE_FULL_POLL_TIMEOUT)
+        self.stats.produced += 1
+        self.producer.poll(0)
+
+    def close(self):
+        self.producer.flush()
+
+    def delivery_stats(self) -> Optional[DeliveryStats]:
+        return self.stats
+
+    def queue_depth(self) -> Optional[int]:
+        # messages and requests waiting in the librdkafka queues
+        return len(self.producer)
+
+
+class FileSink(Sink):
+    """
+    Writes the messages as JSON lines, zstd compressed if the file name ends with .zst ("-" writes to stdout)
+
+    Messages are buffered and written in blocks of at least buffer_size bytes.
+    """
+
+    def __init__(self, path: str, buffer_size: int = FILE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+
+        if path == "-":
+            # not sys.stdout, that may be redirected for the status messages
+            self._file = sys.__stdout__.buffer
+            self._close_file = False
+        else:
+            self._file = open(path, "wb")
+            self._close_file = True
+
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise ValueError("Writing .zst files requires the zstandard package")
+            self._file = zstandard.ZstdCompressor().stream_writer(
+                self._file, closefd=self._close_file
+            )
+            self._close_file = True
+
+    def send(self, message: bytes, key: Optional[bytes] = None):
+        self._buffer.append(message)
+        self._buffered += len(message) + 1
+        if self._buffered >= self.buffer_size:
+            self._write()
+
+    def _write(self):
+        if not self._buffer:
+            return
+        self._buffer.append(b"")  # newline after the last message
+        self._file.write(b"\n".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        self._write()
+        if self._close_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class CorpusSink(Sink):
+    """
+    Writes the messages to a corpus file that can be replayed with --replay
+    """
+
+    def __init__(self, path: str, reference_timestamp: int):
+        self._writer = CorpusWriter(path, reference_timestamp)
+
+    def send(self, message: bytes, key: Optional[bytes] = None):
+        self._writer.write(message)
+
+    def close(self):
+        self._writer.close()
+
+
+class NullSink(Sink):
+    """
+    Discards the messages (for benchmarking the generator)
+    """
+
+    def send(self, message: bytes, key: Optional[bytes] = None):
+        pass
+
+    def close(self):
+        pass
+
+
+def worker_output_path(path: str, worker: int, workers: int) -> str:
+    """
+    Returns the file a worker writes to, every worker writes its own file when there are several workers
+
+    >>> worker_output_path("out/metrics.jsonl.zst", 2, 4)
+    'out/metrics-2.jsonl.zst'
+    >>> worker_output_path("metrics.jsonl", 0, 1)
+    'metrics.jsonl'
+    """
+    if workers == 1:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{stem}-{worker}{dot}{extensions}")
+
+
+def get_sink(settings: Mapping[str, Any], worker: int = 0) -> Sink:
+    sink_type = settings["sink"]
+    if sink_type == "kafka":
+        return KafkaSink(settings)
+    if sink_type == "file":
+        path = worker_output_path(settings["output"], worker, settings["workers"])
+        return FileSink(path)
+    if sink_type == "corpus":
+        path = worker_output_path(settings["output"], worker, settings["workers"])
+        return CorpusSink(path, settings["timestamp"])
+    if sink_type == "stdout":
+        return FileSink("-")
+    if sink_type == "null":
+        return NullSink()
+    raise ValueError(f"Unknown sink {sink_type}")
+
+
+def get_kafka_producer(settings):
+    """
+    Returns a kafka producer configured with the
+    settings found in the settings["kafka"] sub-object
+    on top of the settings["kafka_profile"] tuning profile
+
+    At a minimum the settings should contain:
+        bootstrap.server: host-name:port-number
+    """
+    kafka_settings = settings["kafka_config"]
+    return Producer(kafka_settings)
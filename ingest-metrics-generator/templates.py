@@ -0,0 +1,82 @@
+"""
+Pre-rendered JSON templates for metric messages.
+
+Most of the fields of a metric message (name, unit, type, retention_days, the tag keys and
+the session.status tag) never change for a given metric type, so they are rendered once and only the
+variable fields (org_id, project_id, value, timestamp and the tag values) are spliced in for every message.
+The rendered messages are identical to json.dumps(message).
+"""
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:
+    # optional, only needed for the orjson encoder
+    orjson = None
+
+
+def encode_value(value: Any) -> str:
+    """
+    Encodes a metric value (int, float, str or list of numbers) like json.dumps does
+    """
+    ty = type(value)
+    if ty is int or ty is float:
+        return repr(value)
+    if ty is list:
+        # set and distribution values are lists of ints or floats
+        return "[" + ", ".join(map(repr, value)) + "]"
+    if ty is str:
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+
+class MetricTemplate:
+    def __init__(
+        self,
+        name: str,
+        unit: str,
+        ty: str,
+        tag_keys: List[str],
+        status: Optional[str] = None,
+    ):
+        """
+        Renders the static parts of the messages of one metric type, the variable fields are
+        left as %s placeholders
+        """
+
+        def static(value: Any) -> str:
+            # escape % so the static parts survive the final % formatting
+            return json.dumps(value).replace("%", "%%")
+
+        tags = [f"{static(key)}: %s" for key in tag_keys]
+        if status is not None:
+            tags.append(f'"session.status": {static(status)}')
+
+        self.num_tags = len(tag_keys)
+        self._format = (
+            f'{{"org_id": %s, "project_id": %s, "name": {static(name)}, '
+            f'"unit": {static(unit)}, "type": {static(ty)}, "value": %s, "timestamp": %s, '
+            f'"tags": {{{", ".join(tags)}}}, "retention_days": 90}}'
+        )
+
+    def render(
+        self,
+        org_id: int,
+        project_id: int,
+        value: Any,
+        timestamp: int,
+        tag_values: Sequence[str],
+    ) -> bytes:
+        assert len(tag_values) == self.num_tags
+        return (
+            self._format
+            % (
+                org_id,
+                project_id,
+                encode_value(value),
+                timestamp,
+                *map(encode_basestring_ascii, tag_values),
+            )
+        ).encode("ascii")
@@ -0,0 +1,34 @@
+import datetime
+
+from main import _calculate_metrics_distribution, _calculate_tenant_distributions
+
+
+def make_settings(**kwargs):
+    settings = {
+        "num_messages": 500,
+        "repeatable": True,
+        "seed": 1234,
+        "org": 1,
+        "projects": [5, 6, 7],
+        "timestamp": 1700000000,
+        "time_delta": datetime.timedelta(hours=2),
+        "releases": 20,
+        "releases_unique_rate": 0,
+        "environments": 10,
+        "environments_unique_rate": 0,
+        "num_extra_tags": 0,
+        "extra_tags_values": 10,
+        "extra_tags_unique_rate": 0,
+        "col_min": 3,
+        "col_max": 7,
+        "metric_types": {
+            "session": 4,
+            "user": 2,
+            "session.error": 1,
+            "session.duration": 1,
+        },
+    }
+    settings.update(kwargs)
+    _calculate_metrics_distribution(settings)
+    _calculate_tenant_distributions(settings)
+    return settings
@@ -0,0 +1,75 @@
+import base64
+
+import numpy as np
+
+from aggregation import BucketAggregator
+
+
+def metric(ty, value, timestamp=1000, project_id=1, tags=None):
+    return {
+        "org_id": 1,
+        "project_id": project_id,
+        "name": f"{ty}:sessions/test@none",
+        "unit": "",
+        "type": ty,
+        "value": value,
+        "timestamp": timestamp,
+        "tags": tags if tags is not None else {"environment": "prod"},
+        "retention_days": 90,
+    }
+
+
+def test_merges_values_per_bucket():
+    aggregator = BucketAggregator(bucket_seconds=10, max_buckets=100)
+    for message in [
+        metric("c", 1, timestamp=1001),
+        metric("c", 2.5, timestamp=1009),
+        metric("s", [3, 1], timestamp=1000),
+        metric("s", [1, 2], timestamp=1005),
+        metric("d", [1.5], timestamp=1002),
+        metric("d", [0.5, 2.0], timestamp=1003),
+    ]:
+        assert aggregator.add(message) == []
+
+    buckets = {bucket["type"]: bucket for bucket in aggregator.flush()}
+    assert len(buckets) == 3
+    assert buckets["c"]["value"] == 3.5
+    assert buckets["s"]["value"] == [1, 2, 3]
+    assert buckets["d"]["value"] == [1.5, 0.5, 2.0]
+    assert all(bucket["timestamp"] == 1000 for bucket in buckets.values())
+    assert aggregator.num_values == 6
+    assert aggregator.num_buckets == 3
+    assert len(aggregator) == 0
+
+
+def test_buckets_are_keyed_by_time_project_and_tags():
+    aggregator = BucketAggregator(bucket_seconds=10, max_buckets=100)
+    aggregator.add(metric("c", 1, timestamp=1000))
+    aggregator.add(metric("c", 1, timestamp=1010))
+    aggregator.add(metric("c", 1, project_id=2))
+    aggregator.add(metric("c", 1, tags={"environment": "dev"}))
+    aggregator.add(metric("c", 1, tags={"environment": "prod"}))
+
+    assert len(aggregator) == 4
+
+
+def test_evicts_oldest_bucket_when_full():
+    aggregator = BucketAggregator(bucket_seconds=10, max_buckets=2)
+    assert aggregator.add(metric("c", 1, timestamp=1000)) == []
+    assert aggregator.add(metric("c", 1, timestamp=2000)) == []
+    assert aggregator.add(metric("c", 1, timestamp=1000)) == []
+
+    evicted = aggregator.add(metric("c", 1, timestamp=3000))
+    assert [(bucket["timestamp"], bucket["value"]) for bucket in evicted] == [(1000, 2)]
+    assert len(aggregator) == 2
+
+
+def test_base64_buckets():
+    aggregator = BucketAggregator(bucket_seconds=10, max_buckets=10, value_encoding="base64")
+    aggregator.add(metric("s", [5, 4]))
+    aggregator.add(metric("d", [1.25, 3.0]))
+
+    buckets = {bucket["type"]: bucket["value"] for bucket in aggregator.flush()}
+    assert buckets["s"]["format"] == "base64"
+    assert np.frombuffer(base64.b64decode(buckets["s"]["data"]), "<u4").tolist() == [4, 5]
+    assert np.frombuffer(base64.b64decode(buckets["d"]["data"]), "<f8").tolist() == [1.25, 3.0]
@@ -0,0 +1,51 @@
+import time
+
+from corpus import CorpusReader, CorpusWriter
+
+
+def _write_corpus(path, messages, reference_timestamp=1000):
+    writer = CorpusWriter(str(path), reference_timestamp)
+    for message in messages:
+        writer.write(message)
+    writer.close()
+
+
+def test_corpus_roundtrip(tmp_path):
+    path = tmp_path / "metrics.corpus"
+    messages = [b'{"value": %d, "timestamp": %d}' % (i, 1000 - i) for i in range(10)]
+    messages.append(b"no timestamp")
+    _write_corpus(path, messages)
+
+    reader = CorpusReader(str(path))
+    assert len(reader) == len(messages)
+    assert reader.reference_timestamp == 1000
+    assert [reader.record(i) for i in range(len(messages))] == messages
+    reader.close()
+
+
+def test_corpus_replay_cycles(tmp_path):
+    path = tmp_path / "metrics.corpus"
+    messages = [b"a", b"b", b"c"]
+    _write_corpus(path, messages)
+
+    reader = CorpusReader(str(path))
+    assert list(reader.replay(1, 8)) == [b"b", b"c", b"a", b"b", b"c", b"a", b"b"]
+    reader.close()
+
+
+def test_corpus_timestamp_rewrite(tmp_path):
+    path = tmp_path / "metrics.corpus"
+    _write_corpus(
+        path, [b'{"timestamp": 990, "value": 1}', b'{"timestamp":1000}'], 1000
+    )
+
+    reader = CorpusReader(str(path))
+    now = int(time.time())
+    first, second = reader.replay(0, 2, rewrite_timestamps=True)
+    reader.close()
+
+    assert first in (
+        b'{"timestamp": %d, "value": 1}' % (now - 10),
+        b'{"timestamp": %d, "value": 1}' % (now - 9),
+    )
+    assert second in (b'{"timestamp":%d}' % now, b'{"timestamp":%d}' % (now + 1))
@@ -0,0 +1,39 @@
+import numpy as np
+
+from counter_random import CounterRandom, mix64, mix64_array
+
+
+def test_mix64_array_matches_scalar():
+    values = [0, 1, 2**63, 2**64 - 1, 0x9E3779B97F4A7C15]
+    mixed = mix64_array(np.array(values, dtype=np.uint64))
+    assert mixed.tolist() == [mix64(value) for value in values]
+
+
+def test_vectorized_matches_scalar():
+    rnd = CounterRandom(7)
+    counters = np.arange(1000, 1200, dtype=np.int64)
+    elements = np.arange(200, dtype=np.int64) % 5
+
+    assert rnd.uint64_array("a", counters, elements).tolist() == [
+        rnd.uint64("a", c, e) for c, e in zip(counters.tolist(), elements.tolist())
+    ]
+    assert rnd.random_array("a", counters).tolist() == [
+        rnd.random("a", c) for c in counters.tolist()
+    ]
+    assert rnd.randint_array("a", counters, 3, 17, elements).tolist() == [
+        rnd.randint("a", c, 3, 17, e) for c, e in zip(counters.tolist(), elements.tolist())
+    ]
+
+
+def test_ranges_and_streams():
+    rnd = CounterRandom(1)
+    values = rnd.randint_array("x", np.arange(10000), 1, 6)
+    assert values.min() == 1
+    assert values.max() == 6
+    floats = rnd.random_array("x", np.arange(10000))
+    assert 0.0 <= floats.min() and floats.max() < 1.0
+    assert 0.45 < floats.mean() < 0.55
+
+    assert rnd.uint64("x", 5) != rnd.uint64("y", 5)
+    assert rnd.uint64("x", 5) != rnd.uint64("x", 5, 1)
+    assert CounterRandom(2).uint64("x", 5) != rnd.uint64("x", 5)
@@ -0,0 +1,82 @@
+import pickle
+import random
+
+import pytest
+
+from delivery import DeliveryStats, LatencyHistogram
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 129, 255, 256, 1000, 123456, 10**9])
+def test_bucket_roundtrip(value):
+    index = LatencyHistogram.bucket_index(value)
+    lowest = LatencyHistogram.bucket_value(index)
+
+    assert lowest <= value
+    assert LatencyHistogram.bucket_index(lowest) == index
+    assert value - lowest <= value / 64
+
+
+def test_percentiles():
+    histogram = LatencyHistogram()
+    values = list(range(1, 100001))
+    random.Random(1).shuffle(values)
+    for value in values:
+        histogram.record(value)
+
+    assert histogram.count == 100000
+    assert histogram.min == 1
+    assert histogram.max == 100000
+    assert histogram.mean == pytest.approx(50000.5)
+    for percentile in (50, 90, 99, 99.9):
+        expected = 100000 * percentile / 100
+        assert histogram.percentile(percentile) == pytest.approx(expected, rel=0.02)
+
+
+class _Error:
+    def name(self):
+        return "_MSG_TIMED_OUT"
+
+
+class _Message:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def latency(self):
+        return self._latency
+
+
+def test_delivery_stats_merge():
+    first = DeliveryStats()
+    first.produced = 3
+    first.on_delivery(None, _Message(0.002))
+    first.on_delivery(None, _Message(0.004))
+    first.on_delivery(_Error(), None)
+
+    second = DeliveryStats()
+    second.produced = 2
+    second.on_delivery(None, _Message(0.010))
+
+    first.merge(second)
+    summary = first.summary()
+
+    assert summary["produced"] == 5
+    assert summary["delivered"] == 3
+    assert summary["failed"] == 1
+    assert summary["pending"] == 1
+    assert summary["errors"] == {"_MSG_TIMED_OUT": 1}
+    assert summary["latency_ms"]["min"] == 2
+    assert summary["latency_ms"]["max"] == 10
+
+
+def test_delivery_stats_pickle():
+    stats = DeliveryStats()
+    stats.on_delivery(_Error(), None)
+    stats.on_delivery(None, _Message(0.002))
+
+    # the stats of the workers are sent back to the main process
+    copy = pickle.loads(pickle.dumps(stats))
+    copy.on_delivery(_Error(), None)
+
+    assert copy.error_counts() == {"_MSG_TIMED_OUT": 2}
+    assert stats.error_counts() == {"_MSG_TIMED_OUT": 1}
+    assert copy.summary()["delivered"] == 1
@@ -0,0 +1,97 @@
+import threading
+import urllib.request
+
+from live_stats import HyperLogLog, LiveStats
+from sinks import NullSink
+
+
+def test_hyperloglog_estimate():
+    for n in (0, 10, 1000, 50000):
+        hll = HyperLogLog()
+        hll.add_many([f"value-{i}" for i in range(n)])
+        # adding the same values again doesn't change the estimate
+        hll.add_many([f"value-{i}" for i in range(n)])
+        assert abs(hll.estimate() - n) <= max(2, n * 0.05)
+
+
+def test_hyperloglog_merge():
+    first = HyperLogLog()
+    first.add_many(list(range(0, 6000)))
+    second = HyperLogLog()
+    second.add_many(list(range(4000, 10000)))
+    first.merge(second)
+
+    assert abs(first.estimate() - 10000) < 500
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_live_stats_reports(capsys):
+    clock = FakeClock()
+    stats = LiveStats(NullSink(), worker=3, interval=10, clock=clock)
+    stats.observe_tags(["environment", "release"], [["env-1", "v1"], ["env-2", "v1"]])
+    for _ in range(50):
+        stats.on_send(100)
+    assert capsys.readouterr().out == ""
+
+    clock.now += 10
+    stats.on_send(100)
+    out = capsys.readouterr().out
+    assert out.startswith("Live stats: ")
+
+    snapshot = stats.snapshot()
+    assert snapshot["worker"] == 3
+    assert snapshot["messages"] == 51
+    assert snapshot["bytes"] == 5100
+    assert snapshot["queue_depth"] is None
+    assert snapshot["distinct_tag_values"] == {"environment": 2, "release": 1}
+
+
+def test_prometheus_endpoint():
+    stats = LiveStats(NullSink(), worker=0, interval=None, port=0)
+    try:
+        stats.on_send(10)
+        stats.observe_tags(["environment"], [["env-1"]])
+        port = stats._server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        stats.close()
+
+    assert 'generator_messages_total{worker="0"} 1' in body
+    assert 'generator_bytes_total{worker="0"} 10' in body
+    assert 'generator_distinct_tag_values{worker="0",tag="environment"} 1' in body
+
+
+def test_snapshot_while_observing_tags():
+    stats = LiveStats(NullSink(), worker=0, interval=None)
+    errors = []
+    done = threading.Event()
+
+    def scrape():
+        # like the metrics server thread
+        try:
+            while not done.is_set():
+                stats.prometheus()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=scrape)
+    thread.start()
+    try:
+        # every batch adds new tag keys while the other thread reads them
+        for batch in range(300):
+            keys = [f"tag-{batch}-{i}" for i in range(5)]
+            stats.observe_tags(keys, [[f"value-{i}" for i in range(5)]])
+    finally:
+        done.set()
+        thread.join()
+
+    assert errors == []
+    assert len(stats.snapshot()["distinct_tag_values"]) == 1500
@@ -0,0 +1,38 @@
+from metrics import (
+    MAX_PREDEFINED_TAG_VALUES,
+    get_extra_tag_keys,
+    get_predefined_tag_values,
+    generate_metric,
+    render_tag_value,
+)
+from tests.helpers import make_settings
+
+
+def test_render_tag_value():
+    values = get_predefined_tag_values("env-{}", 10)
+    assert render_tag_value("env-{}", 3, values) == "env-3"
+    assert render_tag_value("env-{}", 3, values) is values[3]
+    assert render_tag_value("env-{}", 1012, values) == "env-1012"
+
+
+def test_extra_tag_keys_are_shared():
+    keys = get_extra_tag_keys(3)
+    assert keys == ("extra-tag-0", "extra-tag-1", "extra-tag-2")
+    assert get_extra_tag_keys(3)[1] is keys[1]
+
+
+def test_predefined_tag_values_are_rendered_once():
+    settings = make_settings(num_extra_tags=5, extra_tags_unique_rate=0.5)
+    values = get_predefined_tag_values("extra-value-{}", settings["extra_tags_values"])
+    tags = [generate_metric(idx, settings)["tags"] for idx in range(200)]
+
+    extra_values = [tag_values[key] for tag_values in tags for key in get_extra_tag_keys(5)]
+    predefined = [value for value in extra_values if value in values]
+    # the predefined values are shared, the unique ones are rendered for every message
+    assert predefined and all(any(value is v for v in values) for value in predefined)
+    assert len(predefined) < len(extra_values)
+
+
+def test_large_predefined_ranges_are_not_rendered():
+    assert get_predefined_tag_values("env-{}", MAX_PREDEFINED_TAG_VALUES + 1) == ()
+    assert render_tag_value("env-{}", 7, ()) == "env-7"
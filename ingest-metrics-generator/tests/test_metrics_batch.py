@@ -0,0 +1,130 @@
+import base64
+import json
+
+import numpy as np
+
+import pytest
+
+from metrics import generate_metric
+from metrics_batch import (
+    generate_metric_batch,
+    generate_metric_columns,
+    get_partition_keys,
+)
+from tests.helpers import make_settings
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        make_settings(),
+        make_settings(metric_types={}),
+        make_settings(num_messages=100000, col_min=1, col_max=1),
+        make_settings(releases_unique_rate=0.3, environments_unique_rate=0.05),
+        make_settings(num_extra_tags=5, extra_tags_unique_rate=0.25),
+        # too many predefined values to render them once per run
+        make_settings(num_extra_tags=2, extra_tags_values=200000, extra_tags_unique_rate=0.25),
+        make_settings(value_encoding="base64"),
+    ],
+)
+def test_batch_matches_scalar_in_repeatable_mode(settings):
+    start_idx = 17
+    count = 300
+    batch = generate_metric_batch(start_idx, count, settings)
+    scalar = [generate_metric(idx, settings) for idx in range(start_idx, start_idx + count)]
+
+    assert [json.dumps(m) for m in batch] == [json.dumps(m) for m in scalar]
+
+
+def test_batch_random_mode():
+    settings = make_settings(repeatable=False, num_extra_tags=3)
+    batch = generate_metric_batch(0, 200, settings)
+
+    assert len(batch) == 200
+    for metric in batch:
+        assert metric["project_id"] in settings["projects"] + [1]
+        assert 0 <= settings["timestamp"] - metric["timestamp"] <= 7200
+        if metric["type"] in ("s", "d"):
+            assert 3 <= len(metric["value"]) <= 7
+        json.dumps(metric)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        make_settings(repeatable=False),
+        make_settings(repeatable=False, bin_encoding_len=4),
+        make_settings(repeatable=False, value_encoding="base64"),
+        make_settings(
+            repeatable=False,
+            num_extra_tags=5,
+            extra_tags_unique_rate=0.25,
+            releases_unique_rate=0.3,
+        ),
+    ],
+)
+def test_batch_matches_scalar_in_random_mode(settings):
+    start_idx = 1017
+    count = 300
+    batch = generate_metric_batch(start_idx, count, settings)
+    scalar = [generate_metric(idx, settings) for idx in range(start_idx, start_idx + count)]
+
+    assert [json.dumps(m) for m in batch] == [json.dumps(m) for m in scalar]
+
+
+def test_random_mode_depends_on_seed():
+    first = generate_metric_batch(0, 50, make_settings(repeatable=False, seed=1))
+    again = generate_metric_batch(0, 50, make_settings(repeatable=False, seed=1))
+    other = generate_metric_batch(0, 50, make_settings(repeatable=False, seed=2))
+
+    assert first == again
+    assert first != other
+    # any block of messages can be regenerated on its own (sharding and --start-idx)
+    assert generate_metric_batch(20, 30, make_settings(repeatable=False, seed=1)) == first[20:]
+
+
+def test_base64_value_encoding():
+    settings = make_settings(value_encoding="base64")
+    array_settings = make_settings()
+    batch = generate_metric_batch(0, 100, settings)
+    arrays = generate_metric_batch(0, 100, array_settings)
+
+    for metric, array_metric in zip(batch, arrays):
+        if metric["type"] == "c":
+            assert metric["value"] == array_metric["value"]
+            continue
+        assert metric["value"]["format"] == "base64"
+        dtype = "<u4" if metric["type"] == "s" else "<f8"
+        values = np.frombuffer(base64.b64decode(metric["value"]["data"]), dtype=dtype)
+        assert values.tolist() == array_metric["value"]
+
+
+@pytest.mark.parametrize("repeatable", [True, False])
+def test_tenant_distributions(repeatable):
+    settings = make_settings(
+        repeatable=repeatable,
+        num_orgs=1000,
+        org_distribution="zipf",
+        org_zipf_s=1.1,
+        project_weights={100: 1, 200: 3},
+    )
+    batch = generate_metric_batch(0, 2000, settings)
+    scalar = [generate_metric(idx, settings) for idx in range(2000)]
+    assert batch == scalar
+
+    orgs = [metric["org_id"] for metric in batch]
+    assert all(1 <= org_id <= 1000 for org_id in orgs)
+    assert orgs.count(1) > orgs.count(2) > orgs.count(100)
+    # session.duration messages always use project 1
+    projects = {metric["project_id"] for metric in batch if metric["type"] != "d"}
+    assert projects == {100, 200}
+
+
+def test_partition_keys():
+    settings = make_settings(num_orgs=50, partition_key="org")
+    columns = generate_metric_columns(0, 100, settings)
+
+    assert get_partition_keys(columns, settings) == [
+        str(org_id).encode() for org_id in columns.org_ids
+    ]
+    assert get_partition_keys(columns, {**settings, "partition_key": "none"}) == [None] * 100
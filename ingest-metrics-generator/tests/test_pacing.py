@@ -0,0 +1,93 @@
+import pytest
+
+from pacing import Pacer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _pacer(clock, **kwargs):
+    return Pacer(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_rate_is_respected():
+    clock = FakeClock()
+    pacer = _pacer(clock, rate=1000)
+
+    for _ in range(5000):
+        assert pacer.acquire()
+
+    assert clock.now == pytest.approx(5.0, rel=0.01)
+
+
+def test_sleeps_are_batched():
+    clock = FakeClock()
+    pacer = _pacer(clock, rate=100000, min_sleep=0.005)
+
+    for _ in range(100000):
+        pacer.acquire()
+
+    # one sleep per ~500 messages, not one per message
+    assert len(clock.sleeps) <= 250
+    assert clock.now == pytest.approx(1.0, rel=0.02)
+
+
+def test_duration_stops_the_run():
+    clock = FakeClock()
+    pacer = _pacer(clock, rate=100, duration=2.0)
+
+    sent = 0
+    while pacer.acquire():
+        sent += 1
+
+    assert sent == pytest.approx(200, abs=2)
+
+
+def test_unlimited_rate_with_duration():
+    clock = FakeClock()
+    pacer = _pacer(clock, duration=1.0)
+
+    for _ in range(10000):
+        assert pacer.acquire()
+    clock.now = 1.0
+    # the duration is checked every UNLIMITED_BATCH messages
+    assert not all(pacer.acquire() for _ in range(2000))
+
+
+@pytest.mark.parametrize(
+    "profile, elapsed, expected",
+    [
+        ("linear", 5, 500),
+        ("linear", 10, 1000),
+        ("step", 1, 250),
+        ("step", 6, 750),
+        ("exponential", 10, 1000),
+        ("exponential", 9, 500),
+    ],
+)
+def test_ramp_up_profiles(profile, elapsed, expected):
+    pacer = _pacer(FakeClock(), rate=1000, ramp_up=10, ramp_profile=profile)
+
+    assert pacer.target_rate(elapsed) == pytest.approx(expected)
+
+
+def test_ramp_up_sends_fewer_messages():
+    clock = FakeClock()
+    pacer = _pacer(clock, rate=1000, duration=20, ramp_up=10)
+
+    sent = 0
+    while pacer.acquire():
+        sent += 1
+
+    # 10s at 1000 msgs/s + a linear ramp from 0 to 1000 msgs/s over 10s
+    assert sent == pytest.approx(15000, rel=0.02)
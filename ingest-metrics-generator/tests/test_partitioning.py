@@ -0,0 +1,52 @@
+import pytest
+
+from partitioning import (
+    UNASSIGNED_PARTITION,
+    HotPartitionRouter,
+    check_partitioning,
+    encode_key,
+)
+
+
+def test_encode_key():
+    assert encode_key(7) == b"7"
+    assert encode_key("abc") == b"abc"
+    assert encode_key(b"abc") == b"abc"
+    assert encode_key(None) is None
+
+
+def test_no_hot_partition():
+    router = HotPartitionRouter()
+    assert {router.partition() for _ in range(1000)} == {UNASSIGNED_PARTITION}
+    assert router.hot_messages == 0
+
+
+@pytest.mark.parametrize("fraction", [0.01, 0.1, 0.3, 0.5, 1.0])
+def test_hot_fraction_is_exact(fraction):
+    router = HotPartitionRouter(fraction, 5)
+    partitions = [router.partition() for _ in range(10000)]
+
+    assert set(partitions) <= {UNASSIGNED_PARTITION, 5}
+    assert abs(partitions.count(5) - 10000 * fraction) <= 1
+    assert router.hot_messages == partitions.count(5)
+
+
+def test_hot_messages_are_spread():
+    router = HotPartitionRouter(0.1, 0)
+    partitions = [router.partition() for _ in range(100)]
+    hot = [i for i, partition in enumerate(partitions) if partition == 0]
+    assert [b - a for a, b in zip(hot, hot[1:])] == [10] * (len(hot) - 1)
+
+
+@pytest.mark.parametrize(
+    "settings, valid",
+    [
+        ({}, True),
+        ({"hot_partition_fraction": 0.2, "hot_partition": 3}, True),
+        ({"hot_partition_fraction": 1.5}, False),
+        ({"hot_partition_fraction": -0.1}, False),
+        ({"hot_partition": -1}, False),
+    ],
+)
+def test_check_partitioning(settings, valid):
+    assert (check_partitioning(settings) is None) == valid
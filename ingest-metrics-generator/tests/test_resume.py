@@ -0,0 +1,71 @@
+import pytest
+
+import main
+from sinks import worker_output_path
+
+
+def run_to_file(path, args, workers=1):
+    """
+    Runs the generator with the command line args, writing the messages to path (one file per worker),
+    and returns them in idx order
+    """
+    ctx = main.main.make_context(
+        "main",
+        [
+            "--org", "1",
+            "--project", "5",
+            "--timestamp", "1700000000",
+            "--spread", "2h",
+            "--sink", "file",
+            "--output", str(path),
+            "--workers", str(workers),
+            *args,
+        ],
+    )
+    main.run(main.get_settings(**ctx.params))
+    messages = []
+    for worker in range(workers):
+        with open(worker_output_path(str(path), worker, workers), "rb") as f:
+            messages.extend(f.read().splitlines())
+    return messages
+
+
+@pytest.mark.parametrize("mode", [["--repeatable"], ["--seed", "1234"]])
+@pytest.mark.parametrize("schedule", ["even", "random", "diurnal"])
+def test_resumed_run_sends_the_rest_of_the_run(tmp_path, mode, schedule):
+    args = [*mode, "--timestamp-schedule", schedule, "-n", "1000"]
+    full = run_to_file(tmp_path / "full.jsonl", args)
+    resumed = run_to_file(tmp_path / "resumed.jsonl", [*args, "--start-idx", "600"])
+
+    assert len(full) == 1000
+    assert resumed == full[600:]
+
+
+@pytest.mark.parametrize("mode", [["--repeatable"], ["--seed", "1234"]])
+def test_split_run_sends_the_whole_run(tmp_path, mode):
+    args = [*mode, "--timestamp-schedule", "even", "-n", "1000"]
+    full = run_to_file(tmp_path / "full.jsonl", args)
+    first = run_to_file(tmp_path / "first.jsonl", [*args, "--stop-idx", "300"])
+    second = run_to_file(tmp_path / "second.jsonl", [*args, "--start-idx", "300"])
+
+    assert first + second == full
+
+
+@pytest.mark.parametrize("mode", [["--repeatable"], ["--seed", "1234"]])
+def test_sharded_resumed_run(tmp_path, mode):
+    # the schedule position of a message doesn't depend on the worker shard it falls in
+    args = [*mode, "--timestamp-schedule", "diurnal", "-n", "1000"]
+    full = run_to_file(tmp_path / "full.jsonl", args)
+    sharded = run_to_file(
+        tmp_path / "sharded.jsonl", [*args, "--start-idx", "250"], workers=3
+    )
+
+    assert sharded == full[250:]
+
+
+def test_invalid_idx_range():
+    ctx = main.main.make_context(
+        "main", ["--org", "1", "--project", "5", "--sink", "null", "-n", "100", "--start-idx", "101"]
+    )
+    with pytest.raises(main.click.UsageError):
+        main.get_settings(**ctx.params)
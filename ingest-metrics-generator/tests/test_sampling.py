@@ -0,0 +1,80 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from sampling import AliasSampler, WeightedSampler
+
+
+def _linear_pick(weights, i):
+    count = 0
+    for name, weight in weights.items():
+        count += weight
+        if i <= count:
+            return name
+    return None
+
+
+def test_pick_matches_linear_scan():
+    weights = {f"metric-{i}": (i * 7) % 5 for i in range(40)}
+    sampler = WeightedSampler.from_mapping(weights)
+
+    for i in range(sampler.total + 2):
+        assert sampler.pick(i) == _linear_pick(weights, i)
+
+
+def test_pick_positions_matches_pick():
+    sampler = WeightedSampler.from_mapping({"a": 3, "b": 1, "c": 5})
+    i = np.arange(10)
+
+    picked = [sampler.items[pos] for pos in sampler.pick_positions(i).tolist()]
+    assert picked == [sampler.pick(v) for v in range(10)]
+    assert picked == ["a", "a", "a", "a", "b", "c", "c", "c", "c", "c"]
+
+
+def test_empty_sampler():
+    sampler = WeightedSampler.from_mapping({})
+
+    assert len(sampler) == 0
+    assert sampler.total == 0
+    assert sampler.pick(1) is None
+
+
+def test_alias_sampler_matches_weights():
+    weights = {1: 5.0, 2: 1.0, 3: 0.0, 4: 2.0}
+    sampler = AliasSampler.from_mapping(weights)
+    rng = np.random.default_rng(3)
+    picked = sampler.pick_items(rng.random(80000), rng.random(80000))
+
+    counts = Counter(picked.tolist())
+    assert counts[3] == 0
+    for item, weight in weights.items():
+        assert abs(counts[item] / 80000 - weight / 8.0) < 0.01
+
+
+def test_alias_sampler_vectorized_matches_scalar():
+    sampler = AliasSampler.zipf(list(range(100, 1100)), 1.2)
+    rng = np.random.default_rng(5)
+    u = rng.random(1000)
+    v = rng.random(1000)
+
+    assert sampler.pick_items(u, v).tolist() == [
+        sampler.pick(a, b) for a, b in zip(u.tolist(), v.tolist())
+    ]
+
+
+def test_alias_sampler_zipf_is_skewed():
+    sampler = AliasSampler.zipf(list(range(1000)), 1.0)
+    rng = np.random.default_rng(7)
+    counts = Counter(sampler.pick_items(rng.random(50000), rng.random(50000)).tolist())
+
+    assert counts[0] > counts[1] > counts[10]
+    # the first id gets 1 / H(1000) ~ 13% of the picks
+    assert 0.12 < counts[0] / 50000 < 0.15
+
+
+def test_alias_sampler_rejects_invalid_weights():
+    with pytest.raises(ValueError):
+        AliasSampler([], [])
+    with pytest.raises(ValueError):
+        AliasSampler([1, 2], [0.0, 0.0])
@@ -0,0 +1,39 @@
+import pytest
+
+from sinks import FileSink, worker_output_path, zstandard
+
+
+@pytest.mark.parametrize(
+    "path, worker, workers, expected",
+    [
+        ("metrics.jsonl", 0, 1, "metrics.jsonl"),
+        ("metrics.jsonl", 3, 4, "metrics-3.jsonl"),
+        ("out/metrics.jsonl.zst", 1, 2, "out/metrics-1.jsonl.zst"),
+        ("metrics", 1, 2, "metrics-1"),
+    ],
+)
+def test_worker_output_path(path, worker, workers, expected):
+    assert worker_output_path(path, worker, workers) == expected
+
+
+def test_file_sink_writes_json_lines(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    sink = FileSink(str(path), buffer_size=10)
+    messages = [b'{"value": %d}' % i for i in range(25)]
+    for message in messages:
+        sink.send(message)
+    sink.close()
+
+    assert path.read_bytes().splitlines() == messages
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard not installed")
+def test_file_sink_zstd(tmp_path):
+    path = tmp_path / "metrics.jsonl.zst"
+    sink = FileSink(str(path))
+    sink.send(b'{"value": 1}')
+    sink.send(b'{"value": 2}')
+    sink.close()
+
+    with zstandard.ZstdDecompressor().stream_reader(path.open("rb")) as f:
+        assert f.read() == b'{"value": 1}\n{"value": 2}\n'
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from metrics_batch import encode_metric_batch, generate_metric_batch
+from templates import MetricTemplate, encode_value, orjson
+from tests.helpers import make_settings
+
+
+@pytest.mark.parametrize(
+    "value", [0, 17, 3.0, 0.1, 1e20, [1, 2, 3], [0.1, 5.1], [], "aZ\"%s\\", "é"]
+)
+def test_encode_value(value):
+    assert encode_value(value) == json.dumps(value)
+
+
+def test_template_renders_like_json_dumps():
+    template = MetricTemplate(
+        "c:100%/name@none", "", "c", ["environment", "release"], "init"
+    )
+    message = {
+        "org_id": 3,
+        "project_id": 7,
+        "name": "c:100%/name@none",
+        "unit": "",
+        "type": "c",
+        "value": 1.5,
+        "timestamp": 1700000000,
+        "tags": {"environment": "env-1", "release": "v1.1.1", "session.status": "init"},
+        "retention_days": 90,
+    }
+
+    assert template.render(3, 7, 1.5, 1700000000, ["env-1", "v1.1.1"]) == json.dumps(
+        message
+    ).encode("ascii")
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        make_settings(),
+        make_settings(num_extra_tags=4, extra_tags_unique_rate=0.5),
+        make_settings(metric_types={}),
+    ],
+)
+def test_template_encoder_matches_json_encoder(settings):
+    expected = [
+        json.dumps(m).encode("ascii") for m in generate_metric_batch(0, 200, settings)
+    ]
+
+    assert encode_metric_batch(0, 200, {**settings, "encoder": "template"}) == expected
+    assert encode_metric_batch(0, 200, {**settings, "encoder": "json"}) == expected
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson not installed")
+def test_orjson_encoder():
+    settings = make_settings()
+    encoded = encode_metric_batch(0, 200, {**settings, "encoder": "orjson"})
+
+    assert [json.loads(m) for m in encoded] == generate_metric_batch(0, 200, settings)
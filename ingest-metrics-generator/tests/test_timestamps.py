@@ -0,0 +1,72 @@
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+from timestamps import get_schedule, timestamp, timestamps
+from tests.helpers import make_settings
+
+END = 1700000000
+
+
+def test_default_schedule():
+    assert get_schedule(make_settings(repeatable=True)) == "even"
+    assert get_schedule(make_settings(repeatable=False)) == "random"
+
+
+def test_even_schedule_stays_in_the_window():
+    # many more messages than seconds in the spread
+    settings = make_settings(
+        num_messages=5_000_000,
+        timestamp=END,
+        time_delta=datetime.timedelta(minutes=10),
+    )
+    idx = np.arange(0, 5_000_000, 997, dtype=np.int64)
+    values = timestamps(idx, settings)
+
+    assert values.min() >= END - 600
+    assert values.max() < END
+    # evenly spaced: every second of the window gets the same number of messages
+    counts = np.bincount(timestamps(np.arange(5_000_000), settings) - (END - 600))
+    assert len(counts) == 600
+    assert counts.max() - counts.min() <= 1
+
+
+@pytest.mark.parametrize("schedule", ["even", "random", "diurnal"])
+@pytest.mark.parametrize("repeatable", [True, False])
+def test_scalar_matches_vectorized(schedule, repeatable):
+    settings = make_settings(
+        timestamp_schedule=schedule, repeatable=repeatable, timestamp=END
+    )
+    idx = np.arange(100, 400, dtype=np.int64)
+
+    assert timestamps(idx, settings).tolist() == [
+        timestamp(i, settings) for i in idx.tolist()
+    ]
+
+
+def test_diurnal_schedule_follows_the_curve():
+    # two days, peak at 12:00 UTC, END is 22:13:20 UTC
+    settings = make_settings(
+        timestamp_schedule="diurnal",
+        diurnal_amplitude=0.9,
+        diurnal_peak_hour=12,
+        num_messages=100000,
+        timestamp=END,
+        time_delta=datetime.timedelta(days=2),
+    )
+    values = timestamps(np.arange(100000, dtype=np.int64), settings)
+    assert values.min() >= END - 2 * 86400
+    assert values.max() <= END
+
+    hours = (values % 86400) // 3600
+    counts = np.bincount(hours, minlength=24)
+    assert counts[12] > 5 * counts[0]
+
+
+def test_live_schedule():
+    settings = make_settings(timestamp_schedule="live", timestamp=END)
+    before = int(time.time())
+    values = timestamps(np.arange(10, dtype=np.int64), settings)
+    assert before <= values.min() and values.max() <= int(time.time())
@@ -0,0 +1,89 @@
+import pytest
+
+from main import aggregate_metrics, encode_metrics, get_aggregator, get_pacer, get_passes
+from tests.helpers import make_settings
+from workers import shard_ranges
+
+
+@pytest.mark.parametrize(
+    "num_messages, num_workers, expected",
+    [
+        (10, 1, [(0, 10)]),
+        (10, 3, [(0, 4), (4, 7), (7, 10)]),
+        (8, 4, [(0, 2), (2, 4), (4, 6), (6, 8)]),
+        (2, 4, [(0, 1), (1, 2)]),
+        (0, 3, [(0, 0)]),
+    ],
+)
+def test_shard_ranges(num_messages, num_workers, expected):
+    assert shard_ranges(num_messages, num_workers) == expected
+
+
+def test_shard_ranges_start_idx():
+    assert shard_ranges(10, 3, start_idx=1000) == [(1000, 1004), (1004, 1007), (1007, 1010)]
+
+
+def test_passes():
+    settings = make_settings(repeatable=False, num_messages=200)
+
+    assert list(get_passes(settings, 100, 150, cycle=False)) == [(100, 150)]
+    passes = get_passes(settings, 100, 150, cycle=True)
+    # every pass is offset by num_messages, so the shards of all the workers never overlap
+    assert [next(passes) for _ in range(3)] == [(100, 150), (300, 350), (500, 550)]
+
+    repeatable_passes = get_passes(make_settings(repeatable=True), 100, 150, cycle=True)
+    assert [next(repeatable_passes) for _ in range(3)] == [(100, 150)] * 3
+
+
+@pytest.mark.parametrize("repeatable", [False, True])
+def test_cycled_passes(repeatable):
+    settings = make_settings(
+        repeatable=repeatable, num_messages=50, batch_size=20, partition_key="none", encoder="template"
+    )
+    messages = encode_metrics(settings, 0, 50, cycle=True)
+    first_pass = [next(messages)[1] for _ in range(50)]
+    second_pass = [next(messages)[1] for _ in range(50)]
+
+    if repeatable:
+        assert second_pass == first_pass
+    else:
+        assert len(set(first_pass) & set(second_pass)) == 0
+
+
+def test_aggregation_is_reported_once(capsys):
+    settings = make_settings(
+        num_messages=50,
+        batch_size=20,
+        partition_key="none",
+        encoder="json",
+        replay=None,
+        bucket_seconds=10,
+        max_buckets=1000,
+        value_encoding="array",
+    )
+    aggregator = get_aggregator(settings)
+    messages = aggregate_metrics(settings, 0, 50, cycle=True, aggregator=aggregator)
+    # pull enough buckets to span several passes over the idx range
+    for _ in range(200):
+        next(messages)
+
+    # the counters span all the passes, the caller reports them once at the end
+    assert aggregator.num_values > 50
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("workers, expected_rate", [(2, 150), (8, 100)])
+def test_rate_is_split_between_started_workers(workers, expected_rate):
+    # there are never more workers than messages, the started workers send the whole rate
+    settings = make_settings(
+        num_messages=3,
+        start_idx=0,
+        stop_idx=3,
+        workers=workers,
+        rate=300,
+        duration_seconds=None,
+        ramp_up_seconds=None,
+        ramp_profile="linear",
+        report_interval=10,
+    )
+    assert get_pacer(settings, 0).rate == expected_rate
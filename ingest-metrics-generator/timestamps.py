@@ -0,0 +1,115 @@
+"""
+Timestamp schedules of the generated messages.
+
+All the schedules place the messages in the window [timestamp - spread, timestamp]:
+    even: num_messages messages evenly spaced over the window (message idx % num_messages), the spacing is
+        computed exactly so the messages never run past the window, whatever their number
+    random: uniformly distributed (counter based random source)
+    live: the current wall clock time (when the message batch is generated)
+    diurnal: follows a daily intensity curve (peak at diurnal_peak_hour UTC), the messages are the evenly
+        spaced quantiles of the curve in repeatable mode and random samples of it otherwise
+
+num_messages is the size of the whole run (not of the [start_idx, stop_idx) range sent by this process or
+worker), so the timestamp of a message only depends on its idx and a resumed or sharded run places its
+messages exactly like the full run.
+
+Every schedule has a scalar (timestamp) and a vectorized (timestamps) version computing the same values.
+"""
+import functools
+import math
+import time
+from typing import Any, Mapping
+
+import numpy as np
+
+from counter_random import get_random
+
+TIMESTAMP_SCHEDULES = ["even", "random", "live", "diurnal"]
+
+SECONDS_PER_DAY = 24 * 3600
+
+# the diurnal curve is sampled (and interpolated) every DIURNAL_RESOLUTION seconds
+DIURNAL_RESOLUTION = 60
+
+
+def get_schedule(settings: Mapping[str, Any]) -> str:
+    """
+    The timestamp schedule, defaults to even for repeatable runs and to random otherwise
+    """
+    schedule = settings.get("timestamp_schedule")
+    if schedule is None:
+        return "even" if settings["repeatable"] else "random"
+    return schedule
+
+
+def timestamp(idx: int, settings: Mapping[str, Any]) -> int:
+    schedule = get_schedule(settings)
+    end = settings["timestamp"]
+    base_seconds = int(settings["time_delta"].total_seconds())
+
+    if schedule == "even":
+        num_messages = max(1, settings["num_messages"])
+        return end - base_seconds + (idx % num_messages) * base_seconds // num_messages
+    if schedule == "random":
+        return end - get_random(settings).randint("timestamp", idx, 0, base_seconds)
+    if schedule == "live":
+        return int(time.time())
+    return int(timestamps(np.array([idx], dtype=np.int64), settings)[0])
+
+
+def timestamps(idx: np.ndarray, settings: Mapping[str, Any]) -> np.ndarray:
+    schedule = get_schedule(settings)
+    end = settings["timestamp"]
+    base_seconds = int(settings["time_delta"].total_seconds())
+
+    if schedule == "even":
+        num_messages = max(1, settings["num_messages"])
+        return end - base_seconds + (idx % num_messages) * base_seconds // num_messages
+    if schedule == "random":
+        return end - get_random(settings).randint_array("timestamp", idx, 0, base_seconds)
+    if schedule == "live":
+        return np.full(len(idx), int(time.time()), dtype=np.int64)
+
+    if settings["repeatable"]:
+        num_messages = max(1, settings["num_messages"])
+        quantiles = ((idx % num_messages) + 0.5) / num_messages
+    else:
+        quantiles = get_random(settings).random_array("timestamp", idx)
+    curve = _get_diurnal_curve(
+        end,
+        base_seconds,
+        float(settings.get("diurnal_amplitude", 0.8)),
+        float(settings.get("diurnal_peak_hour", 14)),
+    )
+    return curve.timestamps(quantiles)
+
+
+class DiurnalCurve:
+    """
+    The inverse cumulative distribution of a daily periodic message intensity over [end - spread, end]
+
+    The intensity at time t is 1 + amplitude * cos(2 pi (t - peak) / 1 day).
+    """
+
+    def __init__(
+        self, end: int, spread_seconds: int, amplitude: float, peak_hour: float
+    ):
+        start = end - spread_seconds
+        num_points = max(2, spread_seconds // DIURNAL_RESOLUTION + 1)
+        self._times = np.linspace(start, end, num_points)
+        phase = 2 * math.pi * (self._times - peak_hour * 3600) / SECONDS_PER_DAY
+        intensity = 1.0 + amplitude * np.cos(phase)
+        # trapezoid integration of the intensity, normalized to [0, 1]
+        areas = (intensity[1:] + intensity[:-1]) / 2
+        cumulative = np.concatenate(([0.0], np.cumsum(areas)))
+        self._cdf = cumulative / cumulative[-1]
+
+    def timestamps(self, quantiles: np.ndarray) -> np.ndarray:
+        return np.floor(np.interp(quantiles, self._cdf, self._times)).astype(np.int64)
+
+
+@functools.lru_cache(maxsize=16)
+def _get_diurnal_curve(
+    end: int, spread_seconds: int, amplitude: float, peak_hour: float
+) -> DiurnalCurve:
+    return DiurnalCurve(end, spread_seconds, amplitude, peak_hour)
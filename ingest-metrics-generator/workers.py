@@ -0,0 +1,142 @@
+import multiprocessing
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Mapping, Any, Optional, Tuple
+
+from delivery import DeliveryStats
+
+# called with (settings, worker, start_idx, stop_idx), sends the messages with idx in [start_idx, stop_idx)
+# and returns the number of messages sent and the delivery stats of the sink (if any)
+ShardSender = Callable[
+    [Mapping[str, Any], int, int, int], Tuple[int, Optional[DeliveryStats]]
+]
+
+
+@dataclass
+class ShardResult:
+    worker: int
+    start_idx: int
+    stop_idx: int
+    num_messages: int
+    elapsed: float
+    delivery: Optional[DeliveryStats] = None
+
+    @property
+    def rate(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.num_messages / self.elapsed
+
+
+def shard_ranges(
+    num_messages: int, num_workers: int, start_idx: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Splits the message index range [start_idx, start_idx + num_messages) into contiguous shards, one per worker.
+
+    Shard sizes differ by at most one message and no empty shards are returned.
+
+    >>> shard_ranges(10, 3)
+    [(0, 4), (4, 7), (7, 10)]
+    >>> shard_ranges(2, 4)
+    [(0, 1), (1, 2)]
+    >>> shard_ranges(4, 2, start_idx=100)
+    [(100, 102), (102, 104)]
+    """
+    num_workers = max(1, min(num_workers, num_messages))
+    base, extra = divmod(num_messages, num_workers)
+    ranges = []
+    start = start_idx
+    for worker in range(num_workers):
+        stop = start + base + (1 if worker < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def get_shard_ranges(settings: Mapping[str, Any]) -> List[Tuple[int, int]]:
+    """
+    The idx ranges of the workers of the run, one per process actually started (there are never more
+    processes than messages, whatever settings["workers"])
+    """
+    return shard_ranges(
+        settings["stop_idx"] - settings["start_idx"],
+        settings["workers"],
+        settings["start_idx"],
+    )
+
+
+def _run_shard(
+    send_shard: ShardSender,
+    settings: Mapping[str, Any],
+    worker: int,
+    start_idx: int,
+    stop_idx: int,
+) -> ShardResult:
+    start = time.perf_counter()
+    num_messages, delivery = send_shard(settings, worker, start_idx, stop_idx)
+    elapsed = time.perf_counter() - start
+    return ShardResult(worker, start_idx, stop_idx, num_messages, elapsed, delivery)
+
+
+def _run_shard_in_worker(args) -> ShardResult:
+    return _run_shard(*args)
+
+
+def run_sharded(
+    settings: Mapping[str, Any], send_shard: ShardSender
+) -> List[ShardResult]:
+    """
+    Sends the messages with idx in [settings["start_idx"], settings["stop_idx"]) split between
+    settings["workers"] processes.
+
+    Every worker gets a contiguous idx range and calls send_shard (which should create its own sink).
+    Since the messages only depend on their idx (and on the seed in non repeatable mode), a sharded run
+    generates exactly the same messages as a single process run (only the order in which they are
+    produced differs).
+
+    With a single worker the shard is sent in the current process.
+    """
+    ranges = get_shard_ranges(settings)
+
+    if len(ranges) == 1:
+        start_idx, stop_idx = ranges[0]
+        return [_run_shard(send_shard, settings, 0, start_idx, stop_idx)]
+
+    tasks = [
+        (send_shard, settings, worker, start_idx, stop_idx)
+        for worker, (start_idx, stop_idx) in enumerate(ranges)
+    ]
+    with multiprocessing.Pool(processes=len(tasks)) as pool:
+        return pool.map(_run_shard_in_worker, tasks, chunksize=1)
+
+
+def merge_delivery_stats(results: List[ShardResult]) -> Optional[DeliveryStats]:
+    """
+    Aggregates the delivery stats of all the workers (None if the sink doesn't get delivery reports)
+    """
+    merged = None
+    for result in results:
+        if result.delivery is None:
+            continue
+        if merged is None:
+            merged = DeliveryStats()
+        merged.merge(result.delivery)
+    return merged
+
+
+def print_throughput_report(results: List[ShardResult], elapsed: float):
+    """
+    Prints the per worker and the aggregate throughput (aggregate is computed over the wall time elapsed)
+    """
+    total = sum(result.num_messages for result in results)
+    for result in results:
+        print(
+            f"worker {result.worker}: idx [{result.start_idx}, {result.stop_idx}) "
+            f"{result.num_messages} messages in {result.elapsed:.2f}s ({result.rate:.0f} msgs/s)"
+        )
+    aggregate_rate = total / elapsed if elapsed > 0 else 0.0
+    print(
+        f"total: {total} messages in {elapsed:.2f}s ({aggregate_rate:.0f} msgs/s) "
+        f"with {len(results)} worker(s)"
+    )
@@ -0,0 +1,113 @@
+"""
+Micro benchmarks for the ingest message encoding (no kafka involved).
+
+Usage: python benchmark.py [-n NUM_MESSAGES] [--payload-size N]
+"""
+import datetime
+import time
+from typing import Any, Callable, List, Mapping, Tuple
+
+import click
+
+from encoding import MessageBatch
+from messages import (
+    ATTACHMENT_CHUNK_MESSAGE,
+    _get_event,
+    attachment_chunk_messages,
+    event_message,
+    user_report_message,
+)
+from payloads import PayloadPool, SizeDistribution, random_bytes
+
+
+def benchmark_settings(num_messages: int, payload_size: int) -> Mapping[str, Any]:
+    sizes = SizeDistribution("fixed", payload_size, payload_size)
+    return {
+        "num_messages": num_messages,
+        "projects": [5, 6, 7, 8, 9, 10],
+        "timestamp": int(time.time()),
+        "time_delta": datetime.timedelta(hours=2),
+        "event_types": ["transaction", "error", "default"],
+        "payload_pool": PayloadPool(random_bytes(max(payload_size, 1 << 20)), sizes),
+        "attachment_chunk_size": payload_size,
+    }
+
+
+def _events(encoder: str) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        settings = {**settings, "encoder": encoder}
+        for idx in range(settings["num_messages"]):
+            event_message(idx, settings, _get_event(idx, settings, "a" * 32, 5))
+
+    return run
+
+
+def _user_reports(encoder: str) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        settings = {**settings, "encoder": encoder}
+        for idx in range(settings["num_messages"]):
+            user_report_message(idx, settings, "a" * 32, 5)
+
+    return run
+
+
+def _chunks(encoder: str) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        settings = {**settings, "encoder": encoder}
+        pool = settings["payload_pool"]
+        for idx in range(settings["num_messages"]):
+            for _ in attachment_chunk_messages(
+                settings, "a" * 32, 5, "b" * 32, pool.payload(), settings["attachment_chunk_size"]
+            ):
+                pass
+
+    return run
+
+
+def batch_chunks(settings: Mapping[str, Any]):
+    pool = settings["payload_pool"]
+    batch = MessageBatch()
+    for idx in range(settings["num_messages"]):
+        batch.add(ATTACHMENT_CHUNK_MESSAGE, "a" * 32, 5, "b" * 32, 0, pool.payload())
+        if len(batch) == 1000:
+            batch.messages()
+            batch.clear()
+    batch.messages()
+
+
+BENCHMARKS: List[Tuple[str, Callable[[Mapping[str, Any]], None]]] = [
+    ("event, dict + packb + json.dumps", _events("dict")),
+    ("event, template", _events("template")),
+    ("user_report, dict + packb + json.dumps", _user_reports("dict")),
+    ("user_report, template", _user_reports("template")),
+    ("attachment_chunk, dict + packb", _chunks("dict")),
+    ("attachment_chunk, template", _chunks("template")),
+    ("attachment_chunk, template batch", batch_chunks),
+]
+
+
+def _print_result(name: str, num_messages: int, elapsed: float):
+    print(f"{name:40} {num_messages / elapsed:12.0f} msgs/s")
+
+
+@click.command()
+@click.option("--num-messages", "-n", type=int, default=100000)
+@click.option(
+    "--payload-size",
+    type=int,
+    default=1000,
+    help="The payload size of the attachment chunks",
+)
+def main(num_messages: int, payload_size: int):
+    """
+    Runs the encoding benchmarks and prints the msgs/s for each of them
+    """
+    settings = benchmark_settings(num_messages, payload_size)
+    for name, run in BENCHMARKS:
+        start = time.perf_counter()
+        run(settings)
+        _print_result(name, num_messages, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+msgpack encoding of the ingest messages through pre-encoded templates.
+
+An ingest message is a msgpack map with a fixed set of keys per message type. A MessageTemplate packs the
+map header, all the keys and the static values (e.g. "type": "event") once, only the dynamic values are
+packed for every message (with a single reused Packer) and joined with the static fragments.
+
+MessageTemplate.pack_dict builds the same map as a dict and packs it with msgpack.packb, it produces the
+same bytes and is kept as the reference (and benchmark baseline) implementation.
+"""
+from typing import Any, List, Sequence, Tuple, Union
+
+import msgpack
+
+ENCODERS = ["template", "dict"]
+
+# a field is either a key (the value is passed to pack) or a (key, static value) pair
+Field = Union[str, Tuple[str, Any]]
+
+# not thread safe, the generator packs all its messages from a single thread
+_packer = msgpack.Packer()
+
+
+class MessageTemplate:
+    """
+    Packs messages with the given fields, in order
+
+    >>> template = MessageTemplate(["event_id", ("type", "event")])
+    >>> template.pack("abc") == msgpack.packb({"event_id": "abc", "type": "event"})
+    True
+    >>> template.pack("abc") == template.pack_dict("abc")
+    True
+    """
+
+    def __init__(self, fields: Sequence[Field]):
+        self.keys: List[str] = []
+        self._static = {}
+        # _prefix: everything up to the first dynamic value, _suffixes[i]: everything after dynamic value i
+        # up to the next dynamic value
+        fragments = [_packer.pack_map_header(len(fields))]
+        self._suffixes: List[bytes] = []
+        for field in fields:
+            if isinstance(field, tuple):
+                key, value = field
+                self._static[key] = value
+                fragments.append(_packer.pack(key))
+                fragments.append(_packer.pack(value))
+            else:
+                self.keys.append(field)
+                fragments.append(_packer.pack(field))
+                self._suffixes.append(b"".join(fragments))
+                fragments = []
+        self._suffixes.append(b"".join(fragments))
+        self._prefix = self._suffixes.pop(0)
+        self._fields = fields
+
+    def pack(self, *values: Any) -> bytes:
+        assert len(values) == len(self.keys)
+        pack = _packer.pack
+        parts = [self._prefix]
+        for value, suffix in zip(values, self._suffixes):
+            parts.append(pack(value))
+            parts.append(suffix)
+        return b"".join(parts)
+
+    def pack_into(self, buffer: bytearray, *values: Any):
+        """
+        Appends the packed message to buffer
+        """
+        assert len(values) == len(self.keys)
+        pack = _packer.pack
+        buffer += self._prefix
+        for value, suffix in zip(values, self._suffixes):
+            buffer += pack(value)
+            buffer += suffix
+
+    def pack_dict(self, *values: Any) -> bytes:
+        assert len(values) == len(self.keys)
+        dynamic = dict(zip(self.keys, values))
+        message = {}
+        for field in self._fields:
+            key = field[0] if isinstance(field, tuple) else field
+            message[key] = self._static[key] if key in self._static else dynamic[key]
+        return msgpack.packb(message)
+
+
+class MessageBatch:
+    """
+    Packs many messages into a single buffer, the messages are memoryview slices of the buffer
+
+    Only used by benchmark.py, to measure packing a batch of messages into one buffer against packing them one
+    by one. The generator sends every message as it is packed (the producer copies the value anyway).
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self._offsets = [0]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def add(self, template: MessageTemplate, *values: Any):
+        template.pack_into(self.buffer, *values)
+        self._offsets.append(len(self.buffer))
+
+    def messages(self) -> List[memoryview]:
+        view = memoryview(self.buffer)
+        offsets = self._offsets
+        return [view[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def clear(self):
+        # a new buffer, the views handed out by messages() may still be in use
+        self.buffer = bytearray()
+        self._offsets = [0]
@@ -1,6 +1,5 @@
 import datetime
 import json
-import random
 from typing import Mapping, Any, Optional, List
 import time
 
@@ -9,12 +8,23 @@ from confluent_kafka import Producer
 from yaml import load, dump, Dumper, Loader
 
 from messages import generate_real_attachment_with_chunk, generate_message
-from util import parse_timedelta
+from util import parse_size, parse_timedelta
 from readme_generator import generate_readme
+from sessions import generate_sessions
+from encoding import ENCODERS
+from partitioning import check_partitioning, get_hot_partition_router
+from kafka_profiles import PROFILES, get_kafka_config
+from payloads import PAYLOAD_KINDS, SIZE_DISTRIBUTIONS, DEFAULT_POOL_SIZE, get_payload_pool
+
+# attachments are split in chunks of (at most) this size, kept well under the default kafka
+# message.max.bytes (1000000) so the chunk messages aren't rejected by the producer
+DEFAULT_CHUNK_SIZE = "512KB"
 
 
 MESSAGE_TYPES = ["event", "attachment_chunk", "attachment", "user_report"]
 EVENT_TYPES = ["transaction", "error", "default"]
+# the supported kafka message keys (see messages.get_message_key)
+PARTITION_KEYS = ["event", "project", "org", "none"]
 
 
 @click.command()
@@ -29,11 +39,47 @@ EVENT_TYPES = ["transaction", "error", "default"]
     default="",
     help="The number of attachments to send to the kafka queue",
 )
+@click.option(
+    "--num-sessions",
+    default="",
+    help="The number of sessions (an event with its attachment chunks and user report, in causal order) to send to the kafka queue",
+)
+@click.option(
+    "--session-window",
+    type=int,
+    help="The number of sessions in flight whose messages are interleaved (default: 1, sessions are sent one after the other)",
+)
 @click.option(
     "--num-payloads",
     default="",
     help="The number of different attachment payloads to send to the kafka queue",
 )
+@click.option(
+    "--payload-kind",
+    type=click.Choice(PAYLOAD_KINDS),
+    help="The content of the attachment payloads: random bytes, compressible text or a real file (default: random)",
+)
+@click.option(
+    "--payload-file",
+    help="The file the payloads are taken from with --payload-kind file",
+)
+@click.option(
+    "--payload-size-min",
+    help="The minimum attachment payload size (e.g. 100, 10KB, 2MB) (default: 100)",
+)
+@click.option(
+    "--payload-size-max",
+    help="The maximum attachment payload size (e.g. 100, 10KB, 2MB) (default: 10KB)",
+)
+@click.option(
+    "--payload-size-distribution",
+    type=click.Choice(SIZE_DISTRIBUTIONS),
+    help="The distribution of the payload sizes between the minimum and the maximum (default: uniform)",
+)
+@click.option(
+    "--chunk-size",
+    help="The maximum size of the attachment chunks, larger attachments are split in several chunks (default: 512KB)",
+)
 @click.option(
     "--settings-file", "-f", default=None, help="The settings file name (json or yaml)"
 )
@@ -60,6 +106,31 @@ EVENT_TYPES = ["transaction", "error", "default"]
 @click.option("--project", "-p", type=int, help="project id")
 @click.option("--message-type", "-m", "message_types", type=click.Choice(MESSAGE_TYPES), multiple=True, help="message types to generate")
 @click.option("--event-type", "-e", "event_types", type=click.Choice(EVENT_TYPES), multiple=True, help="event types to generate")
+@click.option(
+    "--kafka-profile",
+    type=click.Choice(list(PROFILES)),
+    help="Producer tuning profile (batching, linger, compression and queue sizes), explicit [kafka] settings override it (default: default)",
+)
+@click.option(
+    "--encoder",
+    type=click.Choice(ENCODERS),
+    help="How messages are serialized: pre-encoded msgpack templates or dicts packed with msgpack.packb (default: template)",
+)
+@click.option(
+    "--partition-key",
+    type=click.Choice(PARTITION_KEYS),
+    help="Kafka message key of the generated messages: the event id, the project id, the org id or none (default: event)",
+)
+@click.option(
+    "--hot-partition-fraction",
+    type=float,
+    help="Fraction of the messages sent to a single partition (--hot-partition) instead of the partition of their key (default: 0)",
+)
+@click.option(
+    "--hot-partition",
+    type=int,
+    help="The partition receiving the --hot-partition-fraction messages (default: 0)",
+)
 @click.option("--dry-run", is_flag=True, help="if set only prints the settings")
 @click.option("--update-docs", is_flag=True,  help="creates a README.md  documentation file")
 def main(**kwargs):
@@ -73,14 +144,21 @@ def main(**kwargs):
     settings = get_settings(**kwargs)
 
     print("Settings:")
-    print(settings)
+    # the payload pool is megabytes of data
+    print({name: value for name, value in settings.items() if name != "payload_pool"})
+
+    print("Kafka producer config:")
+    print(settings["kafka_config"])
 
     if kwargs["dry_run"]:
         return
 
     producer = get_kafka_producer(settings)
 
-    if settings["num_attachments"] > 0:
+    if settings["num_sessions"] > 0:
+        print("Sending data...", flush=True)
+        send_sessions(producer, settings)
+    elif settings["num_attachments"] > 0:
         print("Generating attachment data...", flush=True)
         payloads = generate_attachment_payloads(settings)
 
@@ -95,9 +173,10 @@ def main(**kwargs):
 
 def send_messages(producer, settings):
     topic_name = settings["topic_name"]
+    router = get_hot_partition_router(settings)
 
-    for message in generate_messages(settings):
-        producer.produce(topic_name, message)
+    for key, message in generate_messages(settings):
+        producer.produce(topic_name, key=key, value=message, partition=router.partition())
         producer.poll(0)
 
     producer.flush()
@@ -106,16 +185,31 @@ def send_messages(producer, settings):
 def send_attachments(producer, settings, payloads):
     topic_name = settings["topic_name"]
     num_attachments = settings["num_attachments"]
+    router = get_hot_partition_router(settings)
 
     for idx in range(num_attachments):
         payload = payloads[idx % len(payloads)]
-        for event_id, message in generate_real_attachment_with_chunk(idx, settings, payload):
-            producer.produce(topic_name, key=event_id, value=message)
+        # the chunks and the attachment message go to the same partition
+        partition = router.partition()
+        for key, message in generate_real_attachment_with_chunk(idx, settings, payload):
+            producer.produce(topic_name, key=key, value=message, partition=partition)
             producer.poll(0)
 
     producer.flush()
 
 
+def send_sessions(producer, settings):
+    topic_name = settings["topic_name"]
+
+    # all the messages of a session have the same key and partition, so they land on the same partition in
+    # order (hot partition routing pins whole sessions)
+    for partition, key, message in generate_sessions(settings):
+        producer.produce(topic_name, key=key, value=message, partition=partition)
+        producer.poll(0)
+
+    producer.flush()
+
+
 def generate_messages(settings):
     num_messages = settings["num_messages"]
 
@@ -123,18 +217,23 @@ def generate_messages(settings):
         yield generate_message(idx, settings)
 
 
-def generate_attachment_payloads(settings: Mapping[str, Any]) -> List[bytes]:
-    payloads = []
-    # TODO: Make min/max size configurable?
-    for _i in range(settings["num_payloads"]):
-        payloads.append("".join([chr(random.randint(0, 255)) for _ in range(100)]).encode("utf-8"))
-    return payloads
+def generate_attachment_payloads(settings: Mapping[str, Any]) -> List[memoryview]:
+    pool = settings["payload_pool"]
+    return [pool.payload() for _ in range(settings["num_payloads"])]
 
 
 def get_settings(
     num_messages: Optional[str],
     num_attachments: Optional[str],
+    num_sessions: Optional[str],
+    session_window: Optional[int],
     num_payloads: Optional[str],
+    payload_kind: Optional[str],
+    payload_file: Optional[str],
+    payload_size_min: Optional[str],
+    payload_size_max: Optional[str],
+    payload_size_distribution: Optional[str],
+    chunk_size: Optional[str],
     settings_file: Optional[str],
     topic_name: Optional[str],
     broker: Optional[str],
@@ -144,6 +243,11 @@ def get_settings(
     event_types: List[str],
     timestamp: Optional[int],
     spread: Optional[str],
+    kafka_profile: Optional[str],
+    encoder: Optional[str],
+    partition_key: Optional[str],
+    hot_partition_fraction: Optional[float],
+    hot_partition: Optional[int],
     dry_run: bool,
     **kwargs,
 ):
@@ -151,6 +255,10 @@ def get_settings(
     settings = {
         "num_messages": 100,
         "num_attachments": 0,
+        "num_sessions": 0,
+        "session_window": 1,
+        "session_max_attachments": 2,
+        "session_user_report_rate": 0.5,
         "num_payloads": 1,
         # attachments is the most defensive default, since this topic allows all
         # message types.
@@ -159,7 +267,19 @@ def get_settings(
         "message_types": MESSAGE_TYPES,
         "event_types": EVENT_TYPES,
         "kafka": {},
+        "kafka_profile": "default",
+        "encoder": "template",
+        "partition_key": "event",
+        "hot_partition_fraction": 0.0,
+        "hot_partition": 0,
         "metric_types": {},
+        "payload_kind": "random",
+        "payload_file": None,
+        "payload_size_min": 100,
+        "payload_size_max": "10KB",
+        "payload_size_distribution": "uniform",
+        "payload_pool_size": DEFAULT_POOL_SIZE,
+        "attachment_chunk_size": DEFAULT_CHUNK_SIZE,
     }
 
     if settings_file is not None:
@@ -181,6 +301,43 @@ def get_settings(
     if project is not None:
         settings["projects"] = [project]
 
+    if kafka_profile is not None:
+        settings["kafka_profile"] = kafka_profile
+
+    if settings["kafka_profile"] not in PROFILES:
+        raise click.UsageError(
+            f"Invalid 'kafka_profile': should be one of {', '.join(PROFILES)}"
+        )
+
+    if encoder is not None:
+        settings["encoder"] = encoder
+
+    if settings["encoder"] not in ENCODERS:
+        raise click.UsageError(
+            f"Invalid 'encoder': {settings['encoder']} should be one of {', '.join(ENCODERS)}"
+        )
+
+    for name, value in (
+        ("partition_key", partition_key),
+        ("hot_partition_fraction", hot_partition_fraction),
+        ("hot_partition", hot_partition),
+    ):
+        if value is not None:
+            settings[name] = value
+
+    if settings["partition_key"] not in PARTITION_KEYS:
+        raise click.UsageError(
+            f"Invalid 'partition_key': should be one of {', '.join(PARTITION_KEYS)}"
+        )
+
+    error = check_partitioning(settings)
+    if error is not None:
+        raise click.UsageError(error)
+
+    settings["kafka_config"] = get_kafka_config(
+        settings["kafka_profile"], settings["kafka"]
+    )
+
     if settings["kafka"].get("bootstrap.servers") is None:
         raise click.UsageError(
             f"Kafka broker was not specified, to specify either use --broker argument or set [kafka][bootstrap.servers] in the settings file"
@@ -209,6 +366,7 @@ def get_settings(
     for name, value in (
         ("num_messages", num_messages),
         ("num_attachments", num_attachments),
+        ("num_sessions", num_sessions),
         ("num_payloads", num_payloads),
         # NB: Add other numeric settings here
     ):
@@ -232,11 +390,114 @@ def get_settings(
 
     settings["time_delta"] = time_delta
 
+    _calculate_sessions(settings, session_window)
+
+    _calculate_payloads(
+        settings,
+        payload_kind,
+        payload_file,
+        payload_size_min,
+        payload_size_max,
+        payload_size_distribution,
+        chunk_size,
+    )
+
     settings["dry_run"] = dry_run
 
     return settings
 
 
+def _calculate_sessions(settings, session_window: Optional[int]):
+    if session_window is not None:
+        settings["session_window"] = session_window
+
+    if settings["session_window"] < 1:
+        raise click.UsageError("Invalid 'session_window': should be at least 1")
+
+    if settings["session_max_attachments"] < 0:
+        raise click.UsageError("Invalid 'session_max_attachments': should be at least 0")
+
+    if not 0 <= settings["session_user_report_rate"] <= 1:
+        raise click.UsageError("Invalid 'session_user_report_rate': should be between 0 and 1")
+
+
+def _calculate_payloads(
+    settings,
+    payload_kind: Optional[str],
+    payload_file: Optional[str],
+    payload_size_min: Optional[str],
+    payload_size_max: Optional[str],
+    payload_size_distribution: Optional[str],
+    chunk_size: Optional[str],
+):
+    """
+    Validates the attachment payload settings and creates the payload pool (settings["payload_pool"], None
+    if the run doesn't send attachment payloads)
+    """
+    for name, value in (
+        ("payload_kind", payload_kind),
+        ("payload_file", payload_file),
+        ("payload_size_min", payload_size_min),
+        ("payload_size_max", payload_size_max),
+        ("payload_size_distribution", payload_size_distribution),
+        ("attachment_chunk_size", chunk_size),
+    ):
+        if value is not None:
+            settings[name] = value
+
+    if settings["payload_kind"] not in PAYLOAD_KINDS:
+        raise click.UsageError(
+            f"Invalid 'payload_kind': should be one of {', '.join(PAYLOAD_KINDS)}"
+        )
+
+    if settings["payload_size_distribution"] not in SIZE_DISTRIBUTIONS:
+        raise click.UsageError(
+            f"Invalid 'payload_size_distribution': should be one of {', '.join(SIZE_DISTRIBUTIONS)}"
+        )
+
+    for name in (
+        "payload_size_min",
+        "payload_size_max",
+        "payload_pool_size",
+        "attachment_chunk_size",
+    ):
+        size = parse_size(settings[name])
+        if size is None or size <= 0:
+            raise click.UsageError(
+                f"Invalid '{name}': {settings[name]} should be a positive size (e.g. 100, 10KB, 2MB)"
+            )
+        settings[name] = size
+
+    if settings["payload_size_min"] > settings["payload_size_max"]:
+        raise click.UsageError(
+            "Invalid payload sizes: 'payload_size_min' is larger than 'payload_size_max'"
+        )
+
+    if settings["payload_kind"] == "file" and settings["payload_file"] is None:
+        raise click.UsageError(
+            "The payload file was not specified, to specify either use --payload-file argument or set [payload_file] in the settings file"
+        )
+
+    settings["payload_pool"] = None
+    if not _uses_payloads(settings):
+        return
+
+    try:
+        settings["payload_pool"] = get_payload_pool(settings)
+    except (OSError, ValueError) as e:
+        raise click.UsageError(f"Could not create the attachment payloads: {e}")
+
+
+def _uses_payloads(settings: Mapping[str, Any]) -> bool:
+    """
+    Whether the run sends attachment payloads: attachment runs always do, session and independent message
+    runs only send them in attachment chunks
+    """
+    if settings["num_sessions"] == 0 and settings["num_attachments"] > 0:
+        return True
+    return "attachment_chunk" in settings["message_types"]
+
+
 def _normalize_message_types(settings: Mapping[str, Any]):
     types = settings["message_types"]
 
@@ -253,7 +514,7 @@ def get_fake_kafka_producer(settings):
         def __init__(self, settings):
             pass
 
-        def produce(self, topic_name, key, value):
+        def produce(self, topic_name, key, value, partition=-1):
             print(value)
 
         def poll(self, value):
@@ -269,11 +530,12 @@ def get_kafka_producer(settings):
     """
     Returns a kafka producer configured with the
     settings found in the settings["kafka"] sub-object
+    on top of the settings["kafka_profile"] tuning profile
 
     At a minimum the settings should contain:
         bootstrap.server: host-name:port-number
     """
-    kafka_settings = settings["kafka"]
+    kafka_settings = settings["kafka_config"]
     return Producer(kafka_settings)
 
 
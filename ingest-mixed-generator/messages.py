@@ -1,15 +1,38 @@
 import json
 import random
-from typing import Callable, Mapping, Any, Optional
+from typing import Callable, Iterator, Mapping, Any, Optional, Sequence, Tuple
 import uuid
 
-import msgpack
+from encoding import MessageTemplate
+from partitioning import encode_key
 
-def generate_message(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
+
+def generate_message(idx: int, settings: Mapping[str, Any]) -> Tuple[Optional[bytes], bytes]:
+    """
+    Generates an independent message of a random type, returns its kafka key and the message
+    """
     message_type = _get_message_type(idx, settings) or ""
     generator = _get_message_generator(message_type)
+    event_id = _get_event_id(idx, settings)
+    project_id = _get_project_id(idx, settings)
+
+    message = generator(idx, settings, event_id, project_id)
+    return get_message_key(settings, event_id, project_id), message
+
+
+def get_message_key(settings: Mapping[str, Any], event_id: str, project_id: int) -> Optional[bytes]:
+    """
+    The kafka key of a message (settings["partition_key"]: event, project, org or none)
+    """
+    partition_key = settings["partition_key"]
+    if partition_key == "event":
+        return encode_key(event_id)
+    if partition_key == "project":
+        return encode_key(project_id)
+    if partition_key == "org":
+        return encode_key(settings["org"])
+    return None
 
-    return generator(idx, settings)
 
 def _get_message_type(idx: int, settings: Mapping[str, Any]) -> Optional[str]:
     types = settings["message_types"]
@@ -23,7 +46,7 @@ def _get_message_type(idx: int, settings: Mapping[str, Any]) -> Optional[str]:
 
 def _get_message_generator(
     message_type: str,
-) -> Callable[[int, Mapping[str, Any]], Mapping[str, Any]]:
+) -> Callable[[int, Mapping[str, Any], str, int], bytes]:
     return {
         "event": event_message_generator,
         "attachment": attachment_message_generator,
@@ -32,13 +55,48 @@ def _get_message_generator(
     }.get(message_type, default_message_generator)
 
 
-def _create_msgpack_wrapper(ty: str, headers: Mapping[str, Any], payload: Optional[bytes]) -> bytes:
-    message = {**headers, "type": ty}
-
-    if payload is not None:
-        message["payload"] = payload
-
-    return msgpack.packb(message)
+EVENT_MESSAGE = MessageTemplate(
+    [
+        "start_time",
+        "event_id",
+        "project_id",
+        ("remote_addr", None),
+        "attachments",
+        ("type", "event"),
+        "payload",
+    ]
+)
+ATTACHMENT_MESSAGE = MessageTemplate(
+    ["event_id", "project_id", "attachment", ("type", "attachment")]
+)
+ATTACHMENT_CHUNK_MESSAGE = MessageTemplate(
+    ["event_id", "project_id", "id", "chunk_index", ("type", "attachment_chunk"), "payload"]
+)
+USER_REPORT_MESSAGE = MessageTemplate(
+    ["project_id", "start_time", "event_id", ("type", "user_report"), "payload"]
+)
+
+# the JSON payloads, rendered like json.dumps (all the values are numbers or strings that need no escaping)
+EVENT_JSON = (
+    '{{"type": "{type}", "event_id": "{event_id}", "project": {project}, '
+    '"timestamp": {timestamp}, "platform": "{platform}"}}'
+)
+USER_REPORT_JSON = (
+    '{{"event_id": "{event_id}", "name": "John Doe", "email": "john.doe@example.org", '
+    '"comments": "This is a test comment"}}'
+)
+
+
+def _pack(settings: Mapping[str, Any], template: MessageTemplate, *values: Any) -> bytes:
+    if settings.get("encoder") == "dict":
+        return template.pack_dict(*values)
+    return template.pack(*values)
+
+
+def _encode_json(settings: Mapping[str, Any], template: str, value: Mapping[str, Any]) -> bytes:
+    if settings.get("encoder") == "dict":
+        return json.dumps(value).encode("utf-8")
+    return template.format(**value).encode("utf-8")
 
 
 def _get_event_type(idx: int, settings: Mapping[str, Any]) -> str:
@@ -74,138 +132,226 @@ def _get_start_time(idx: int, settings: Mapping[str, Any]) -> int:
     return settings["timestamp"]
 
 
-def _get_default_event(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
+def _get_default_event(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> Mapping[str, Any]:
     return {
         "type": "default",
-        "event_id": _get_event_id(idx, settings),
-        "project": _get_project_id(idx, settings),
+        "event_id": event_id,
+        "project": project_id,
         "timestamp": _get_timestamp(idx, settings),
         "platform": "other",
     }
 
 
-def _get_error_event(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
+def _get_error_event(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> Mapping[str, Any]:
     return {
         "type": "error",
-        "event_id": _get_event_id(idx, settings),
-        "project": _get_project_id(idx, settings),
+        "event_id": event_id,
+        "project": project_id,
         "timestamp": _get_timestamp(idx, settings),
         "platform": "other",
     }
 
 
-def _get_transaction_event(idx: int, settings: Mapping[str, Any]) -> Mapping[str, Any]:
+def _get_transaction_event(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> Mapping[str, Any]:
     return {
         "type": "transaction",
-        "event_id": _get_event_id(idx, settings),
-        "project": _get_project_id(idx, settings),
+        "event_id": event_id,
+        "project": project_id,
         "timestamp": _get_timestamp(idx, settings),
         "platform": "other",
     }
 
 
-def event_message_generator(idx: int, settings: Mapping[str, Any], event_type: Optional[str] = None) -> bytes:
+def _get_event(
+    idx: int,
+    settings: Mapping[str, Any],
+    event_id: str,
+    project_id: int,
+    event_type: Optional[str] = None,
+) -> Mapping[str, Any]:
     event_type = event_type or _get_event_type(idx, settings)
 
-    event = {
+    return {
         "default": _get_default_event,
         "error": _get_error_event,
         "transaction": _get_transaction_event,
-    }.get(event_type, _get_default_event)(idx, settings)
-
-    headers = {
-        "start_time": _get_start_time(idx, settings),
-        "event_id": event["event_id"],
-        "project_id": event["project"],
-        "remote_addr": None,
-        "attachments": [],  # TODO: use attachment chunks here
-    }
+    }.get(event_type, _get_default_event)(idx, settings, event_id, project_id)
 
-    payload = json.dumps(event).encode("utf-8")
-    return _create_msgpack_wrapper("event", headers, payload)
-
-
-def attachment_message_generator(idx: int, settings: Mapping[str, Any]) -> bytes:
-    headers = {
-        "event_id": _get_event_id(idx, settings),
-        "project_id": _get_project_id(idx, settings),
-        "attachment": {
-            "id": uuid.uuid4().hex,
-            "name": "test.txt",
-            "content_type": "text/plain",
-            "attachment_type": "event.attachment",
-            "chunks": 0,  # TODO: Use chunk runs here
-            "size": 0,
-            "rate_limited": False,
-        }
-    }
 
-    return _create_msgpack_wrapper("attachment", headers, None)
-
-
-def attachment_chunk_message_generator(idx: int, settings: Mapping[str, Any]) -> bytes:
-    headers = {
-        "event_id": _get_event_id(idx, settings),
-        "project_id": _get_project_id(idx, settings),
-        "id": uuid.uuid4().hex,
-        "chunk_index": 0,  # TODO: Create variable runs of chunks
+def _get_attachment_header(attachment_id: str, num_chunks: int, size: int) -> Mapping[str, Any]:
+    return {
+        "id": attachment_id,
+        "name": "test.txt",
+        "content_type": "text/plain",
+        "attachment_type": "event.attachment",
+        "chunks": num_chunks,
+        "size": size,
+        "rate_limited": False,
     }
 
-    payload_len = random.randint(100, 10000)
-    payload = "".join([chr(random.randint(0, 255)) for _ in range(payload_len)]).encode("utf-8")
 
-    return _create_msgpack_wrapper("attachment_chunk", headers, payload)
-
-
-def user_report_message_generator(idx: int, settings: Mapping[str, Any]) -> bytes:
+def get_num_chunks(size: int, chunk_size: int) -> int:
+    # an empty attachment still has one (empty) chunk
+    return max(1, -(-size // chunk_size))
+
+
+def event_message(
+    idx: int,
+    settings: Mapping[str, Any],
+    event: Mapping[str, Any],
+    attachments: Sequence[Mapping[str, Any]] = (),
+) -> bytes:
+    """
+    The event message, attachments are the headers of the event attachments (their chunks must be sent before)
+    """
+    return _pack(
+        settings,
+        EVENT_MESSAGE,
+        _get_start_time(idx, settings),
+        event["event_id"],
+        event["project"],
+        list(attachments),
+        _encode_json(settings, EVENT_JSON, event),
+    )
+
+
+def attachment_message(
+    settings: Mapping[str, Any], event_id: str, project_id: int, attachment: Mapping[str, Any]
+) -> bytes:
+    return _pack(settings, ATTACHMENT_MESSAGE, event_id, project_id, attachment)
+
+
+def attachment_chunk_messages(
+    settings: Mapping[str, Any],
+    event_id: str,
+    project_id: int,
+    attachment_id: str,
+    payload: memoryview,
+    chunk_size: int,
+) -> Iterator[bytes]:
+    """
+    The chunks of an attachment (payload split in chunk_size slices, without copying)
+    """
+    for chunk_index in range(get_num_chunks(len(payload), chunk_size)):
+        start = chunk_index * chunk_size
+        chunk = payload[start:start + chunk_size]
+        yield _pack(
+            settings, ATTACHMENT_CHUNK_MESSAGE, event_id, project_id, attachment_id, chunk_index, chunk
+        )
+
+
+def user_report_message(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> bytes:
     user_report = {
-        "event_id": _get_event_id(idx, settings),
+        "event_id": event_id,
         "name": "John Doe",
         "email": "john.doe@example.org",
         "comments": "This is a test comment",
     }
 
-    headers = {
-        "project_id": _get_project_id(idx, settings),
-        "start_time": _get_start_time(idx, settings),
-        "event_id": user_report["event_id"],
-    }
-
-    payload = json.dumps(user_report).encode("utf-8")
-    return _create_msgpack_wrapper("user_report", headers, payload)
-
-
-def default_message_generator(idx: int, settings: Mapping[str, Any]) -> bytes:
-    return event_message_generator(idx, settings, event_type="default")
-
-
-def generate_real_attachment_with_chunk(idx: int, settings: Mapping[str, Any], payload: bytes):
+    return _pack(
+        settings,
+        USER_REPORT_MESSAGE,
+        project_id,
+        _get_start_time(idx, settings),
+        event_id,
+        _encode_json(settings, USER_REPORT_JSON, user_report),
+    )
+
+
+def event_message_generator(
+    idx: int,
+    settings: Mapping[str, Any],
+    event_id: str,
+    project_id: int,
+    event_type: Optional[str] = None,
+) -> bytes:
+    event = _get_event(idx, settings, event_id, project_id, event_type)
+    return event_message(idx, settings, event)
+
+
+def attachment_message_generator(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> bytes:
+    # an attachment without chunks (an independent message can't reference real chunks)
+    return attachment_message(
+        settings,
+        event_id,
+        project_id,
+        _get_attachment_header(_get_attachment_id(idx, settings), 0, 0),
+    )
+
+
+def attachment_chunk_message_generator(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> bytes:
+    # a single chunk (an independent message can't be part of a run of chunks)
+    return _pack(
+        settings,
+        ATTACHMENT_CHUNK_MESSAGE,
+        event_id,
+        project_id,
+        uuid.uuid4().hex,
+        0,
+        settings["payload_pool"].payload(),
+    )
+
+
+def user_report_message_generator(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> bytes:
+    return user_report_message(idx, settings, event_id, project_id)
+
+
+def default_message_generator(idx: int, settings: Mapping[str, Any], event_id: str, project_id: int) -> bytes:
+    return event_message_generator(idx, settings, event_id, project_id, event_type="default")
+
+
+def generate_real_attachment_with_chunk(idx: int, settings: Mapping[str, Any], payload: memoryview):
+    """
+    Generates the chunks of an attachment (payload split in attachment_chunk_size slices, without copying)
+    followed by the attachment message referencing them
+    """
     event_id = _get_event_id(idx, settings)
     attachment_id = _get_attachment_id(idx, settings)
     project_id = _get_project_id(idx, settings)
+    chunk_size = settings["attachment_chunk_size"]
+    key = get_message_key(settings, event_id, project_id)
 
-    chunk_headers = {
-        "event_id": event_id,
-        "project_id": project_id,
-        "id": attachment_id,
-        "chunk_index": 0,  # TODO: Split file into multiple chunks?
-    }
+    for message in attachment_chunk_messages(settings, event_id, project_id, attachment_id, payload, chunk_size):
+        yield key, message
 
-    yield event_id, _create_msgpack_wrapper("attachment_chunk", chunk_headers, payload)
+    attachment = _get_attachment_header(
+        attachment_id, get_num_chunks(len(payload), chunk_size), len(payload)
+    )
+    yield key, attachment_message(settings, event_id, project_id, attachment)
 
-    attachment_headers = {
-        "event_id": event_id,
-        "project_id": project_id,
-        "attachment": {
-            "id": attachment_id,
-            "name": "test.txt",
-            "content_type": "text/plain",
-            "attachment_type": "event.attachment",
-            "chunks": 1,
-            "size": 100,
-            "rate_limited": False,
-        }
-    }
-
-    yield event_id, _create_msgpack_wrapper("attachment", attachment_headers, None)
 
+def generate_session(idx: int, settings: Mapping[str, Any]) -> Iterator[Tuple[Optional[bytes], bytes]]:
+    """
+    Generates the causally ordered messages of an event (all with the same kafka key), as Relay sends them:
+        the chunks of the event attachments (if attachment_chunk is a message type)
+        the event listing its attachments (if event is a message type) or else the attachment messages
+        a user report for the event (if user_report is a message type, with session_user_report_rate)
+    """
+    types = settings["message_types"]
+    event_id = _get_event_id(idx, settings)
+    project_id = _get_project_id(idx, settings)
+    event = _get_event(idx, settings, event_id, project_id)
+    chunk_size = settings["attachment_chunk_size"]
+    key = get_message_key(settings, event_id, project_id)
+
+    attachments = []
+    if "attachment_chunk" in types:
+        for _ in range(random.randint(0, settings["session_max_attachments"])):
+            attachment_id = _get_attachment_id(idx, settings)
+            payload = settings["payload_pool"].payload()
+            for message in attachment_chunk_messages(settings, event_id, project_id, attachment_id, payload, chunk_size):
+                yield key, message
+            attachments.append(
+                _get_attachment_header(
+                    attachment_id, get_num_chunks(len(payload), chunk_size), len(payload)
+                )
+            )
+
+    if "event" in types:
+        yield key, event_message(idx, settings, event, attachments)
+    elif "attachment" in types:
+        for attachment in attachments:
+            yield key, attachment_message(settings, event_id, project_id, attachment)
+
+    if "user_report" in types and random.random() < settings["session_user_report_rate"]:
+        yield key, user_report_message(idx, settings, event_id, project_id)
@@ -0,0 +1,142 @@
+"""
+Attachment payloads.
+
+Payloads are slices (memoryviews, no copy) of a pool buffer generated once at startup, the pool content
+is one of:
+    random: random bytes (incompressible)
+    text: random words from a small vocabulary (compresses like plain text)
+    file: the content of a real file, memory mapped (or read and repeated if it's smaller than the pool)
+
+The payload sizes follow a configurable distribution between payload_size_min and payload_size_max:
+    fixed: always payload_size_max
+    uniform: uniformly distributed
+    lognormal: most payloads close to the geometric mean of min and max, with a long tail towards max
+"""
+import math
+import mmap
+import random
+from typing import Any, Mapping, Union
+
+PAYLOAD_KINDS = ["random", "text", "file"]
+SIZE_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+# the minimum size of the payload pool, payloads are taken at random offsets so the pool should be
+# (much) larger than the payloads for the payloads to differ
+DEFAULT_POOL_SIZE = 4 << 20
+
+TEXT_WORDS = (
+    "the quick brown fox jumps over lazy dog error event attachment user report project organization "
+    "stack trace frame function module line column exception message value type release environment "
+    "transaction span duration status ok failed timeout request response header body payload chunk"
+).split()
+
+
+class SizeDistribution:
+    def __init__(self, distribution: str, min_size: int, max_size: int):
+        assert distribution in SIZE_DISTRIBUTIONS
+        assert 0 < min_size <= max_size
+        self.distribution = distribution
+        self.min_size = min_size
+        self.max_size = max_size
+        # lognormal: the median is the geometric mean of min and max, which are 2 sigmas away
+        self._mu = (math.log(min_size) + math.log(max_size)) / 2
+        self._sigma = (math.log(max_size) - math.log(min_size)) / 4
+
+    def __repr__(self) -> str:
+        return f"SizeDistribution({self.distribution}, {self.min_size}, {self.max_size})"
+
+    def sample(self) -> int:
+        if self.distribution == "fixed":
+            return self.max_size
+        if self.distribution == "uniform":
+            return random.randint(self.min_size, self.max_size)
+        size = int(random.lognormvariate(self._mu, self._sigma))
+        return min(max(size, self.min_size), self.max_size)
+
+
+class PayloadPool:
+    """
+    Hands out payloads of exact sizes as memoryview slices of a single buffer
+    """
+
+    def __init__(
+        self, data: Union[bytes, mmap.mmap], sizes: SizeDistribution, kind: str = "random"
+    ):
+        assert len(data) >= sizes.max_size
+        self.kind = kind
+        self.sizes = sizes
+        self._data = data
+        self._view = memoryview(data)
+
+    def __repr__(self) -> str:
+        return f"PayloadPool({self.kind}, {len(self._data)} bytes, {self.sizes})"
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def payload(self) -> memoryview:
+        """
+        A payload with a size drawn from the size distribution
+        """
+        return self.payload_of_size(self.sizes.sample())
+
+    def payload_of_size(self, size: int) -> memoryview:
+        start = random.randint(0, len(self._data) - size)
+        end = start + size
+        return self._view[start:end]
+
+
+def random_bytes(size: int) -> bytes:
+    if size == 0:
+        return b""
+    return random.getrandbits(size * 8).to_bytes(size, "little")
+
+
+def text_bytes(size: int) -> bytes:
+    parts = []
+    length = 0
+    while length < size:
+        # words average ~6 bytes with the separator, draw in bulk and cut at the exact size
+        part = " ".join(random.choices(TEXT_WORDS, k=size // 6 + 1)) + " "
+        parts.append(part)
+        length += len(part)
+    return "".join(parts).encode("ascii")[:size]
+
+
+def file_buffer(path: str, size: int) -> Union[bytes, mmap.mmap]:
+    """
+    The content of the file, memory mapped (the pages are only read when the payloads are sent) or, if the
+    file is smaller than size, read and repeated up to size bytes
+    """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        if file_size == 0:
+            raise ValueError(f"The payload file {path} is empty")
+        if file_size >= size:
+            # the mapping stays valid after the file is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.seek(0)
+        data = f.read()
+    return data * (size // len(data) + 1)
+
+
+def get_payload_pool(settings: Mapping[str, Any]) -> PayloadPool:
+    sizes = SizeDistribution(
+        settings["payload_size_distribution"],
+        settings["payload_size_min"],
+        settings["payload_size_max"],
+    )
+    pool_size = max(settings["payload_pool_size"], sizes.max_size)
+
+    kind = settings["payload_kind"]
+    if kind == "random":
+        data = random_bytes(pool_size)
+    elif kind == "text":
+        data = text_bytes(pool_size)
+    elif kind == "file":
+        data = file_buffer(settings["payload_file"], pool_size)
+    else:
+        raise ValueError(f"Unknown payload kind {kind}")
+
+    return PayloadPool(data, sizes, kind)
@@ -0,0 +1,71 @@
+"""
+Interleaving of the messages of concurrent sessions.
+
+A session is an iterator of causally ordered messages (see messages.generate_session). Up to window sessions
+are in flight at any time, every message is taken from a random in flight session so the messages of
+different sessions are mixed while the order within each session is kept. Only the in flight sessions are
+held in memory, whatever the total number of sessions.
+"""
+import random
+from typing import Any, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+from messages import generate_session
+from partitioning import get_hot_partition_router
+
+T = TypeVar("T")
+
+
+def interleave(sessions: Iterator[Iterator[T]], window: int) -> Iterator[T]:
+    """
+    Merges the messages of the sessions, with at most window sessions in flight
+
+    >>> list(interleave(iter([iter("abc"), iter("de")]), 1))
+    ['a', 'b', 'c', 'd', 'e']
+    >>> sorted(interleave(iter([iter("abc"), iter("de")]), 2))
+    ['a', 'b', 'c', 'd', 'e']
+    """
+    assert window > 0
+    in_flight: List[Iterator[T]] = []
+
+    for session in sessions:
+        in_flight.append(session)
+        if len(in_flight) < window:
+            continue
+        # the window is full, emit messages until a session finishes and makes room for the next one
+        while len(in_flight) >= window:
+            yield from _next_message(in_flight)
+
+    while in_flight:
+        yield from _next_message(in_flight)
+
+
+def _next_message(in_flight: List[Iterator[T]]) -> Iterator[T]:
+    pos = random.randrange(len(in_flight))
+    try:
+        yield next(in_flight[pos])
+    except StopIteration:
+        # swap remove, the order of the in flight sessions doesn't matter
+        in_flight[pos] = in_flight[-1]
+        in_flight.pop()
+
+
+def _with_partition(
+    session: Iterator[Tuple[Optional[bytes], bytes]], partition: int
+) -> Iterator[Tuple[int, Optional[bytes], bytes]]:
+    for key, message in session:
+        yield partition, key, message
+
+
+def generate_sessions(settings: Mapping[str, Any]) -> Iterator[Tuple[int, Optional[bytes], bytes]]:
+    """
+    Generates the (partition, kafka key, message) triples of settings["num_sessions"] interleaved sessions
+
+    The partition (see partitioning.HotPartitionRouter) is drawn once per session, so a session pinned to the
+    hot partition is pinned as a whole and its messages stay on the same partition.
+    """
+    router = get_hot_partition_router(settings)
+    sessions = (
+        _with_partition(generate_session(idx, settings), router.partition())
+        for idx in range(settings["num_sessions"])
+    )
+    return interleave(sessions, settings["session_window"])
@@ -0,0 +1,35 @@
+import datetime
+
+from main import EVENT_TYPES, MESSAGE_TYPES, _calculate_payloads, _calculate_sessions
+
+
+def make_settings(**kwargs):
+    settings = {
+        "num_messages": 100,
+        "num_sessions": 100,
+        "num_attachments": 0,
+        "session_window": 1,
+        "session_max_attachments": 2,
+        "session_user_report_rate": 0.5,
+        "org": 1,
+        "projects": [5, 6, 7],
+        "timestamp": 1700000000,
+        "time_delta": datetime.timedelta(minutes=2),
+        "message_types": MESSAGE_TYPES,
+        "event_types": EVENT_TYPES,
+        "encoder": "template",
+        "partition_key": "event",
+        "hot_partition_fraction": 0.0,
+        "hot_partition": 0,
+        "payload_kind": "random",
+        "payload_file": None,
+        "payload_size_min": 1,
+        "payload_size_max": "10KB",
+        "payload_size_distribution": "uniform",
+        "payload_pool_size": "64KB",
+        "attachment_chunk_size": "1KB",
+    }
+    settings.update(kwargs)
+    _calculate_sessions(settings, None)
+    _calculate_payloads(settings, None, None, None, None, None, None)
+    return settings
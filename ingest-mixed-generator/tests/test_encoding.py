@@ -0,0 +1,132 @@
+import itertools
+import mmap
+import random
+import uuid
+
+import msgpack
+import pytest
+
+from encoding import MessageBatch, MessageTemplate
+from messages import (
+    ATTACHMENT_CHUNK_MESSAGE,
+    EVENT_MESSAGE,
+    _get_message_generator,
+    generate_session,
+)
+from payloads import PayloadPool, SizeDistribution
+from tests.helpers import make_settings
+
+MESSAGE_TYPES = ["event", "attachment", "attachment_chunk", "user_report", ""]
+
+
+@pytest.fixture
+def deterministic_ids(monkeypatch):
+    """
+    Restarts the sequence of ids (uuid4) and random values, so both encoders generate the same messages
+    """
+
+    def reset(seed: int):
+        random.seed(seed)
+        counter = itertools.count()
+        monkeypatch.setattr(uuid, "uuid4", lambda: uuid.UUID(int=next(counter)))
+
+    return reset
+
+
+def _encode_both(settings, deterministic_ids, generate):
+    encoded = []
+    for encoder in ("template", "dict"):
+        deterministic_ids(0)
+        encoded.append(generate({**settings, "encoder": encoder}))
+    return encoded
+
+
+@pytest.mark.parametrize("message_type", MESSAGE_TYPES)
+def test_messages_match_dict_encoding(message_type, deterministic_ids):
+    generator = _get_message_generator(message_type)
+
+    def generate(settings):
+        return [generator(idx, settings, uuid.uuid4().hex, 5) for idx in range(50)]
+
+    template, dict_encoded = _encode_both(make_settings(), deterministic_ids, generate)
+    assert template == dict_encoded
+
+
+@pytest.mark.parametrize("payload_kind", ["random", "text", "file"])
+def test_sessions_match_dict_encoding(payload_kind, deterministic_ids, tmp_path):
+    path = tmp_path / "payload.bin"
+    # larger than the pool, so the pool is a memory map of the file
+    path.write_bytes(bytes(range(256)) * 1024)
+    settings = make_settings(
+        payload_kind=payload_kind, payload_file=str(path), session_max_attachments=4
+    )
+
+    def generate(settings):
+        return [list(generate_session(idx, settings)) for idx in range(50)]
+
+    template, dict_encoded = _encode_both(settings, deterministic_ids, generate)
+    assert template == dict_encoded
+
+
+def test_memoryview_payloads(tmp_path):
+    path = tmp_path / "payload.bin"
+    path.write_bytes(bytes(range(256)) * 64)
+    settings = make_settings(payload_kind="file", payload_file=str(path), payload_pool_size="8KB")
+    pool = settings["payload_pool"]
+    assert isinstance(pool._data, mmap.mmap)
+
+    for payload in [pool.payload() for _ in range(20)] + [memoryview(b"abc")[1:], memoryview(b"")]:
+        values = ("a" * 32, 5, "b" * 32, 3, payload)
+        packed = ATTACHMENT_CHUNK_MESSAGE.pack(*values)
+
+        assert packed == ATTACHMENT_CHUNK_MESSAGE.pack_dict(*values)
+        assert msgpack.unpackb(packed)["payload"] == bytes(payload)
+
+
+def test_static_values():
+    template = MessageTemplate([("type", "event"), "event_id", ("remote_addr", None), "payload"])
+
+    assert template.keys == ["event_id", "payload"]
+    assert msgpack.unpackb(template.pack("abc", b"x")) == {
+        "type": "event",
+        "event_id": "abc",
+        "remote_addr": None,
+        "payload": b"x",
+    }
+    assert template.pack("abc", b"x") == template.pack_dict("abc", b"x")
+
+
+def test_message_batch():
+    pool = PayloadPool(bytes(range(256)) * 16, SizeDistribution("uniform", 1, 1000))
+    batch = MessageBatch()
+    expected = []
+    for idx in range(100):
+        values = (idx, "a" * 32, 5, [], b"{}")
+        batch.add(EVENT_MESSAGE, *values)
+        expected.append(EVENT_MESSAGE.pack(*values))
+        values = ("a" * 32, 5, "b" * 32, idx, pool.payload())
+        batch.add(ATTACHMENT_CHUNK_MESSAGE, *values)
+        expected.append(ATTACHMENT_CHUNK_MESSAGE.pack(*values))
+
+    assert len(batch) == 200
+    assert [bytes(message) for message in batch.messages()] == expected
+
+    batch.clear()
+    assert len(batch) == 0 and batch.messages() == []
+
+
+@pytest.mark.parametrize(
+    "message_types, num_sessions, num_attachments, uses_payloads",
+    [
+        (["event", "user_report"], 100, 0, False),
+        (["event", "user_report"], 0, 0, False),
+        (["event", "attachment_chunk"], 100, 0, True),
+        (["event", "attachment_chunk"], 0, 0, True),
+        (["event", "user_report"], 0, 10, True),
+    ],
+)
+def test_payload_pool_only_when_used(message_types, num_sessions, num_attachments, uses_payloads):
+    settings = make_settings(
+        message_types=message_types, num_sessions=num_sessions, num_attachments=num_attachments
+    )
+    assert (settings["payload_pool"] is not None) == uses_payloads
@@ -0,0 +1,106 @@
+import random
+from collections import defaultdict
+
+import msgpack
+import pytest
+
+from messages import generate_session
+from sessions import generate_sessions, interleave
+from tests.helpers import make_settings
+
+
+@pytest.mark.parametrize("window", [1, 3, 10, 100])
+def test_interleave(window):
+    random.seed(window)
+    lengths = [random.randint(1, 10) for _ in range(50)]
+    created = []
+
+    def session_messages(session, length):
+        for i in range(length):
+            yield session, i, len(created)
+
+    def sessions():
+        for session, length in enumerate(lengths):
+            created.append(session)
+            yield session_messages(session, length)
+
+    messages = list(interleave(sessions(), window))
+
+    assert len(messages) == sum(lengths)
+    received = defaultdict(list)
+    finished = 0
+    for session, i, num_created in messages:
+        received[session].append(i)
+        if i == lengths[session] - 1:
+            finished += 1
+        # the sessions created when the message was generated, minus the finished ones
+        assert num_created - finished <= window
+    # the order within every session is kept
+    assert received == {session: list(range(length)) for session, length in enumerate(lengths)}
+
+
+def _decode_session(session):
+    return [(key, msgpack.unpackb(message)) for key, message in session]
+
+
+@pytest.mark.parametrize("partition_key", ["event", "project", "org", "none"])
+def test_session_keys(partition_key):
+    settings = make_settings(partition_key=partition_key)
+    for idx in range(50):
+        messages = _decode_session(generate_session(idx, settings))
+        keys = {key for key, _ in messages}
+
+        assert len(keys) == 1
+        if partition_key == "event":
+            assert keys == {messages[0][1]["event_id"].encode()}
+        elif partition_key == "none":
+            assert keys == {None}
+
+
+@pytest.mark.parametrize("chunk_size", ["100", "1KB", "1MB"])
+def test_session_with_event(chunk_size):
+    settings = make_settings(attachment_chunk_size=chunk_size, session_max_attachments=4)
+    for idx in range(50):
+        messages = [message for _, message in _decode_session(generate_session(idx, settings))]
+        types = [message["type"] for message in messages]
+        event_pos = types.index("event")
+
+        # the chunks, then the event, then maybe a user report
+        assert set(types[:event_pos]) <= {"attachment_chunk"}
+        assert types[event_pos + 1:] in ([], ["user_report"])
+        assert len({message["event_id"] for message in messages}) == 1
+
+        chunks = defaultdict(list)
+        for chunk in messages[:event_pos]:
+            chunks[chunk["id"]].append(chunk)
+        attachments = messages[event_pos]["attachments"]
+        assert [attachment["id"] for attachment in attachments] == list(chunks)
+        for attachment in attachments:
+            attachment_chunks = chunks[attachment["id"]]
+            assert [chunk["chunk_index"] for chunk in attachment_chunks] == list(range(attachment["chunks"]))
+            assert sum(len(chunk["payload"]) for chunk in attachment_chunks) == attachment["size"]
+
+
+def test_session_without_event():
+    settings = make_settings(message_types=["attachment_chunk", "attachment"], session_max_attachments=4)
+    for idx in range(50):
+        messages = [message for _, message in _decode_session(generate_session(idx, settings))]
+        types = [message["type"] for message in messages]
+        num_chunks = types.count("attachment_chunk")
+
+        # every attachment message follows all the chunks
+        assert types == ["attachment_chunk"] * num_chunks + ["attachment"] * (len(types) - num_chunks)
+        attachments = [message["attachment"] for message in messages[num_chunks:]]
+        assert sum(attachment["chunks"] for attachment in attachments) == num_chunks
+
+
+def test_generate_sessions():
+    settings = make_settings(num_sessions=200, session_window=20)
+    events = [
+        msgpack.unpackb(message)
+        for _, _, message in generate_sessions(settings)
+        if msgpack.unpackb(message)["type"] == "event"
+    ]
+
+    assert len(events) == 200
+    assert len({event["event_id"] for event in events}) == 200
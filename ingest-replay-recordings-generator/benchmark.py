@@ -0,0 +1,99 @@
+"""
+Micro benchmarks for the replay recording generation (no kafka involved).
+
+Usage: python benchmark.py [-n NUM_MESSAGES]
+"""
+import random
+import time
+import zlib
+from typing import Any, Callable, List, Mapping, Tuple
+
+import click
+import msgpack
+
+from recordings import (
+    RECORDINGS,
+    _get_compressed_recording,
+    _get_message_size,
+    generate_chunked_messages,
+    generate_message,
+)
+
+
+def benchmark_settings(num_messages: int) -> Mapping[str, Any]:
+    return {
+        "num_messages": num_messages,
+        "org_id": 1,
+        "project_id": 10,
+        "recording_chunk_size": 16 * 1024,
+    }
+
+
+def recompress(settings: Mapping[str, Any]):
+    """
+    Compresses the recording of every message (the generator before the compressed recordings were cached)
+    """
+    for idx in range(settings["num_messages"]):
+        message = zlib.compress(RECORDINGS[_get_message_size()])
+        msgpack.packb(
+            {
+                "type": "replay_recording_not_chunked",
+                "replay_id": "a" * 32,
+                "org_id": settings["org_id"],
+                "key_id": 123,
+                "project_id": settings["project_id"],
+                "received": int(time.time()),
+                "retention_days": 30,
+                "payload": f'{{"segment_id":{idx % 10}}}\n'.encode() + message,
+            }
+        )
+
+
+def _cached(mutate_payloads: bool) -> Callable[[Mapping[str, Any]], None]:
+    def run(settings: Mapping[str, Any]):
+        settings = {**settings, "mutate_payloads": mutate_payloads}
+        for idx in range(settings["num_messages"]):
+            msgpack.packb(generate_message("a" * 32, idx % 10, settings))
+
+    return run
+
+
+def chunked(settings: Mapping[str, Any]):
+    for idx in range(settings["num_messages"]):
+        for message in generate_chunked_messages("a" * 32, idx % 10, settings):
+            msgpack.packb(message)
+
+
+BENCHMARKS: List[Tuple[str, Callable[[Mapping[str, Any]], None]]] = [
+    ("compress every message", recompress),
+    ("cached compressed recordings", _cached(False)),
+    ("cached + mutated payloads", _cached(True)),
+    ("cached, chunked (16KB chunks)", chunked),
+]
+
+
+def _print_result(name: str, num_messages: int, elapsed: float):
+    print(f"{name:40} {num_messages / elapsed:12.0f} msgs/s")
+
+
+@click.command()
+@click.option("--num-messages", "-n", type=int, default=2000)
+def main(num_messages: int):
+    """
+    Runs the generation benchmarks and prints the msgs/s for each of them
+    """
+    settings = benchmark_settings(num_messages)
+    # the cached recordings are compressed once, at startup
+    for name in RECORDINGS:
+        _get_compressed_recording(name)
+
+    for name, run in BENCHMARKS:
+        # the same recording sizes for every benchmark
+        random.seed(0)
+        start = time.perf_counter()
+        run(settings)
+        _print_result(name, num_messages, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+zlib compressed recordings, built in a streaming fashion.
+
+A recording is a JSON array of rrweb events. RecordingBuilder compresses the events as they are added (only
+the compressed data is kept) into a raw deflate stream, sync flushed so more data can be appended later
+without recompressing anything. A CompressedRecording assembles the zlib stream (header, deflate data,
+adler32 checksum of the uncompressed data) from it, optionally with an extra event appended.
+"""
+import zlib
+from typing import List, Tuple
+
+# the zlib stream header (deflate, 32K window, default compression level)
+ZLIB_HEADER = b"\x78\x9c"
+
+
+def _deflate_tail(tail: bytes) -> bytes:
+    """
+    The final deflate block(s) of a recording, appended to the sync flushed events
+    """
+    compressor = zlib.compressobj(zlib.Z_BEST_SPEED, wbits=-zlib.MAX_WBITS)
+    return compressor.compress(tail) + compressor.flush()
+
+
+# the size of the zlib stream of a recording minus its events: header, closing bracket and checksum
+RECORDING_OVERHEAD = len(ZLIB_HEADER) + len(_deflate_tail(b"]")) + 4
+
+
+class CompressedRecording:
+    """
+    A compressed recording, mutated returns the recording with an extra custom event (carrying a nonce)
+    appended: only the extra event is compressed and the checksum is extended with it.
+    """
+
+    def __init__(self, events: bytes, checksum: int, empty: bool):
+        # events: the sync flushed raw deflate data of the recording without its closing bracket
+        self._events = events
+        self._checksum = checksum
+        self._separator = b"" if empty else b","
+        self.compressed = self._with_tail(b"]")
+
+    @classmethod
+    def from_recording(cls, recording: bytes) -> "CompressedRecording":
+        assert recording.startswith(b"[") and recording.endswith(b"]")
+        builder = RecordingBuilder()
+        if len(recording) > 2:
+            builder.add_event(recording[1:-1])
+        return builder.finish()
+
+    def __len__(self) -> int:
+        return len(self.compressed)
+
+    def mutated(self, nonce: int, timestamp_ms: int) -> bytes:
+        return b"".join(self.mutated_parts(nonce, timestamp_ms))
+
+    def mutated_parts(self, nonce: int, timestamp_ms: int) -> Tuple[bytes, ...]:
+        """
+        The parts of the mutated recording, without joining them (the events are shared with the recording)
+        """
+        event = b'%s{"type":5,"timestamp":%d,"data":{"tag":"generator","payload":{"nonce":%d}}}]' % (
+            self._separator,
+            timestamp_ms,
+            nonce,
+        )
+        return self._parts_with_tail(event)
+
+    def _with_tail(self, tail: bytes) -> bytes:
+        return b"".join(self._parts_with_tail(tail))
+
+    def _parts_with_tail(self, tail: bytes) -> Tuple[bytes, ...]:
+        checksum = zlib.adler32(tail, self._checksum).to_bytes(4, "big")
+        return ZLIB_HEADER, self._events, _deflate_tail(tail), checksum
+
+
+class RecordingBuilder:
+    """
+    Compresses the events of a recording as they are added
+    """
+
+    def __init__(self, level: int = zlib.Z_DEFAULT_COMPRESSION):
+        self._compressor = zlib.compressobj(level, wbits=-zlib.MAX_WBITS)
+        self._parts: List[bytes] = []
+        self._compressed_size = 0
+        self._checksum = zlib.adler32(b"")
+        self._empty = True
+        self._add(b"[")
+
+    def _add(self, data: bytes):
+        self._checksum = zlib.adler32(data, self._checksum)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._parts.append(compressed)
+            self._compressed_size += len(compressed)
+
+    def add_event(self, event: bytes):
+        """
+        Adds an event (or several comma separated events) serialized as JSON
+        """
+        if not self._empty:
+            self._add(b",")
+        self._add(event)
+        self._empty = False
+
+    def flush(self) -> int:
+        """
+        Flushes the pending data, returns the size the compressed recording would have if finished now
+        """
+        compressed = self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._parts.append(compressed)
+        self._compressed_size += len(compressed)
+        return self._compressed_size + RECORDING_OVERHEAD
+
+    def finish(self) -> CompressedRecording:
+        self.flush()
+        return CompressedRecording(b"".join(self._parts), self._checksum, self._empty)
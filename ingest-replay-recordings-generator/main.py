@@ -1,12 +1,21 @@
 import msgpack
+import time
 from typing import Optional
 
 import click
 from confluent_kafka import Producer
 from yaml import load, Loader
 
-from recordings import generate_message
+from recordings import RECORDING_MODES, RECORDING_SOURCES, generate_messages
+from sessions import SEGMENT_DISTRIBUTIONS, replay_segments
+from rrweb import SIZE_DISTRIBUTIONS, get_synthetic_recordings
+from util import parse_size
 from readme_generator import generate_readme
+from kafka_profiles import PROFILES, get_kafka_config
+from partitioning import check_partitioning, encode_key, get_hot_partition_router
+
+# the supported kafka message keys (see get_message_key)
+PARTITION_KEYS = ["replay", "project", "org", "none"]
 
 
 @click.command()
@@ -16,6 +25,40 @@ from readme_generator import generate_readme
     default="",
     help="The number of messages to send to the kafka queue",
 )
+@click.option(
+    "--concurrent-replays",
+    type=int,
+    help="The number of replays in flight, their segments are interleaved (default: 1000)",
+)
+@click.option(
+    "--segments-distribution",
+    type=click.Choice(SEGMENT_DISTRIBUTIONS),
+    help="The distribution of the number of segments per replay: fixed (segments_max), uniform (between segments_min and segments_max) or geometric (mean segments_mean) (default: geometric)",
+)
+@click.option(
+    "--recording-source",
+    type=click.Choice(RECORDING_SOURCES),
+    help="The recordings sent: the 4 captured recordings or synthetic rrweb recordings with the configured compressed sizes (default: captured)",
+)
+@click.option(
+    "--recording-size-distribution",
+    type=click.Choice(SIZE_DISTRIBUTIONS),
+    help="The distribution of the compressed size of the synthetic recordings between recording_size_min and recording_size_max (default: lognormal)",
+)
+@click.option(
+    "--recording-mode",
+    type=click.Choice(RECORDING_MODES),
+    help="not_chunked: a message per recording, chunked: the recording split in chunk messages followed by a recording message (default: not_chunked)",
+)
+@click.option(
+    "--chunk-size",
+    help="The maximum size of the recording chunks in chunked mode (e.g. 100KB, 1MB) (default: 512KB)",
+)
+@click.option(
+    "--mutate-payloads/--no-mutate-payloads",
+    default=None,
+    help="Append an event with a random nonce to every recording so no two payloads are identical (default: no)",
+)
 @click.option(
     "--settings-file", "-f", default=None, help="The settings file name (json or yaml)"
 )
@@ -30,6 +73,26 @@ from readme_generator import generate_readme
 )
 @click.option("--org", "-o", type=int, help="organisation id")
 @click.option("--project", "-p", type=int, help="project id")
+@click.option(
+    "--kafka-profile",
+    type=click.Choice(list(PROFILES)),
+    help="Producer tuning profile (batching, linger, compression and queue sizes), explicit [kafka] settings override it (default: default)",
+)
+@click.option(
+    "--partition-key",
+    type=click.Choice(PARTITION_KEYS),
+    help="Kafka message key of the generated messages: the replay id, the project id, the org id or none (default: replay)",
+)
+@click.option(
+    "--hot-partition-fraction",
+    type=float,
+    help="Fraction of the messages sent to a single partition (--hot-partition) instead of the partition of their key (default: 0)",
+)
+@click.option(
+    "--hot-partition",
+    type=int,
+    help="The partition receiving the --hot-partition-fraction messages (default: 0)",
+)
 @click.option("--dry-run", is_flag=True, help="if set only prints the settings")
 @click.option("--update-docs", is_flag=True,  help="creates a README.md  documentation file")
 def main(**kwargs):
@@ -45,11 +108,20 @@ def main(**kwargs):
     print("Settings:")
     print(settings)
 
+    print("Kafka producer config:")
+    print(settings["kafka_config"])
+
     if kwargs["dry_run"]:
         return
 
     producer = get_kafka_producer(settings)
 
+    if settings["recording_source"] == "synthetic":
+        print("Generating synthetic recordings...", flush=True)
+        settings["synthetic_recordings_pool"] = get_synthetic_recordings(
+            settings, int(time.time() * 1000)
+        )
+
     print("Sending data...", flush=True)
     send_replay_recordings(producer, settings)
 
@@ -58,37 +130,93 @@ def main(**kwargs):
 
 def send_replay_recordings(producer, settings):
     topic_name = settings["topic_name"]
+    router = get_hot_partition_router(settings)
+    partition = None
     for recording in generate_replay_recordings(settings):
-        producer.produce(topic_name, msgpack.packb(recording))
+        # the chunks of a recording and its recording message go to the same partition
+        if partition is None:
+            partition = router.partition()
+        producer.produce(
+            topic_name,
+            msgpack.packb(recording),
+            key=get_message_key(settings, recording),
+            partition=partition,
+        )
         producer.poll(0)
+        if recording["type"] != "replay_recording_chunk":
+            partition = None
     producer.flush()
 
 
+def get_message_key(settings, recording) -> Optional[bytes]:
+    """
+    The kafka key of a recording (settings["partition_key"]: replay, project, org or none)
+    """
+    partition_key = settings["partition_key"]
+    if partition_key == "replay":
+        return encode_key(recording["replay_id"])
+    if partition_key == "project":
+        return encode_key(recording["project_id"])
+    if partition_key == "org":
+        # the chunk messages have no org_id
+        return encode_key(settings["org_id"])
+    return None
+
+
 def generate_replay_recordings(settings):
-    num_messages = settings["num_messages"]
-    for i in range(num_messages):
-        yield generate_message(
-            replay_id=str(i),
-            segment_id=1,
+    for replay_id, segment_id in replay_segments(settings):
+        yield from generate_messages(
+            replay_id=replay_id,
+            segment_id=segment_id,
             settings=settings
         )
 
 
 def get_settings(
     num_messages: Optional[str],
+    concurrent_replays: Optional[int],
+    segments_distribution: Optional[str],
+    mutate_payloads: Optional[bool],
+    recording_source: Optional[str],
+    recording_size_distribution: Optional[str],
+    recording_mode: Optional[str],
+    chunk_size: Optional[str],
     settings_file: Optional[str],
     topic_name: Optional[str],
     broker: Optional[str],
     org: Optional[int],
     project: Optional[int],
+    kafka_profile: Optional[str],
+    partition_key: Optional[str],
+    hot_partition_fraction: Optional[float],
+    hot_partition: Optional[int],
     dry_run: bool,
     **kwargs,
 ):
     # default settings
     settings = {
         "num_messages": 100,
+        "concurrent_replays": 1000,
+        "segments_distribution": "geometric",
+        "segments_min": 1,
+        "segments_max": 720,
+        "segments_mean": 10,
+        "mutate_payloads": False,
+        "recording_source": "captured",
+        "recording_size_distribution": "lognormal",
+        "recording_size_min": "1KB",
+        "recording_size_max": "4MB",
+        "recording_text_randomness": 0.2,
+        "synthetic_recordings": 32,
+        "recording_mode": "not_chunked",
+        # kept well under the default kafka message.max.bytes (1000000)
+        "recording_chunk_size": "512KB",
         "topic_name": "ingest-replay-recordings",
         "kafka": {},
+        "kafka_profile": "default",
+        "partition_key": "replay",
+        "hot_partition_fraction": 0.0,
+        "hot_partition": 0,
         "metric_types": {},
     }
 
@@ -111,6 +239,35 @@ def get_settings(
     if project is not None:
         settings["project_id"] = [project]
 
+    if kafka_profile is not None:
+        settings["kafka_profile"] = kafka_profile
+
+    if settings["kafka_profile"] not in PROFILES:
+        raise click.UsageError(
+            f"Invalid 'kafka_profile': should be one of {', '.join(PROFILES)}"
+        )
+
+    for name, value in (
+        ("partition_key", partition_key),
+        ("hot_partition_fraction", hot_partition_fraction),
+        ("hot_partition", hot_partition),
+    ):
+        if value is not None:
+            settings[name] = value
+
+    if settings["partition_key"] not in PARTITION_KEYS:
+        raise click.UsageError(
+            f"Invalid 'partition_key': should be one of {', '.join(PARTITION_KEYS)}"
+        )
+
+    error = check_partitioning(settings)
+    if error is not None:
+        raise click.UsageError(error)
+
+    settings["kafka_config"] = get_kafka_config(
+        settings["kafka_profile"], settings["kafka"]
+    )
+
     if settings["kafka"].get("bootstrap.servers") is None:
         raise click.UsageError(
             f"Kafka broker was not specified, to specify either use --broker argument or set [kafka][bootstrap.servers] in the settings file"
@@ -134,11 +291,107 @@ def get_settings(
         except ValueError:
             pass  # ignore non integer command line args
 
+    _calculate_sessions(settings, concurrent_replays, segments_distribution)
+
+    if mutate_payloads is not None:
+        settings["mutate_payloads"] = mutate_payloads
+
+    _calculate_recordings(settings, recording_source, recording_size_distribution)
+
+    _calculate_recording_mode(settings, recording_mode, chunk_size)
+
     settings["dry_run"] = dry_run
 
     return settings
 
 
+def _calculate_recording_mode(settings, recording_mode: Optional[str], chunk_size: Optional[str]):
+    if recording_mode is not None:
+        settings["recording_mode"] = recording_mode
+
+    if chunk_size is not None:
+        settings["recording_chunk_size"] = chunk_size
+
+    if settings["recording_mode"] not in RECORDING_MODES:
+        raise click.UsageError(
+            f"Invalid 'recording_mode': should be one of {', '.join(RECORDING_MODES)}"
+        )
+
+    size = parse_size(settings["recording_chunk_size"])
+    if size is None or size <= 0:
+        raise click.UsageError(
+            f"Invalid 'recording_chunk_size': {settings['recording_chunk_size']} should be a positive size (e.g. 100KB, 1MB)"
+        )
+    settings["recording_chunk_size"] = size
+
+
+def _calculate_recordings(
+    settings, recording_source: Optional[str], recording_size_distribution: Optional[str]
+):
+    if recording_source is not None:
+        settings["recording_source"] = recording_source
+
+    if recording_size_distribution is not None:
+        settings["recording_size_distribution"] = recording_size_distribution
+
+    if settings["recording_source"] not in RECORDING_SOURCES:
+        raise click.UsageError(
+            f"Invalid 'recording_source': should be one of {', '.join(RECORDING_SOURCES)}"
+        )
+
+    if settings["recording_size_distribution"] not in SIZE_DISTRIBUTIONS:
+        raise click.UsageError(
+            f"Invalid 'recording_size_distribution': should be one of {', '.join(SIZE_DISTRIBUTIONS)}"
+        )
+
+    for name in ("recording_size_min", "recording_size_max"):
+        size = parse_size(settings[name])
+        if size is None or size <= 0:
+            raise click.UsageError(
+                f"Invalid '{name}': {settings[name]} should be a positive size (e.g. 1000, 10KB, 2MB)"
+            )
+        settings[name] = size
+
+    if settings["recording_size_min"] > settings["recording_size_max"]:
+        raise click.UsageError(
+            "Invalid recording sizes: 'recording_size_min' is larger than 'recording_size_max'"
+        )
+
+    if not 0 <= settings["recording_text_randomness"] <= 1:
+        raise click.UsageError("Invalid 'recording_text_randomness': should be between 0 and 1")
+
+    if settings["synthetic_recordings"] < 1:
+        raise click.UsageError("Invalid 'synthetic_recordings': should be at least 1")
+
+
+def _calculate_sessions(
+    settings, concurrent_replays: Optional[int], segments_distribution: Optional[str]
+):
+    if concurrent_replays is not None:
+        settings["concurrent_replays"] = concurrent_replays
+
+    if segments_distribution is not None:
+        settings["segments_distribution"] = segments_distribution
+
+    if settings["concurrent_replays"] < 1:
+        raise click.UsageError("Invalid 'concurrent_replays': should be at least 1")
+
+    if settings["segments_distribution"] not in SEGMENT_DISTRIBUTIONS:
+        raise click.UsageError(
+            f"Invalid 'segments_distribution': should be one of {', '.join(SEGMENT_DISTRIBUTIONS)}"
+        )
+
+    if not 1 <= settings["segments_min"] <= settings["segments_max"]:
+        raise click.UsageError(
+            "Invalid segment counts: should be 1 <= 'segments_min' <= 'segments_max'"
+        )
+
+    if not settings["segments_min"] <= settings["segments_mean"] <= settings["segments_max"]:
+        raise click.UsageError(
+            "Invalid 'segments_mean': should be between 'segments_min' and 'segments_max'"
+        )
+
+
 def get_fake_kafka_producer(settings):
     """
     A fake producer that just dumps to console (for testing)
@@ -148,7 +401,7 @@ def get_fake_kafka_producer(settings):
         def __init__(self, settings):
             pass
 
-        def produce(self, topic_name, message):
+        def produce(self, topic_name, message, key=None, partition=-1):
             print(message)
 
         def flush(self):
@@ -161,11 +414,12 @@ def get_kafka_producer(settings):
     """
     Returns a kafka producer configured with the
     settings found in the settings["kafka"] sub-object
+    on top of the settings["kafka_profile"] tuning profile
 
     At a minimum the settings should contain:
         bootstrap.server: host-name:port-number
     """
-    kafka_settings = settings["kafka"]
+    kafka_settings = settings["kafka_config"]
     return Producer(kafka_settings)
 
 
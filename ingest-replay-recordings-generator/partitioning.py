@@ -0,0 +1,83 @@
+"""
+Kafka message keys and hot partition routing.
+
+The same file is used by all the ingest-*-generator tools, keep the copies in sync.
+
+Messages are keyed by one of their ids (settings["partition_key"], every generator supports a subset of
+PARTITION_KEYS) so the librdkafka partitioner sends all the messages with the same id to the same partition,
+the way Relay produces them. On top of that a fraction of the messages (settings["hot_partition_fraction"])
+can be pinned to a single partition (settings["hot_partition"]) to load the consumers with a skewed topic.
+"""
+from typing import Any, Mapping, Optional
+
+PARTITION_KEYS = ["org", "project", "replay", "event", "none"]
+
+# the partition argument of Producer.produce that lets the partitioner pick the partition from the key
+UNASSIGNED_PARTITION = -1
+
+
+def encode_key(value: Any) -> Optional[bytes]:
+    """
+    The kafka key of an id (None for no key)
+
+    >>> encode_key(42)
+    b'42'
+    >>> encode_key("0c6f2e0a") == b"0c6f2e0a"
+    True
+    >>> encode_key(None) is None
+    True
+    """
+    if value is None or isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class HotPartitionRouter:
+    """
+    Picks the partition of every message: hot_fraction of the messages (evenly spread) go to hot_partition,
+    the others are left to the partitioner
+
+    >>> router = HotPartitionRouter(0.25, 3)
+    >>> [router.partition() for _ in range(8)]
+    [-1, -1, -1, 3, -1, -1, -1, 3]
+    >>> router.hot_messages
+    2
+    """
+
+    def __init__(self, hot_fraction: float = 0.0, hot_partition: int = 0):
+        assert 0.0 <= hot_fraction <= 1.0
+        assert hot_partition >= 0
+        self.hot_fraction = hot_fraction
+        self.hot_partition = hot_partition
+        self.hot_messages = 0
+        self._credit = 0.0
+
+    def partition(self) -> int:
+        if self.hot_fraction == 0.0:
+            return UNASSIGNED_PARTITION
+        # deterministic, the fraction of hot messages is exact over any long enough run
+        self._credit += self.hot_fraction
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            self.hot_messages += 1
+            return self.hot_partition
+        return UNASSIGNED_PARTITION
+
+
+def get_hot_partition_router(settings: Mapping[str, Any]) -> HotPartitionRouter:
+    return HotPartitionRouter(
+        settings.get("hot_partition_fraction", 0.0), settings.get("hot_partition", 0)
+    )
+
+
+def check_partitioning(settings: Mapping[str, Any]) -> Optional[str]:
+    """
+    Returns the error message of invalid hot partition settings (None if they are valid)
+    """
+    fraction = settings.get("hot_partition_fraction", 0.0)
+    if not isinstance(fraction, (int, float)) or not 0.0 <= fraction <= 1.0:
+        return f"Invalid 'hot_partition_fraction': {fraction} should be between 0 and 1"
+    partition = settings.get("hot_partition", 0)
+    if not isinstance(partition, int) or partition < 0:
+        return f"Invalid 'hot_partition': {partition} should be a partition number (0 or more)"
+    return None
@@ -1,31 +1,122 @@
-from typing import Mapping, Any
-import zlib
+import functools
+from typing import Iterator, Mapping, Any, Sequence, Tuple
 import random
 import time
+import uuid
 
+from compression import CompressedRecording
 from message_types import XSMALL_MESSAGE, SMALL_MESSAGE, MEDIUM_MESSAGE, LARGE_MESSAGE
 
-def _get_message_size():
+# captured: one of RECORDINGS, synthetic: one of the synthetic recordings generated at startup (see rrweb.py)
+RECORDING_SOURCES = ["captured", "synthetic"]
+
+# not_chunked: a replay_recording_not_chunked message per recording
+# chunked: the recording split in replay_recording_chunk messages followed by a replay_recording message
+RECORDING_MODES = ["not_chunked", "chunked"]
+
+RECORDINGS = {
+    # 236 bytes compressed
+    "xsmall": XSMALL_MESSAGE,
+    # 2KB compressed
+    "small": SMALL_MESSAGE,
+    # 25KB compressed
+    "medium": MEDIUM_MESSAGE,
+    # 162KB compressed
+    "large": LARGE_MESSAGE,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_compressed_recording(name: str) -> CompressedRecording:
+    return CompressedRecording.from_recording(RECORDINGS[name])
+
+
+# the payloads of the captured recordings (prefix included) are cached for the first segments of the replays
+CACHED_PAYLOAD_SEGMENTS = 32
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_segment_prefix(segment_id: int) -> bytes:
+    return f'{{"segment_id":{segment_id}}}\n'.encode()
+
+
+@functools.lru_cache(maxsize=len(RECORDINGS) * CACHED_PAYLOAD_SEGMENTS)
+def _get_cached_payload(name: str, segment_id: int) -> bytes:
+    return _get_segment_prefix(segment_id) + _get_compressed_recording(name).compressed
+
+
+def _get_message_size() -> str:
     n = random.randint(0, 100)
     if n < 50:
-        # 236 bytes compressed
-        return XSMALL_MESSAGE
+        return "xsmall"
     if n < 80:
-        # 2KB compressed
-        return SMALL_MESSAGE
+        return "small"
     if n < 95:
-        # 25KB compressed
-        return MEDIUM_MESSAGE
-    if n <= 100:
-        # 162KB compressed
-        return LARGE_MESSAGE
+        return "medium"
+    return "large"
+
+
+def _get_payload_parts(segment_id: int, settings: Mapping[str, Any]) -> Tuple[bytes, ...]:
+    """
+    The parts of a payload (the segment prefix and the compressed recording), the recordings are only
+    referenced, joining the parts is left to the caller
+    """
+    synthetic_recordings = settings.get("synthetic_recordings_pool")
+    if synthetic_recordings:
+        name = None
+        recording = random.choice(synthetic_recordings)
+    else:
+        name = _get_message_size()
+        recording = _get_compressed_recording(name)
+
+    prefix = _get_segment_prefix(segment_id)
+    if settings.get("mutate_payloads"):
+        return (prefix, *recording.mutated_parts(random.getrandbits(63), int(time.time() * 1000)))
+    if name is not None and segment_id < CACHED_PAYLOAD_SEGMENTS:
+        return (_get_cached_payload(name, segment_id),)
+    return prefix, recording.compressed
+
+
+def _get_payload(segment_id: int, settings: Mapping[str, Any]) -> bytes:
+    parts = _get_payload_parts(segment_id, settings)
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(parts)
+
+
+def _chunk_parts(parts: Sequence[bytes], chunk_size: int) -> Iterator[memoryview]:
+    """
+    Splits the concatenation of parts in chunk_size slices: views of the parts, only the chunks spanning
+    several parts are copied
+    """
+    pieces = []
+    size = 0
+    for part in parts:
+        view = memoryview(part)
+        while len(view) > 0:
+            piece = view[:chunk_size - size]
+            view = view[len(piece):]
+            pieces.append(piece)
+            size += len(piece)
+            if size == chunk_size:
+                yield _join_pieces(pieces)
+                pieces = []
+                size = 0
+    if pieces:
+        yield _join_pieces(pieces)
+
+
+def _join_pieces(pieces: Sequence[memoryview]) -> memoryview:
+    if len(pieces) == 1:
+        return pieces[0]
+    return memoryview(b"".join(pieces))
+
 
 def generate_message(
     replay_id: str,
     segment_id: int,
     settings: Mapping[str, Any]
 ):
-    message = zlib.compress(_get_message_size())
     return {
         "type": "replay_recording_not_chunked",
         "replay_id": replay_id,
@@ -34,5 +125,55 @@ def generate_message(
         "project_id": settings["project_id"],
         "received": int(time.time()),
         "retention_days": 30,
-        "payload": f'{{"segment_id":{segment_id}}}\n'.encode() + message,
+        "payload": _get_payload(segment_id, settings),
+    }
+
+
+def generate_messages(
+    replay_id: str,
+    segment_id: int,
+    settings: Mapping[str, Any]
+) -> Iterator[Mapping[str, Any]]:
+    """
+    Generates the message(s) of a recording segment, according to settings["recording_mode"]
+    """
+    if settings["recording_mode"] == "chunked":
+        yield from generate_chunked_messages(replay_id, segment_id, settings)
+    else:
+        yield generate_message(replay_id, segment_id, settings)
+
+
+def generate_chunked_messages(
+    replay_id: str,
+    segment_id: int,
+    settings: Mapping[str, Any]
+) -> Iterator[Mapping[str, Any]]:
+    """
+    Generates the chunks of a recording (recording_chunk_size slices of the payload, memoryviews of the
+    cached recordings so the payload isn't copied) followed by the recording message referencing them
+    """
+    parts = _get_payload_parts(segment_id, settings)
+    recording_id = uuid.uuid4().hex
+
+    num_chunks = 0
+    for chunk_index, chunk in enumerate(_chunk_parts(parts, settings["recording_chunk_size"])):
+        num_chunks += 1
+        yield {
+            "type": "replay_recording_chunk",
+            "replay_id": replay_id,
+            "project_id": settings["project_id"],
+            "id": recording_id,
+            "chunk_index": chunk_index,
+            "payload": chunk,
+        }
+
+    yield {
+        "type": "replay_recording",
+        "replay_id": replay_id,
+        "replay_recording": {"chunks": num_chunks, "id": recording_id},
+        "org_id": settings["org_id"],
+        "key_id": 123,
+        "project_id": settings["project_id"],
+        "received": int(time.time()),
+        "retention_days": 30,
     }
@@ -0,0 +1,220 @@
+"""
+Synthetic rrweb recordings of a target compressed size.
+
+The recordings contain the events the rrweb recorder emits:
+    a meta event (type 4) and a full DOM snapshot (type 2) at the start of the recording
+    mouse moves (type 3, source 1): batches of pointer positions
+    DOM mutations (type 3, source 0): added nodes, text and attribute changes
+    occasionally a new meta event and full snapshot (a navigation)
+
+The events are compressed as they are generated (see compression.RecordingBuilder), only the compressed
+recording is held in memory. The compressed size is checked with sync flushes and the amount of events
+generated before the next check is derived from the compression ratio observed so far, so the recording
+ends up at or above the target size by at most a few hundred bytes.
+
+The compression ratio is controlled by text_randomness: the fraction of the texts (text nodes, mutated
+texts, attribute values) made of random characters instead of words from a small vocabulary.
+"""
+import math
+import random
+import string
+from typing import Any, List, Mapping
+
+from compression import CompressedRecording, RecordingBuilder
+
+SIZE_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+# relative frequency of the incremental events
+EVENT_WEIGHTS = {"mouse_move": 60, "mutation": 38, "navigation": 2}
+
+# the size of the full snapshots (in nodes), the first snapshot of small recordings is smaller
+MAX_SNAPSHOT_NODES = 400
+
+# navigations (a full snapshot, ~50KB of JSON) only happen while more than this many uncompressed bytes
+# are left to generate
+NAVIGATION_BUDGET = 500_000
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog sentry issue replay performance monitoring dashboard settings "
+    "project organization team member alert release environment transaction error stack trace button "
+    "search filter table column row value loading details overview summary next previous page"
+).split()
+RANDOM_CHARACTERS = string.ascii_letters + string.digits
+TAG_NAMES = ["div", "span", "p", "a", "li", "button", "td", "section"]
+
+
+class SizeDistribution:
+    def __init__(self, distribution: str, min_size: int, max_size: int):
+        assert distribution in SIZE_DISTRIBUTIONS
+        assert 0 < min_size <= max_size
+        self.distribution = distribution
+        self.min_size = min_size
+        self.max_size = max_size
+        # lognormal: the median is the geometric mean of min and max, which are 2 sigmas away
+        self._mu = (math.log(min_size) + math.log(max_size)) / 2
+        self._sigma = (math.log(max_size) - math.log(min_size)) / 4
+
+    def sample(self) -> int:
+        if self.distribution == "fixed":
+            return self.max_size
+        if self.distribution == "uniform":
+            return random.randint(self.min_size, self.max_size)
+        size = int(random.lognormvariate(self._mu, self._sigma))
+        return min(max(size, self.min_size), self.max_size)
+
+
+class EventGenerator:
+    """
+    Generates the JSON of rrweb events with increasing timestamps and node ids
+    """
+
+    def __init__(self, text_randomness: float, timestamp_ms: int):
+        self.text_randomness = text_randomness
+        self.timestamp_ms = timestamp_ms
+        self.next_node_id = 1
+        self._event_types = list(EVENT_WEIGHTS)
+        self._event_weights = list(EVENT_WEIGHTS.values())
+
+    def _text(self, num_words: int) -> str:
+        if random.random() < self.text_randomness:
+            return "".join(random.choices(RANDOM_CHARACTERS, k=num_words * 6))
+        return " ".join(random.choices(WORDS, k=num_words))
+
+    def _node_id(self) -> int:
+        node_id = self.next_node_id
+        self.next_node_id += 1
+        return node_id
+
+    def _tick(self, max_ms: int) -> int:
+        self.timestamp_ms += random.randint(1, max_ms)
+        return self.timestamp_ms
+
+    def _element(self, num_children: int) -> str:
+        node_id = self._node_id()
+        text_id = self._node_id()
+        children = [
+            f'{{"type":3,"textContent":"{self._text(random.randint(1, 8))}","id":{text_id}}}'
+        ]
+        children += [self._element(0) for _ in range(num_children)]
+        return (
+            f'{{"type":2,"tagName":"{random.choice(TAG_NAMES)}",'
+            f'"attributes":{{"class":"{self._text(1)}"}},'
+            f'"childNodes":[{",".join(children)}],"id":{node_id}}}'
+        )
+
+    def meta(self) -> str:
+        return (
+            f'{{"type":4,"data":{{"href":"https://example.com/{self._text(1)}","width":1728,"height":1000}},'
+            f'"timestamp":{self._tick(10)}}}'
+        )
+
+    def full_snapshot(self, num_nodes: int) -> str:
+        document_id = self._node_id()
+        html_id = self._node_id()
+        body_id = self._node_id()
+        # sections of up to 4 elements
+        elements = [self._element(min(3, num_nodes - n - 1)) for n in range(0, num_nodes, 4)]
+        return (
+            f'{{"type":2,"data":{{"node":{{"type":0,"childNodes":[{{"type":2,"tagName":"html",'
+            f'"attributes":{{}},"childNodes":[{{"type":2,"tagName":"body","attributes":{{}},'
+            f'"childNodes":[{",".join(elements)}],"id":{body_id}}}],"id":{html_id}}}],'
+            f'"id":{document_id}}},"initialOffset":{{"left":0,"top":0}}}},'
+            f'"timestamp":{self._tick(10)}}}'
+        )
+
+    def mouse_move(self) -> str:
+        positions = []
+        time_offset = 0
+        x, y = random.randint(0, 1728), random.randint(0, 1000)
+        for _ in range(random.randint(1, 10)):
+            x = min(max(x + random.randint(-40, 40), 0), 1728)
+            y = min(max(y + random.randint(-40, 40), 0), 1000)
+            positions.append(
+                f'{{"x":{x},"y":{y},"id":{random.randint(1, self.next_node_id)},"timeOffset":{time_offset}}}'
+            )
+            time_offset -= random.randint(10, 50)
+        return (
+            f'{{"type":3,"data":{{"source":1,"positions":[{",".join(positions)}]}},'
+            f'"timestamp":{self._tick(500)}}}'
+        )
+
+    def mutation(self) -> str:
+        existing_id = random.randint(1, self.next_node_id)
+        adds = [
+            f'{{"parentId":{existing_id},"nextId":null,"node":{self._element(random.randint(0, 2))}}}'
+            for _ in range(random.randint(0, 2))
+        ]
+        texts = [
+            f'{{"id":{random.randint(1, self.next_node_id)},"value":"{self._text(random.randint(1, 6))}"}}'
+            for _ in range(random.randint(0, 3))
+        ]
+        attributes = [
+            f'{{"id":{random.randint(1, self.next_node_id)},"attributes":{{"class":"{self._text(1)}"}}}}'
+            for _ in range(random.randint(0, 2))
+        ]
+        return (
+            f'{{"type":3,"data":{{"source":0,"texts":[{",".join(texts)}],'
+            f'"attributes":[{",".join(attributes)}],"removes":[],"adds":[{",".join(adds)}]}},'
+            f'"timestamp":{self._tick(1000)}}}'
+        )
+
+    def next_event(self, allow_navigation: bool = True) -> str:
+        event_type = random.choices(self._event_types, self._event_weights)[0]
+        if event_type == "navigation" and not allow_navigation:
+            event_type = "mutation"
+        if event_type == "mouse_move":
+            return self.mouse_move()
+        if event_type == "mutation":
+            return self.mutation()
+        return self.meta() + "," + self.full_snapshot(MAX_SNAPSHOT_NODES)
+
+
+def synthetic_recording(
+    target_size: int, text_randomness: float, timestamp_ms: int
+) -> CompressedRecording:
+    """
+    A synthetic recording whose compressed size is target_size or a few hundred bytes more
+    """
+    events = EventGenerator(text_randomness, timestamp_ms)
+    builder = RecordingBuilder()
+
+    builder.add_event(events.meta().encode())
+    # ~100 compressed bytes per snapshot node, so that small recordings still have some incremental events
+    num_nodes = min(max(1, target_size // 400), MAX_SNAPSHOT_NODES)
+    builder.add_event(events.full_snapshot(num_nodes).encode())
+    size = builder.flush()
+
+    # uncompressed bytes per compressed byte, updated after every flush
+    ratio = 4.0
+    while size < target_size:
+        # aim at half the remaining gap, so that a batch compressing worse than the previous ones (e.g. more
+        # random texts) doesn't overshoot the target
+        budget = max(64, int((target_size - size) * ratio * 0.5))
+        # a navigation (full snapshot) would overshoot small budgets
+        allow_navigation = budget > NAVIGATION_BUDGET
+        added = 0
+        while added < budget:
+            event = events.next_event(allow_navigation).encode()
+            builder.add_event(event)
+            added += len(event) + 1
+        new_size = builder.flush()
+        if new_size > size:
+            ratio = added / (new_size - size)
+        size = new_size
+
+    return builder.finish()
+
+
+def get_synthetic_recordings(settings: Mapping[str, Any], timestamp_ms: int) -> List[CompressedRecording]:
+    """
+    Generates settings["synthetic_recordings"] recordings with sizes drawn from the recording size distribution
+    """
+    sizes = SizeDistribution(
+        settings["recording_size_distribution"],
+        settings["recording_size_min"],
+        settings["recording_size_max"],
+    )
+    return [
+        synthetic_recording(sizes.sample(), settings["recording_text_randomness"], timestamp_ms)
+        for _ in range(settings["synthetic_recordings"])
+    ]
@@ -0,0 +1,107 @@
+"""
+Replay sessions: the (replay id, segment id) sequence of the generated recordings.
+
+Every replay sends a number of segments (0, 1, 2 ...) drawn from a configurable distribution:
+    fixed: always segments_max
+    uniform: uniformly distributed between segments_min and segments_max
+    geometric: mostly short replays (mean segments_mean) with a long tail, capped at segments_max
+
+concurrent_replays replays are in flight at any time, every recording is the next segment of a random in
+flight replay (so every replay sends a segment every ~concurrent_replays messages, like concurrent browser
+sessions sending a segment every few seconds), a new replay starts whenever one ends.
+
+The state of an in flight replay is three integers in compact arrays and the replay ids are derived from the
+replay number, so millions of concurrent replays only take a few tens of MB.
+"""
+import hashlib
+import math
+import random
+import uuid
+from array import array
+from typing import Any, Iterator, Mapping, Tuple
+
+SEGMENT_DISTRIBUTIONS = ["fixed", "uniform", "geometric"]
+
+
+class SegmentCounts:
+    """
+    Draws the number of segments of a replay
+    """
+
+    def __init__(self, distribution: str, min_segments: int, max_segments: int, mean_segments: float):
+        assert distribution in SEGMENT_DISTRIBUTIONS
+        assert 1 <= min_segments <= max_segments
+        self.distribution = distribution
+        self.min_segments = min_segments
+        self.max_segments = max_segments
+        # geometric: min_segments plus the number of failures before a success with probability p
+        # (mean (1 - p) / p), p is chosen to get mean_segments
+        self._log_q = None
+        if mean_segments > min_segments:
+            self._log_q = math.log(1.0 - 1.0 / (mean_segments - min_segments + 1))
+
+    def sample(self) -> int:
+        if self.distribution == "fixed":
+            return self.max_segments
+        if self.distribution == "uniform":
+            return random.randint(self.min_segments, self.max_segments)
+        if self._log_q is None:
+            return self.min_segments
+        # inverse transform sampling, 1 - random() is in (0, 1]
+        failures = int(math.log(1.0 - random.random()) / self._log_q)
+        return min(self.min_segments + failures, self.max_segments)
+
+
+def get_replay_id(seed: bytes, replay: int) -> str:
+    """
+    The (random looking, version 4) UUID of the replay number replay, in the 32 hex digits form of replay ids
+    """
+    digest = hashlib.blake2b(replay.to_bytes(8, "little"), digest_size=16, key=seed).digest()
+    return uuid.UUID(bytes=digest, version=4).hex
+
+
+def get_segment_counts(settings: Mapping[str, Any]) -> SegmentCounts:
+    return SegmentCounts(
+        settings["segments_distribution"],
+        settings["segments_min"],
+        settings["segments_max"],
+        settings["segments_mean"],
+    )
+
+
+def replay_segments(settings: Mapping[str, Any]) -> Iterator[Tuple[str, int]]:
+    """
+    Generates the (replay id, segment id) of settings["num_messages"] recordings
+    """
+    counts = get_segment_counts(settings)
+    window = settings["concurrent_replays"]
+    # a different set of replay ids on every run
+    seed = random.getrandbits(128).to_bytes(16, "little")
+
+    # the in flight replays: replay number, next segment id, number of segments
+    replays = array("q")
+    next_segments = array("i")
+    num_segments = array("i")
+    next_replay = 0
+
+    for _ in range(settings["num_messages"]):
+        while len(replays) < window:
+            replays.append(next_replay)
+            next_segments.append(0)
+            num_segments.append(counts.sample())
+            next_replay += 1
+
+        pos = random.randrange(len(replays))
+        segment = next_segments[pos]
+        yield get_replay_id(seed, replays[pos]), segment
+
+        if segment + 1 < num_segments[pos]:
+            next_segments[pos] = segment + 1
+        else:
+            # the replay is over, swap remove it (the order of the in flight replays doesn't matter)
+            replays[pos] = replays[-1]
+            next_segments[pos] = next_segments[-1]
+            num_segments[pos] = num_segments[-1]
+            replays.pop()
+            next_segments.pop()
+            num_segments.pop()
@@ -0,0 +1,37 @@
+import msgpack
+
+
+def make_settings(**kwargs):
+    settings = {
+        "num_messages": 200,
+        "org_id": 1,
+        "project_id": 10,
+        "concurrent_replays": 10,
+        "segments_distribution": "geometric",
+        "segments_min": 1,
+        "segments_max": 20,
+        "segments_mean": 5,
+        "mutate_payloads": False,
+        "recording_mode": "not_chunked",
+        "recording_chunk_size": 1024,
+        "partition_key": "replay",
+        "hot_partition_fraction": 0.0,
+        "hot_partition": 0,
+        "topic_name": "ingest-replay-recordings",
+    }
+    settings.update(kwargs)
+    return settings
+
+
+class RecordingProducer:
+    def __init__(self):
+        self.messages = []
+
+    def produce(self, topic, value, key, partition):
+        self.messages.append((key, partition, msgpack.unpackb(value)))
+
+    def poll(self, timeout):
+        pass
+
+    def flush(self):
+        pass
@@ -0,0 +1,54 @@
+import json
+import zlib
+
+import pytest
+
+from compression import CompressedRecording, RecordingBuilder
+from recordings import RECORDINGS
+
+NONCE_EVENT = b'{"type":5,"timestamp":1700000000000,"data":{"tag":"generator","payload":{"nonce":42}}}'
+
+
+@pytest.mark.parametrize("name", list(RECORDINGS))
+def test_captured_recording(name):
+    recording = CompressedRecording.from_recording(RECORDINGS[name])
+
+    assert zlib.decompress(recording.compressed) == RECORDINGS[name]
+    assert len(recording) == len(recording.compressed)
+
+
+@pytest.mark.parametrize("name", list(RECORDINGS))
+def test_mutated_captured_recording(name):
+    recording = CompressedRecording.from_recording(RECORDINGS[name])
+    mutated = zlib.decompress(recording.mutated(42, 1700000000000))
+
+    assert mutated == RECORDINGS[name][:-1] + b"," + NONCE_EVENT + b"]"
+    assert json.loads(mutated) == json.loads(RECORDINGS[name]) + [json.loads(NONCE_EVENT)]
+
+
+def test_mutated_recordings_differ():
+    recording = CompressedRecording.from_recording(RECORDINGS["xsmall"])
+
+    assert recording.mutated(1, 1700000000000) != recording.mutated(2, 1700000000000)
+    # the cached recording is not modified
+    assert zlib.decompress(recording.compressed) == RECORDINGS["xsmall"]
+
+
+def test_empty_recording():
+    recording = CompressedRecording.from_recording(b"[]")
+
+    assert zlib.decompress(recording.compressed) == b"[]"
+    assert zlib.decompress(recording.mutated(42, 1700000000000)) == b"[" + NONCE_EVENT + b"]"
+
+
+def test_recording_builder():
+    builder = RecordingBuilder()
+    builder.add_event(b'{"type":4}')
+    size = builder.flush()
+    builder.add_event(b'{"type":2},{"type":3}')
+    size = builder.flush()
+    recording = builder.finish()
+
+    assert zlib.decompress(recording.compressed) == b'[{"type":4},{"type":2},{"type":3}]'
+    # flush returns the size of the finished recording
+    assert len(recording) == size
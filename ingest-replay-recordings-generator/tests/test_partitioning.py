@@ -0,0 +1,68 @@
+import pytest
+
+from main import get_message_key, send_replay_recordings
+from partitioning import UNASSIGNED_PARTITION, HotPartitionRouter, check_partitioning
+from tests.helpers import RecordingProducer, make_settings
+
+
+@pytest.mark.parametrize("fraction", [0.0, 0.1, 0.5, 1.0])
+def test_hot_fraction_is_exact(fraction):
+    router = HotPartitionRouter(fraction, 5)
+    partitions = [router.partition() for _ in range(1000)]
+
+    assert set(partitions) <= {UNASSIGNED_PARTITION, 5}
+    assert abs(partitions.count(5) - 1000 * fraction) <= 1
+    assert router.hot_messages == partitions.count(5)
+
+
+@pytest.mark.parametrize(
+    "settings, valid",
+    [
+        ({}, True),
+        ({"hot_partition_fraction": 0.2, "hot_partition": 3}, True),
+        ({"hot_partition_fraction": 1.5}, False),
+        ({"hot_partition": -1}, False),
+    ],
+)
+def test_check_partitioning(settings, valid):
+    assert (check_partitioning(settings) is None) == valid
+
+
+@pytest.mark.parametrize(
+    "partition_key, expected",
+    [("replay", b"a" * 32), ("project", b"10"), ("org", b"1"), ("none", None)],
+)
+def test_message_key(partition_key, expected):
+    settings = make_settings(partition_key=partition_key)
+    recording = {"replay_id": "a" * 32, "project_id": 10}
+    assert get_message_key(settings, recording) == expected
+
+
+@pytest.mark.parametrize("partition_key", ["replay", "org"])
+def test_chunks_and_recording_share_partition_and_key(partition_key):
+    settings = make_settings(
+        recording_mode="chunked",
+        recording_chunk_size=100,
+        partition_key=partition_key,
+        hot_partition_fraction=0.5,
+        hot_partition=2,
+    )
+    producer = RecordingProducer()
+    send_replay_recordings(producer, settings)
+
+    recordings = []
+    chunks = []
+    for key, partition, message in producer.messages:
+        if message["type"] == "replay_recording_chunk":
+            chunks.append((key, partition, message["id"]))
+            continue
+        # the chunks of a recording are sent right before its recording message
+        recording_id = message["replay_recording"]["id"]
+        assert chunks == [(key, partition, recording_id)] * message["replay_recording"]["chunks"]
+        recordings.append(partition)
+        chunks = []
+
+    assert chunks == []
+    assert len(recordings) == settings["num_messages"]
+    # the hot partition is drawn once per recording, not per chunk
+    assert recordings.count(2) == settings["num_messages"] // 2
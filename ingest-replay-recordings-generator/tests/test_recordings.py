@@ -0,0 +1,99 @@
+import json
+import zlib
+from collections import defaultdict
+
+import msgpack
+import pytest
+
+from main import get_message_key, send_replay_recordings
+from recordings import CACHED_PAYLOAD_SEGMENTS, _chunk_parts, generate_messages
+from tests.helpers import RecordingProducer, make_settings
+
+REPLAY_ID = "a" * 32
+
+
+def check_payload(payload: bytes, segment_id: int):
+    header, _, recording = payload.partition(b"\n")
+    assert json.loads(header) == {"segment_id": segment_id}
+    json.loads(zlib.decompress(recording))
+
+
+def test_not_chunked():
+    messages = list(generate_messages(REPLAY_ID, 3, make_settings()))
+
+    assert len(messages) == 1
+    assert messages[0]["type"] == "replay_recording_not_chunked"
+    check_payload(messages[0]["payload"], 3)
+
+
+@pytest.mark.parametrize("mutate_payloads", [False, True])
+@pytest.mark.parametrize("chunk_size", [100, 1024, 1024 * 1024])
+def test_chunked(chunk_size, mutate_payloads):
+    settings = make_settings(
+        recording_mode="chunked", recording_chunk_size=chunk_size, mutate_payloads=mutate_payloads
+    )
+    # cached payloads and payloads chunked over the segment prefix and the recording
+    for segment_id in [*range(20), CACHED_PAYLOAD_SEGMENTS, 500]:
+        # through msgpack, as the consumer gets them
+        *chunks, recording = [
+            msgpack.unpackb(msgpack.packb(message))
+            for message in generate_messages(REPLAY_ID, segment_id, settings)
+        ]
+
+        assert recording["type"] == "replay_recording"
+        assert recording["replay_recording"]["chunks"] == len(chunks)
+        assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+        assert all(chunk["type"] == "replay_recording_chunk" for chunk in chunks)
+        assert {chunk["id"] for chunk in chunks} == {recording["replay_recording"]["id"]}
+        assert all(0 < len(chunk["payload"]) <= chunk_size for chunk in chunks)
+        check_payload(b"".join(chunk["payload"] for chunk in chunks), segment_id)
+
+
+def test_chunks_are_views_of_the_payload():
+    settings = make_settings(recording_mode="chunked", recording_chunk_size=100)
+    chunks = list(generate_messages(REPLAY_ID, 0, settings))[:-1]
+
+    assert all(isinstance(chunk["payload"], memoryview) for chunk in chunks)
+    assert len({id(chunk["payload"].obj) for chunk in chunks}) == 1
+
+
+def test_not_chunked_payloads_are_cached():
+    settings = make_settings()
+    payloads = [next(generate_messages(REPLAY_ID, 3, settings))["payload"] for _ in range(50)]
+    # one object per captured recording, never copied per message
+    assert len({id(payload) for payload in payloads}) == len({payload for payload in payloads})
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4, 5, 100])
+def test_chunk_parts(chunk_size):
+    parts = [b"abc", b"", b"defghij", b"k"]
+    chunks = list(_chunk_parts(parts, chunk_size))
+
+    assert b"".join(chunks) == b"".join(parts)
+    assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= chunk_size
+    # only the chunks spanning several parts are copies
+    views = [chunk for chunk in chunks if any(chunk.obj is part for part in parts)]
+    assert len(chunks) - len(views) <= len(parts) - 1
+
+
+@pytest.mark.parametrize("partition_key", ["replay", "project", "org", "none"])
+def test_chunked_messages_share_key_and_partition(partition_key):
+    settings = make_settings(
+        recording_mode="chunked",
+        partition_key=partition_key,
+        hot_partition_fraction=0.3,
+        hot_partition=2,
+    )
+    producer = RecordingProducer()
+    send_replay_recordings(producer, settings)
+
+    recordings = defaultdict(set)
+    for key, partition, message in producer.messages:
+        recording_id = message.get("id") or message["replay_recording"]["id"]
+        recordings[recording_id].add((key, partition))
+        assert key == get_message_key(settings, message)
+
+    assert len(recordings) == settings["num_messages"]
+    assert all(len(targets) == 1 for targets in recordings.values())
+    assert {partition for targets in recordings.values() for _, partition in targets} == {-1, 2}
@@ -0,0 +1,41 @@
+import json
+import random
+import zlib
+
+import pytest
+
+from rrweb import SizeDistribution, synthetic_recording
+
+TIMESTAMP_MS = 1700000000000
+
+
+@pytest.mark.parametrize("target_size", [1024, 20 * 1024, 300 * 1024, 2 * 1024 * 1024])
+@pytest.mark.parametrize("text_randomness", [0.0, 0.2, 1.0])
+def test_synthetic_recording(target_size, text_randomness):
+    random.seed(target_size)
+    recording = synthetic_recording(target_size, text_randomness, TIMESTAMP_MS)
+
+    assert target_size <= len(recording) <= target_size + 512
+    events = json.loads(zlib.decompress(recording.compressed))
+    assert [event["type"] for event in events[:2]] == [4, 2]
+    timestamps = [event["timestamp"] for event in events]
+    assert timestamps == sorted(timestamps)
+
+
+def test_mutated_synthetic_recording():
+    random.seed(0)
+    recording = synthetic_recording(10 * 1024, 0.2, TIMESTAMP_MS)
+    events = json.loads(zlib.decompress(recording.mutated(42, TIMESTAMP_MS)))
+
+    assert events[:-1] == json.loads(zlib.decompress(recording.compressed))
+    assert events[-1]["data"]["payload"] == {"nonce": 42}
+
+
+@pytest.mark.parametrize("distribution", ["fixed", "uniform", "lognormal"])
+def test_size_distribution(distribution):
+    sizes = SizeDistribution(distribution, 1024, 4 * 1024 * 1024)
+    samples = [sizes.sample() for _ in range(1000)]
+
+    assert all(1024 <= size <= 4 * 1024 * 1024 for size in samples)
+    if distribution == "fixed":
+        assert set(samples) == {4 * 1024 * 1024}
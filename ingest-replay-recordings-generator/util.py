@@ -0,0 +1,33 @@
+import re
+from typing import Optional
+
+
+SIZE_REGEX = r"^\s*(?P<value>\d+(\.\d+)?)\s*(?P<unit>[kmg]?i?b?)\s*$"
+SIZE_PATTERN = re.compile(SIZE_REGEX, re.IGNORECASE)
+SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+
+
+def parse_size(size) -> Optional[int]:
+    """Parses a human readable size (10KB, 1.5MB, 200) into a number of bytes.
+    Units are powers of 1024 (KB, KiB and K are the same unit).
+
+    >>> parse_size("200")
+    200
+    >>> parse_size(200)
+    200
+    >>> parse_size("10KB")
+    10240
+    >>> parse_size("1.5m")
+    1572864
+    >>> parse_size("lots") is None
+    True
+    """
+    if size is None:
+        return None
+    if isinstance(size, int):
+        return size
+    match = SIZE_PATTERN.match(str(size))
+    if match is None:
+        return None
+    unit = match.group("unit").lower().rstrip("b").rstrip("i")
+    return int(float(match.group("value")) * SIZE_UNITS[unit])